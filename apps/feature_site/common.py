@@ -1,7 +1,8 @@
 from py4web import Session, Cache, Translator, DAL, Field
 from py4web.utils.url_signer import URLSigner
 from py4web.utils.dbstore import DBStore
-from .settings import APP_FOLDER, T_FOLDER
+from .settings import APP_FOLDER, T_FOLDER, PREPROCESS_CACHE_MB, RESULT_STORE_MB
+from .modules.feature_identifier.cache import PreprocessCache
 import os
 
 # Database
@@ -17,6 +18,13 @@ session = Session(secret='my_secret_key', storage=DBStore(db))
 # Cache
 cache = Cache(size=1000)
 
+# Decoded images, Lab images, edge maps, contours and candidate scores,
+# keyed by image content so repeated runs on the same file skip preprocessing
+preprocess_cache = PreprocessCache(max_bytes=PREPROCESS_CACHE_MB * 1024 * 1024)
+
+# Recent detection results by result id, for feature_identifier/results downloads
+result_store = PreprocessCache(max_bytes=RESULT_STORE_MB * 1024 * 1024)
+
 # URL Signer
 url_signer = URLSigner(session)
 
@@ -8,10 +8,10 @@ import numpy as np
 import base64
 from py4web import action, request, response, abort, redirect, URL
 from ombott import static_file
-from .common import session, T, cache, url_signer, DB_FOLDER
-from .settings import UPLOADS_FOLDER
-from .modules.feature_identifier.detector import detect_features
-from .modules.feature_identifier.overlay import create_overlay_image
+from .common import session, T, cache, url_signer, DB_FOLDER, preprocess_cache, result_store
+from .settings import UPLOADS_FOLDER, DETECTION_THREADS
+from .modules.feature_identifier.detector import detect_features_with_overlay
+from .modules.feature_identifier.export import EXPORT_EXTENSIONS, EXPORT_FORMATS, export_result, negotiate_export_format
 from .modules.demo_utils import generate_dummy_history, create_sample_image
 
 # Dashboard
@@ -57,7 +57,8 @@ def feature_identifier():
                 'min_w': 10, 'max_w': 500,
                 'min_h': 10, 'max_h': 500,
                 'threshold': 2.3,
-                'edge_detection_method': 'canny'
+                'edge_detection_method': 'canny',
+                'delta_e_metric': 'cie76'
             }
         }
     
@@ -131,7 +132,8 @@ def feature_identifier():
             'min_h': int(request.forms.get('min_h', 10)),
             'max_h': int(request.forms.get('max_h', 500)),
             'threshold': float(request.forms.get('threshold', 2.3)),
-            'edge_detection_method': request.forms.get('edge_detection_method', 'canny')
+            'edge_detection_method': request.forms.get('edge_detection_method', 'canny'),
+            'delta_e_metric': request.forms.get('delta_e_metric', 'cie76')
         }
         session['feature_identifier_state']['form_data'] = form_data
         # Mark session as modified
@@ -140,6 +142,7 @@ def feature_identifier():
         uploaded_file = request.files.get('image')
         
         safe_filename = None
+        image_bytes = None
         if uploaded_file and uploaded_file.filename:
             # Validate file
             filename = uploaded_file.filename
@@ -152,7 +155,11 @@ def feature_identifier():
             # and to reuse file system blocks.
             safe_filename = "latest_upload_buffer" + ext
             file_path = os.path.join(UPLOADS_FOLDER, safe_filename)
-            uploaded_file.save(file_path)
+            # Keep the bytes: detection runs on them directly, so a concurrent
+            # upload overwriting the shared buffer file cannot change this result
+            image_bytes = uploaded_file.file.read()
+            with open(file_path, 'wb') as f:
+                f.write(image_bytes)
             session['feature_identifier_state']['chosen_file'] = safe_filename
             # Mark session as modified
             session['feature_identifier_state'] = session['feature_identifier_state']
@@ -164,22 +171,24 @@ def feature_identifier():
             return dict(error="No file selected", results=None, image_url=None, overlay_url=None, json_data=None, image_width=None, image_height=None, form_data=form_data, history=session['feature_identifier_history'], chosen_file=session['feature_identifier_state'].get('chosen_file'))
             
         file_path = os.path.join(UPLOADS_FOLDER, safe_filename)
-        if not os.path.exists(file_path):
-             return dict(error="File not found", results=None, image_url=None, overlay_url=None, json_data=None, image_width=None, image_height=None, form_data=form_data, history=session['feature_identifier_history'], chosen_file=session['feature_identifier_state'].get('chosen_file'))
+        if image_bytes is None:
+            if not os.path.exists(file_path):
+                 return dict(error="File not found", results=None, image_url=None, overlay_url=None, json_data=None, image_width=None, image_height=None, form_data=form_data, history=session['feature_identifier_history'], chosen_file=session['feature_identifier_state'].get('chosen_file'))
+            with open(file_path, 'rb') as f:
+                image_bytes = f.read()
 
-        # Process
-        detection_result = detect_features(
-            file_path,
+        # Process: decode once for both detection and the overlay
+        detection_result, overlay_image = detect_features_with_overlay(
+            image_bytes,
             form_data['min_w'], form_data['max_w'], 
             form_data['min_h'], form_data['max_h'],
             form_data['threshold'],
-            form_data['edge_detection_method']
+            form_data['edge_detection_method'],
+            num_threads=DETECTION_THREADS,
+            cache=preprocess_cache,
+            delta_e_metric=form_data['delta_e_metric']
         )
-        
-        # Generate overlay
-        original_image = cv2.imread(file_path)
-        img_height, img_width = original_image.shape[:2]
-        overlay_image = create_overlay_image(original_image, detection_result.bounding_boxes)
+        img_height, img_width = overlay_image.shape[:2]
         
         overlay_filename = f"overlay_{safe_filename}"
         overlay_path = os.path.join(UPLOADS_FOLDER, overlay_filename)
@@ -187,15 +196,17 @@ def feature_identifier():
         
         # Serialize result for display/download
         results_dict = {
-            "bounding_boxes": [
-                {"x": b.x, "y": b.y, "w": b.w, "h": b.h, "score": b.score, "validation_ratio": b.validation_ratio, "color_hex": b.color_hex}
-                for b in detection_result.bounding_boxes
-            ],
+            "bounding_boxes": detection_result.bounding_boxes.to_dicts(),
             "delta_e_method": detection_result.delta_e_method,
             "delta_e_threshold": detection_result.delta_e_threshold,
-            "processing_time_ms": detection_result.processing_time_ms
+            "processing_time_ms": detection_result.processing_time_ms,
+            "stage_times_ms": {name: stats.time_ms for name, stats in detection_result.stages.items()}
         }
         
+        # Keep the result for downloads in other formats
+        result_id = uuid.uuid4().hex
+        result_store.put(result_id, detection_result)
+        
         # Add to history
         history_item = {
             'image_filename': safe_filename,
@@ -203,6 +214,7 @@ def feature_identifier():
             'image_width': img_width,
             'image_height': img_height,
             'num_features': len(results_dict['bounding_boxes']),
+            'result_id': result_id,
             'timestamp': str(uuid.uuid4())
         }
         
@@ -221,7 +233,8 @@ def feature_identifier():
             image_height=img_height,
             form_data=form_data,
             history=session['feature_identifier_history'],
-            chosen_file=safe_filename
+            chosen_file=safe_filename,
+            export_url=URL('feature_identifier', 'results', result_id)
         )
         
     except Exception as e:
@@ -229,6 +242,22 @@ def feature_identifier():
         traceback.print_exc()
         return dict(error=str(e), results=None, image_url=None, overlay_url=None, json_data=None, image_width=None, image_height=None, form_data=session['feature_identifier_state']['form_data'], history=session['feature_identifier_history'], chosen_file=session['feature_identifier_state']['chosen_file'])
 
+# Download a recent detection result as NDJSON, compact JSON, NPZ or fixed-width
+# binary, chosen by the format query parameter or else the Accept header
+@action('feature_identifier/results/<result_id>')
+def feature_identifier_results(result_id):
+    detection_result = result_store.get(result_id)
+    if detection_result is None:
+        abort(404, "Result not found or expired")
+    try:
+        export_format = negotiate_export_format(request.query.get('format'), request.headers.get('Accept'))
+    except ValueError as e:
+        abort(400, str(e))
+    
+    response.headers['Content-Type'] = EXPORT_FORMATS[export_format]
+    response.headers['Content-Disposition'] = f'attachment; filename="features_{result_id}.{EXPORT_EXTENSIONS[export_format]}"'
+    return export_result(detection_result, export_format)
+
 # Sample image generator
 @action('sample_generator', method=['GET', 'POST'])
 @action.uses('sample_generator.html', session, T)
@@ -605,17 +634,16 @@ def image_filter():
                 file_path = os.path.join(UPLOADS_FOLDER, target_file)
                 if os.path.exists(file_path):
                     # Use default moderate params for quick detection
-                    detection_result = detect_features(
+                    detection_result, overlay_image = detect_features_with_overlay(
                         file_path,
                         min_w=10, max_w=5000, 
                         min_h=10, max_h=5000,
                         delta_e_threshold=5.0, # looser threshold
-                        edge_detection_method=method
+                        edge_detection_method=method,
+                        num_threads=DETECTION_THREADS,
+                        cache=preprocess_cache
                     )
                     
-                    original_image = cv2.imread(file_path)
-                    overlay_image = create_overlay_image(original_image, detection_result.bounding_boxes)
-                    
                     new_filename = f"detected_{uuid.uuid4()}.png"
                     new_path = os.path.join(UPLOADS_FOLDER, new_filename)
                     cv2.imwrite(new_path, overlay_image)
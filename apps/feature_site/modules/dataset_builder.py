@@ -0,0 +1,235 @@
+import os
+import json
+import random
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import cv2
+from .demo_utils import create_sample_image
+from .feature_identifier.batch import worker_context
+
+# Per-image create_sample_image arguments. A tuple (low, high) draws an
+# integer uniformly from [low, high], a list draws one of its items, and
+# anything else is used as is.
+DEFAULT_DISTRIBUTION = {
+    'width': (200, 1200),
+    'height': (200, 1200),
+    'num_features': (5, 60),
+    'min_size': 10,
+    'max_size': 40,
+    'bg_color_hex': '#e8e8e8',
+    'random_colors': True,
+    'feature_color_hex': '#ff0000',
+    'shape': ['rectangle', 'ellipse', 'mixed'],
+}
+
+# Lossless formats only, so feature colors survive
+IMAGE_FORMATS = ('png', 'bmp', 'tiff')
+
+# Images per subdirectory of images/
+IMAGES_PER_DIRECTORY = 1000
+
+MANIFEST_NAME = 'manifest.jsonl'
+CONFIG_NAME = 'dataset.json'
+
+def _describe_distribution(distribution):
+    """
+    JSON form of a distribution that keeps ranges and choices apart.
+    """
+    described = {}
+    for name, value in distribution.items():
+        if name not in DEFAULT_DISTRIBUTION:
+            raise ValueError(f"Unknown create_sample_image argument: {name}")
+        if isinstance(value, tuple):
+            if len(value) != 2 or value[0] > value[1]:
+                raise ValueError(f"Range for {name} must be (low, high) with low <= high")
+            described[name] = {'range': list(value)}
+        elif isinstance(value, list):
+            if not value:
+                raise ValueError(f"No choices for {name}")
+            described[name] = {'choice': value}
+        else:
+            described[name] = {'value': value}
+    return described
+
+def sample_parameters(described, rng):
+    """
+    One image's create_sample_image arguments from a described distribution.
+    """
+    parameters = {}
+    for name, spec in described.items():
+        if 'range' in spec:
+            parameters[name] = rng.randint(*spec['range'])
+        elif 'choice' in spec:
+            parameters[name] = rng.choice(spec['choice'])
+        else:
+            parameters[name] = spec['value']
+    return parameters
+
+def image_path(index, image_format):
+    """
+    Path of an image relative to the dataset directory.
+    """
+    return os.path.join('images', f"{index // IMAGES_PER_DIRECTORY:04d}", f"{index:07d}.{image_format}")
+
+def _generate_one(output_dir, index, seed, described, image_format):
+    """
+    Worker side: generate, encode and write one image, and return its
+    manifest record. The image depends only on (seed, index), not on which
+    worker runs it or when.
+    """
+    rng = random.Random(f"{seed}-{index}")
+    parameters = sample_parameters(described, rng)
+    image_seed = rng.getrandbits(64)
+    random.seed(image_seed)
+    image, features = create_sample_image(**parameters)
+
+    relative_path = image_path(index, image_format)
+    path = os.path.join(output_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temporary name and renamed, so an interrupted write
+    # never leaves a truncated image under the final name
+    temporary_path = f"{path}.tmp.{image_format}"
+    if not cv2.imwrite(temporary_path, image):
+        raise ValueError(f"Could not write {relative_path}")
+    os.replace(temporary_path, path)
+
+    return {
+        'index': index,
+        'file': relative_path,
+        'width': parameters['width'],
+        'height': parameters['height'],
+        'seed': image_seed,
+        'parameters': parameters,
+        'features': features,
+    }
+
+def iter_manifest(output_dir):
+    """
+    Manifest records of the completed images of a dataset, one at a time.
+    A last line cut short by an interruption is skipped.
+    """
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        for line in f:
+            if not line.endswith('\n'):
+                return
+            yield json.loads(line)
+
+def iter_dataset(output_dir, limit=None):
+    """
+    (BGR image, features) pairs of a dataset, decoded one at a time in
+    manifest order. limit keeps only the images with index below it, so the
+    same subset is read whatever order the build completed them in.
+    """
+    for record in iter_manifest(output_dir):
+        if limit is not None and record['index'] >= limit:
+            continue
+        path = os.path.join(output_dir, record['file'])
+        image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"Could not read {record['file']}")
+        yield image, record['features']
+
+def _truncate_partial_line(path, chunk_size=1 << 16):
+    """
+    Drop an incomplete last line left by an interrupted run, reading only
+    the end of the file.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            chunk = f.read(position - start)
+            newline = chunk.rfind(b'\n')
+            if newline >= 0:
+                if start + newline + 1 < end:
+                    f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+def build_dataset(output_dir, count, distribution=None, seed=0, workers=None, max_pending=None,
+                  image_format='png', progress=None):
+    """
+    Generate count create_sample_image images across a process pool, into
+    output_dir/images/, with their ground truth in output_dir/manifest.jsonl.
+
+    Every manifest line describes one finished image: its index, file,
+    size, parameters and features (boxes, colors, shapes). Lines are in
+    completion order. A line is only written after its image is fully on
+    disk, and images are deterministic in (seed, index). Running again on
+    the same directory therefore resumes an interrupted build, generating
+    only the images missing from the manifest. A larger count extends the
+    dataset. The seed, distribution and image format must match the
+    directory's dataset.json.
+
+    Workers are started with forkserver (or spawn), so scripts calling this
+    need the usual `if __name__ == "__main__":` guard.
+
+    Args:
+        distribution: create_sample_image arguments (see DEFAULT_DISTRIBUTION),
+            merged over the defaults
+        workers: Worker processes (defaults to the CPU count)
+        max_pending: Images in flight at once (defaults to four per worker)
+        progress: Called with (completed, count) after each image
+
+    Returns:
+        Dict with the number of images generated now and already present
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format: {image_format}")
+    described = _describe_distribution(dict(DEFAULT_DISTRIBUTION, **(distribution or {})))
+    config = {'seed': seed, 'distribution': described, 'image_format': image_format}
+
+    os.makedirs(output_dir, exist_ok=True)
+    config_path = os.path.join(output_dir, CONFIG_NAME)
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            existing = json.load(f)
+        if existing != config:
+            raise ValueError(f"{output_dir} holds a dataset with a different seed, distribution or format")
+    else:
+        with open(config_path, 'w') as f:
+            json.dump(config, f, indent=2)
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    _truncate_partial_line(manifest_path)
+    done = {record['index'] for record in iter_manifest(output_dir)}
+    todo = iter([index for index in range(count) if index not in done])
+    completed = sum(1 for index in done if index < count)
+    already_present = completed
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 4 * workers
+    in_flight = set()
+    with open(manifest_path, 'a') as manifest, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as pool:
+        try:
+            while True:
+                while len(in_flight) < max_pending:
+                    index = next(todo, None)
+                    if index is None:
+                        break
+                    in_flight.add(pool.submit(_generate_one, output_dir, index, seed, described, image_format))
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    manifest.write(json.dumps(future.result()) + '\n')
+                    completed += 1
+                # Flushed per batch, so an interruption loses at most the
+                # images still in flight
+                manifest.flush()
+                if progress is not None:
+                    progress(completed, count)
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    return {'generated': completed - already_present, 'already_present': already_present}
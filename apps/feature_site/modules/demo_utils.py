@@ -1,8 +1,12 @@
 import os
+import json
 import uuid
 import random
 import cv2
 import numpy as np
+from contextlib import nullcontext
+from functools import lru_cache
+from .tiff_writer import TiffStripWriter
 
 def create_sample_image(width, height, num_features, min_size=10, max_size=40, bg_color_hex='#e8e8e8', random_colors=True, feature_color_hex='#ff0000', shape='mixed'):
     """
@@ -72,6 +76,310 @@ def create_sample_image(width, height, num_features, min_size=10, max_size=40, b
     
     return image, features
 
+# Minimum L1 distance (in RGB) between a random feature color and the background
+MIN_COLOR_DISTANCE = 150
+
+# Gap kept between features, in pixels
+FEATURE_GAP = 2
+
+# Memory for one band of a generate_canvas canvas
+CANVAS_BAND_BYTES = 64 * 2**20
+
+# Cell offsets searched for overlapping features, own cell first
+NEIGHBOR_OFFSETS = ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1))
+
+# Candidate features drawn at once by generate_scene, growing up to
+# SCENE_BATCH_MAX as the scene fills up
+SCENE_BATCH = 8192
+SCENE_BATCH_MAX = 1 << 18
+
+@lru_cache(maxsize=64)
+def _color_table(bg_rgb):
+    """
+    For every (r, g) pair, how many b values give a color further than
+    MIN_COLOR_DISTANCE from bg_rgb: those below the background's b (low)
+    and above it (high).
+    """
+    r, g = np.meshgrid(np.arange(256), np.arange(256), indexing='ij')
+    rem = MIN_COLOR_DISTANCE - np.abs(r - bg_rgb[0]) - np.abs(g - bg_rgb[1])
+    low = np.where(rem < 0, 256, np.maximum(0, bg_rgb[2] - rem)).ravel()
+    high = np.where(rem < 0, 0, np.maximum(0, 255 - bg_rgb[2] - rem)).ravel()
+    return low, high, np.cumsum(low + high)
+
+def random_colors_far_from(rng, bg_rgb, count):
+    """
+    (count, 3) RGB colors drawn uniformly from all colors further than
+    MIN_COLOR_DISTANCE (L1) from bg_rgb, the same distribution as redrawing
+    until one is far enough, but without redrawing.
+    """
+    low, high, cumulative = _color_table(tuple(int(c) for c in bg_rgb))
+    pick = rng.integers(0, cumulative[-1], count)
+    pair = np.searchsorted(cumulative, pick, side='right')
+    # Offset of the pick among the valid b values of its (r, g) pair
+    offset = pick - (cumulative[pair] - low[pair] - high[pair])
+    b = np.where(offset < low[pair], offset, offset - low[pair] + 256 - high[pair])
+    return np.stack([pair // 256, pair % 256, b], axis=-1).astype(np.uint8)
+
+@lru_cache(maxsize=4096)
+def _shape_template(shape, w, h):
+    """
+    Pixel offsets (rows, cols) covered by a shape drawn at (0, 0), the same
+    pixels create_sample_image draws with OpenCV at any position.
+    """
+    canvas = np.zeros((h + 1, w + 1), dtype=np.uint8)
+    if shape == 'rectangle':
+        cv2.rectangle(canvas, (0, 0), (w, h), 1, -1)
+    else:
+        cv2.ellipse(canvas, (w // 2, h // 2), (w // 2, h // 2), 0, 0, 360, 1, -1)
+    rows, cols = np.nonzero(canvas)
+    return rows.astype(np.int32), cols.astype(np.int32)
+
+def _place_features(rng, width, height, num_features, min_size, max_size, max_attempts, rows=None, placed_above=None):
+    """
+    Non-overlapping boxes (FEATURE_GAP apart) by rejection sampling, with
+    overlap checks against a uniform grid instead of every placed box.
+    rows=(y0, y1) limits the boxes' top edges to [y0, y1), and placed_above
+    holds boxes already placed above y0 that the new ones must keep clear of.
+
+    Boxes are stored in the cell of their top-left corner. Cells are at
+    least as large as a box plus its gap, so a conflicting box is always in
+    one of the 3x3 neighboring cells. Each batch of candidates is first
+    checked against the placed boxes in one vectorized pass. The few that
+    pass are then accepted in order, each checked against those accepted
+    before it in the same batch, so the result equals placing one candidate
+    at a time.
+    """
+    y0, y1 = rows or (0, height)
+    cell = max_size + FEATURE_GAP
+    # Top-left corners in one cell are at least min_size + FEATURE_GAP apart
+    per_cell = (-(-cell // (min_size + FEATURE_GAP))) ** 2
+    # x, y, x2, y2 per slot, with a border of empty cells. An empty slot
+    # (all zeros) never overlaps a candidate, as candidates start at x, y >= 2.
+    # Grid rows start one cell above y0, where boxes placed above can reach.
+    top = y0 - cell
+    slots = np.zeros(((y1 - top) // cell + 3, width // cell + 3, per_cell, 4), dtype=np.int32)
+    counts = np.zeros(slots.shape[:2], dtype=np.int32)
+    if placed_above is not None:
+        for x, y, w, h in placed_above.tolist():
+            if y + h + FEATURE_GAP > y0:
+                cx, cy = x // cell + 1, (y - top) // cell + 1
+                slots[cy, cx, counts[cy, cx]] = (x, y, x + w + FEATURE_GAP, y + h + FEATURE_GAP)
+                counts[cy, cx] += 1
+
+    placed = []
+    attempts = 0
+    batch = SCENE_BATCH
+    while len(placed) < num_features and attempts < max_attempts:
+        batch = min(batch, max_attempts - attempts)
+        attempts += batch
+        w = rng.integers(min_size, max_size + 1, batch)
+        h = rng.integers(min_size, max_size + 1, batch)
+        y_high = np.minimum(y1, height - h - 1)
+        fits = (w < width - 4) & (h < height - 4) & (y_high > max(2, y0))
+        w, h = w[fits], h[fits]
+        x = rng.integers(2, width - w - 1)
+        y = rng.integers(max(2, y0), y_high[fits])
+        x2, y2 = x + w + FEATURE_GAP, y + h + FEATURE_GAP
+        cx, cy = x // cell + 1, (y - top) // cell + 1
+
+        # Own cell first, where most conflicts are, keeping only the
+        # candidates still free for the next neighbor
+        candidates = np.stack([x, y, w, h, x2, y2, cx, cy], axis=1)
+        for dx, dy in NEIGHBOR_OFFSETS:
+            x, y, x2, y2 = (candidates[:, i, None] for i in (0, 1, 4, 5))
+            near = slots[candidates[:, 7] + dy, candidates[:, 6] + dx]
+            conflict = (x < near[..., 2]) & (x2 > near[..., 0]) & (y < near[..., 3]) & (y2 > near[..., 1])
+            candidates = candidates[~conflict.any(axis=1)]
+
+        accepted = {}
+        batch_placed = 0
+        for x, y, w, h, x2, y2, cx, cy in candidates.tolist():
+            overlap = False
+            for dx, dy in NEIGHBOR_OFFSETS:
+                for fx, fy, fx2, fy2 in accepted.get((cx + dx, cy + dy), ()):
+                    if x < fx2 and x2 > fx and y < fy2 and y2 > fy:
+                        overlap = True
+                        break
+                if overlap:
+                    break
+            if overlap:
+                continue
+            accepted.setdefault((cx, cy), []).append((x, y, x2, y2))
+            slots[cy, cx, counts[cy, cx]] = (x, y, x2, y2)
+            counts[cy, cx] += 1
+            placed.append((x, y, w, h))
+            batch_placed += 1
+            if len(placed) == num_features:
+                break
+
+        # Dense scenes accept few candidates; draw more at once
+        if batch_placed < batch // 16:
+            batch = min(batch * 2, SCENE_BATCH_MAX)
+    return np.array(placed, dtype=np.int64).reshape(-1, 4)
+
+def _check_scene_options(shape, min_size, max_size):
+    if shape not in ('rectangle', 'ellipse', 'mixed'):
+        raise ValueError(f"Unknown shape: {shape}")
+    if min_size < 1 or max_size < min_size:
+        raise ValueError("Sizes must satisfy 1 <= min_size <= max_size")
+
+def _style_features(rng, count, bg_color, random_colors, feature_color_hex, shape):
+    """
+    RGB colors and rectangle flags (else ellipse) for count placed features.
+    """
+    if random_colors:
+        colors_rgb = random_colors_far_from(rng, bg_color[::-1], count)
+    else:
+        feature_rgb = [int(feature_color_hex.lstrip('#')[i:i+2], 16) for i in (0, 2, 4)]
+        colors_rgb = np.tile(np.array(feature_rgb, dtype=np.uint8), (count, 1))
+    if shape == 'mixed':
+        is_rectangle = rng.integers(0, 2, count) == 0
+    else:
+        is_rectangle = np.full(count, shape == 'rectangle')
+    return colors_rgb, is_rectangle
+
+def _draw_features(image, boxes, colors_rgb, is_rectangle, top=0):
+    """
+    Paint features into image, whose first row is row top of the scene, one
+    assignment per (shape, w, h) group. Rows outside the image are clipped.
+    """
+    if len(boxes) == 0:
+        return
+    colors_bgr = colors_rgb[:, ::-1]
+    keys = np.stack([is_rectangle, boxes[:, 2], boxes[:, 3]], axis=1)
+    groups, group_of, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    by_group = np.split(np.argsort(group_of.ravel(), kind='stable'), np.cumsum(counts)[:-1])
+    for (rectangle, w, h), members in zip(groups.tolist(), by_group):
+        rows, cols = _shape_template('rectangle' if rectangle else 'ellipse', w, h)
+        ys = boxes[members, 1, None] - top + rows
+        xs = boxes[members, 0, None] + cols
+        colors = np.broadcast_to(colors_bgr[members, None], ys.shape + (3,))
+        if ys.min() < 0 or ys.max() >= len(image):
+            inside = (ys >= 0) & (ys < len(image))
+            ys, xs, colors = ys[inside], xs[inside], colors[inside]
+        image[ys, xs] = colors
+
+def _feature_dicts(boxes, colors_rgb, is_rectangle, random_colors, feature_color_hex):
+    if random_colors:
+        hexes = ['#{:02x}{:02x}{:02x}'.format(*rgb) for rgb in colors_rgb.tolist()]
+    else:
+        hexes = [feature_color_hex] * len(boxes)
+    return [
+        {'x': x, 'y': y, 'w': w, 'h': h, 'color': color_hex, 'shape': 'rectangle' if rectangle else 'ellipse'}
+        for (x, y, w, h), color_hex, rectangle in zip(boxes.tolist(), hexes, is_rectangle.tolist())
+    ]
+
+def generate_scene(width, height, num_features, min_size=10, max_size=40, bg_color_hex='#e8e8e8', random_colors=True,
+                   feature_color_hex='#ff0000', shape='mixed', seed=None, max_attempts=None, allow_partial=False):
+    """
+    Faster, reproducible variant of create_sample_image for large scenes
+    (100k features in seconds), returning the same (image, features).
+
+    Placement checks overlaps on a grid, colors are drawn without
+    rejection, and shapes are drawn from per-size pixel templates, one NumPy
+    assignment per shape size. The same seed always gives the same scene.
+    Raises ValueError if fewer than num_features fit within max_attempts
+    candidate draws (default 100 per feature), unless allow_partial.
+    """
+    _check_scene_options(shape, min_size, max_size)
+    rng = np.random.default_rng(seed)
+    if max_attempts is None:
+        max_attempts = num_features * 100
+
+    bg_color = tuple(int(bg_color_hex.lstrip('#')[i:i+2], 16) for i in (4, 2, 0))  # BGR
+    # Copying a broadcast row is several times faster than np.full with a tuple
+    image = np.broadcast_to(np.array(bg_color, dtype=np.uint8), (height, width, 3)).copy()
+
+    boxes = _place_features(rng, width, height, num_features, min_size, max_size, max_attempts)
+    if len(boxes) < num_features and not allow_partial:
+        raise ValueError(f"Could only place {len(boxes)} of {num_features} features")
+
+    colors_rgb, is_rectangle = _style_features(rng, len(boxes), bg_color, random_colors, feature_color_hex, shape)
+    _draw_features(image, boxes, colors_rgb, is_rectangle)
+    return image, _feature_dicts(boxes, colors_rgb, is_rectangle, random_colors, feature_color_hex)
+
+def _top_edge_share(y, height, min_size, max_size):
+    """
+    Expected fraction of features with their top edge above row y, when
+    every height is equally likely and the top edge is uniform over the rows
+    where a feature of that height fits.
+    """
+    h = np.arange(min_size, min(max_size, height - 5) + 1)
+    rows = height - h - 3
+    return float(np.mean(np.clip(y - 2, 0, rows) / rows)) if len(h) else 1.0
+
+def generate_canvas(path, width, height, num_features, min_size=10, max_size=40, bg_color_hex='#e8e8e8',
+                    random_colors=True, feature_color_hex='#ff0000', shape='mixed', seed=None,
+                    features_path=None, tiff_path=None, band_rows=None, allow_partial=False):
+    """
+    Out-of-core generate_scene for canvases larger than memory, e.g.
+    30000 x 30000. The canvas is written to path as a .npy file, which
+    np.load(path, mmap_mode='r') and detect_features_tiled open
+    memory-mapped.
+
+    The canvas is rendered one band of band_rows rows at a time into a
+    memory-mapped window of the file, which is released before the next
+    band. Features are placed per band, in proportion to its height, clear
+    of those reaching down from the band above. Each band gets the share of
+    features whose top edges would fall in it in a generate_scene scene. tiff_path additionally
+    encodes each band into a strip TIFF (see tiff_writer). The ground truth,
+    one create_sample_image feature dict per line, is written to
+    features_path (default: path with a .features.ndjson suffix). Peak
+    memory is a band plus its features, whatever the canvas size.
+
+    Returns the number of features placed.
+    """
+    _check_scene_options(shape, min_size, max_size)
+    if band_rows is None:
+        band_rows = max(CANVAS_BAND_BYTES // (width * 3), 1)
+    # A feature then reaches at most into the next band
+    band_rows = max(band_rows, max_size + FEATURE_GAP + 1)
+    if features_path is None:
+        features_path = os.path.splitext(path)[0] + '.features.ndjson'
+    rng = np.random.default_rng(seed)
+    bg_color = tuple(int(bg_color_hex.lstrip('#')[i:i+2], 16) for i in (4, 2, 0))  # BGR
+
+    canvas = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(height, width, 3))
+    header_bytes = canvas.offset
+    del canvas
+
+    placed = 0
+    above = (np.empty((0, 4), dtype=np.int64), np.empty((0, 3), dtype=np.uint8), np.empty(0, dtype=bool))
+    tiff_writer = TiffStripWriter(tiff_path, width, height) if tiff_path else nullcontext()
+    with open(features_path, 'w') as features_file, tiff_writer as tiff:
+        for y0 in range(0, height, band_rows):
+            y1 = min(y0 + band_rows, height)
+            target = round(num_features * _top_edge_share(y1, height, min_size, max_size)) - placed
+            boxes = _place_features(
+                rng, width, height, target, min_size, max_size, target * 100,
+                rows=(y0, y1), placed_above=above[0]
+            )
+            if len(boxes) < target and not allow_partial:
+                raise ValueError(f"Could only place {len(boxes)} of {target} features in rows {y0} to {y1}")
+            colors_rgb, is_rectangle = _style_features(rng, len(boxes), bg_color, random_colors, feature_color_hex, shape)
+
+            band = np.memmap(path, dtype=np.uint8, mode='r+', offset=header_bytes + y0 * width * 3, shape=(y1 - y0, width, 3))
+            band[:] = np.broadcast_to(np.array(bg_color, dtype=np.uint8), band.shape)
+            _draw_features(band, *above, top=y0)
+            _draw_features(band, boxes, colors_rgb, is_rectangle, top=y0)
+            band.flush()
+            if tiff_path:
+                tiff.write(band)
+            del band
+
+            for feature in _feature_dicts(boxes, colors_rgb, is_rectangle, random_colors, feature_color_hex):
+                features_file.write(json.dumps(feature) + '\n')
+            placed += len(boxes)
+            above = (boxes, colors_rgb, is_rectangle)
+    return placed
+
+def read_features(features_path):
+    """
+    Ground-truth feature dicts written by generate_canvas.
+    """
+    with open(features_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
 def generate_dummy_history(session, uploads_folder, num_items=5):
     """
     Generates dummy data using the actual sample generation logic.
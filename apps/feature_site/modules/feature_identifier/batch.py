@@ -0,0 +1,170 @@
+import os
+import multiprocessing
+import numpy as np
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Iterator, Optional, Tuple, Union
+from .schemas import DetectionResult
+from .detector import _detect_in_image, load_image
+
+def _load_into_shared_memory(image: Union[str, bytes, np.ndarray]) -> Tuple[SharedMemory, tuple, str]:
+    """
+    Decode an image (or take an already decoded one) into a new shared memory block.
+    """
+    bgr_image, _ = load_image(image)
+
+    shm = SharedMemory(create=True, size=max(1, bgr_image.nbytes))
+    shared = np.ndarray(bgr_image.shape, dtype=bgr_image.dtype, buffer=shm.buf)
+    shared[...] = bgr_image
+    del shared
+    return shm, bgr_image.shape, bgr_image.dtype.str
+
+def _detect_shared(shm_name: str, shape: tuple, dtype: str, args: tuple, options: dict) -> DetectionResult:
+    """
+    Worker side: run detection on an image handed over through shared memory.
+    """
+    shm = SharedMemory(name=shm_name)
+    try:
+        bgr_image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        try:
+            return _detect_in_image(bgr_image, *args, **options)
+        finally:
+            # The buffer cannot be closed while an array still exports it
+            del bgr_image
+    finally:
+        shm.close()
+
+def worker_context():
+    """
+    Multiprocessing context for worker pools: workers start from a clean
+    server process rather than a fork of this one, since forking while
+    other threads run (such as the batch decoding threads) can deadlock the
+    children. Falls back to spawn where forkserver is unavailable.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+def _release(shm: SharedMemory) -> None:
+    shm.close()
+    shm.unlink()
+
+def detect_features_batch(
+    images: Iterable[Union[str, bytes, np.ndarray]],
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int,
+    delta_e_threshold: float,
+    edge_detection_method: str = "canny",
+    workers: Optional[int] = None,
+    ordered: bool = True,
+    max_pending: Optional[int] = None,
+    return_exceptions: bool = False,
+    **options
+) -> Iterator[Tuple[int, Union[DetectionResult, Exception]]]:
+    """
+    Run detect_features over many images on a process pool.
+
+    Images are decoded in the parent by a thread pool (cv2.imread releases the
+    GIL) directly into shared memory blocks. Workers attach to the block and
+    run detection on it in place, so pixels are never pickled; only the small
+    DetectionResult travels back.
+
+    Workers are started with forkserver (or spawn), so scripts calling this
+    need the usual `if __name__ == "__main__":` guard.
+
+    Args:
+        images: Image paths, encoded image bytes and/or decoded BGR arrays
+        workers: Worker processes (defaults to the CPU count)
+        ordered: Yield results in input order; otherwise as they complete
+        max_pending: Images decoded or in flight at once, which bounds the
+            shared memory in use (defaults to twice the worker count)
+        return_exceptions: Yield a failing image's exception as its result
+            instead of raising it
+        **options: Further detect_features keyword arguments. on_stage is
+            called in the worker process, so it must be picklable and its
+            effects stay there; the stages also come back on each result.
+
+    Yields:
+        (index into images, DetectionResult) pairs
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    args = (min_w, max_w, min_h, max_h, delta_e_threshold, edge_detection_method)
+
+    source = enumerate(images)
+    exhausted = False
+
+    loading = deque()  # (index, decode future), in input order
+    in_flight = {}     # detection future -> (index, shared memory block)
+    finished = {}      # index -> result, waiting for its turn when ordered
+    next_index = 0
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as pool, ThreadPoolExecutor(max_workers=workers) as loaders:
+        try:
+            while True:
+                # Keep the pipeline full without decoding the whole input up front
+                while not exhausted and len(loading) + len(in_flight) < max_pending:
+                    item = next(source, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    loading.append((item[0], loaders.submit(_load_into_shared_memory, item[1])))
+
+                if not loading and not in_flight:
+                    break
+
+                waiting = list(in_flight)
+                if loading:
+                    waiting.append(loading[0][1])
+                wait(waiting, return_when=FIRST_COMPLETED)
+
+                completed = []
+
+                # Hand decoded images to the workers in input order
+                while loading and loading[0][1].done():
+                    index, load = loading.popleft()
+                    try:
+                        shm, shape, dtype = load.result()
+                    except Exception as e:
+                        completed.append((index, e))
+                        continue
+                    future = pool.submit(_detect_shared, shm.name, shape, dtype, args, options)
+                    in_flight[future] = (index, shm)
+
+                for future in [f for f in in_flight if f.done()]:
+                    index, shm = in_flight.pop(future)
+                    _release(shm)
+                    error = future.exception()
+                    completed.append((index, error if error is not None else future.result()))
+
+                for index, result in completed:
+                    if isinstance(result, Exception) and not return_exceptions:
+                        raise result
+                    if not ordered:
+                        yield index, result
+                    else:
+                        finished[index] = result
+
+                while next_index in finished:
+                    yield next_index, finished.pop(next_index)
+                    next_index += 1
+        finally:
+            for future, (_, shm) in in_flight.items():
+                future.cancel()
+            # Blocks still attached by running workers are unlinked only after
+            # those workers finish
+            for future in list(in_flight):
+                try:
+                    future.result()
+                except Exception:
+                    pass
+                _release(in_flight.pop(future)[1])
+            for _, load in loading:
+                try:
+                    shm, _, _ = load.result()
+                except Exception:
+                    continue
+                _release(shm)
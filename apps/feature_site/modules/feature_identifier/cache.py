@@ -0,0 +1,113 @@
+import hashlib
+import sys
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+def content_digest(data: Union[bytes, np.ndarray]) -> str:
+    """
+    Hash identifying an image by content: its encoded file bytes, or the
+    pixels, shape and dtype of a decoded array.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(data, np.ndarray):
+        h.update(f"{data.shape}{data.dtype.str}".encode())
+        h.update(np.ascontiguousarray(data).data)
+    else:
+        h.update(data)
+    return h.hexdigest()
+
+def estimate_nbytes(value: Any) -> int:
+    """
+    Approximate memory held by a cached value.
+    Arrays and objects with an nbytes attribute report it; lists and tuples
+    are summed over their items.
+    """
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+class PreprocessCache:
+    """
+    Thread-safe LRU cache for per-image preprocessing results (decoded
+    pixels, Lab image, edge maps, contour boxes, candidate scores), bounded
+    by the total size of the cached values rather than their count.
+
+    Keys start with the image's content_digest, so a re-uploaded or renamed
+    file still hits, and an overwritten file never returns stale results.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any, nbytes: Optional[int] = None) -> None:
+        """
+        Store a value, evicting least recently used entries to stay within
+        max_bytes. Values larger than max_bytes are not stored.
+        """
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            self._entries[key] = value
+            self._sizes[key] = nbytes
+            self._bytes += nbytes
+
+            while self._bytes > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Cached value for key, computing and storing it on a miss.
+        Concurrent misses on the same key may compute it more than once.
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,5 +1,13 @@
 import numpy as np
 import cv2
+from typing import Callable, Dict
+
+# OpenCV's 8-bit Lab to standard Lab, per channel:
+# L: 0..255 -> 0..100
+# a: 0..255 -> -128..127
+# b: 0..255 -> -128..127
+_LAB_LEVELS = np.arange(256, dtype=np.float32)
+_LAB_LUT = np.stack([_LAB_LEVELS * 100.0 / 255.0, _LAB_LEVELS - 128.0, _LAB_LEVELS - 128.0], axis=-1).reshape(1, 256, 3)
 
 def bgr_to_lab(image: np.ndarray) -> np.ndarray:
     """
@@ -12,19 +20,19 @@ def bgr_to_lab(image: np.ndarray) -> np.ndarray:
     
     To be precise and allow user-standard thresholds (like 2.3), we will convert to standard Lab.
     """
-    lab_scaled = cv2.cvtColor(image, cv2.COLOR_BGR2Lab).astype(np.float32)
-    
-    # Convert to standard Lab
-    # L: 0..255 -> 0..100
-    # a: 0..255 -> -128..127
-    # b: 0..255 -> -128..127
-    l_channel, a_channel, b_channel = cv2.split(lab_scaled)
-    
-    l_std = l_channel * 100.0 / 255.0
-    a_std = a_channel - 128.0
-    b_std = b_channel - 128.0
-    
-    return cv2.merge([l_std, a_std, b_std])
+    # cvtColor and a per-channel lookup table: one pass over the image instead
+    # of split, per-channel scaling and merge, with the same float32 values
+    return cv2.LUT(cv2.cvtColor(image, cv2.COLOR_BGR2Lab), _LAB_LUT)
+
+def bgr_pixels_to_lab(pixels: np.ndarray) -> np.ndarray:
+    """
+    Convert an (N, 3) array of BGR pixels to standard Lab, with the same
+    values bgr_to_lab gives for those pixels in an image. Used to convert
+    only the pixels that are actually sampled.
+    """
+    if len(pixels) == 0:
+        return np.empty((0, 3), dtype=np.float32)
+    return bgr_to_lab(np.ascontiguousarray(pixels).reshape(-1, 1, 3)).reshape(-1, 3)
 
 def calculate_delta_e_cie76(color1: np.ndarray, color2: np.ndarray) -> float:
     """
@@ -41,3 +49,110 @@ def batch_delta_e_cie76(color_array: np.ndarray, target_color: np.ndarray) -> np
     diff = color_array - target_color
     return np.linalg.norm(diff, axis=1)
 
+
+def delta_e_cie76(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    Row-wise CIE76 Delta E between two (N, 3) arrays of Lab colors.
+    """
+    return np.linalg.norm(lab1 - lab2, axis=1)
+
+# CIE94 graphic arts weights
+CIE94_K1 = 0.045
+CIE94_K2 = 0.015
+
+def delta_e_cie94(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    Row-wise CIE94 Delta E (graphic arts weights) between two (N, 3) arrays of Lab colors.
+
+    CIE94 weights chroma and hue by the chroma of the reference color, which
+    makes it asymmetric. Neighboring perimeter pixels have no reference, so
+    the geometric mean of both chromas is used instead: the distance is the
+    same in both directions.
+    """
+    l1, a1, b1 = lab1[:, 0], lab1[:, 1], lab1[:, 2]
+    l2, a2, b2 = lab2[:, 0], lab2[:, 1], lab2[:, 2]
+
+    c1 = np.hypot(a1, b1)
+    c2 = np.hypot(a2, b2)
+    dl = l1 - l2
+    dc = c1 - c2
+    da = a1 - a2
+    db = b1 - b2
+    # Squared hue difference; rounding can make it slightly negative
+    dh2 = np.maximum(da * da + db * db - dc * dc, 0)
+
+    c = np.sqrt(c1 * c2)
+    sc = 1 + CIE94_K1 * c
+    sh = 1 + CIE94_K2 * c
+    return np.sqrt(dl * dl + (dc / sc) ** 2 + dh2 / (sh * sh))
+
+def delta_e_ciede2000(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    Row-wise CIEDE2000 Delta E (kL = kC = kH = 1) between two (N, 3) arrays
+    of Lab colors, following Sharma, Wu and Dalal (2005).
+    """
+    l1, a1, b1 = lab1[:, 0], lab1[:, 1], lab1[:, 2]
+    l2, a2, b2 = lab2[:, 0], lab2[:, 1], lab2[:, 2]
+
+    c_bar7 = ((np.hypot(a1, b1) + np.hypot(a2, b2)) / 2) ** 7
+    g = 0.5 * (1 - np.sqrt(c_bar7 / (c_bar7 + 25.0 ** 7)))
+    a1p = (1 + g) * a1
+    a2p = (1 + g) * a2
+    c1p = np.hypot(a1p, b1)
+    c2p = np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    # Hue difference and mean hue, taking the short way around the circle.
+    # Both are defined as 0 / the plain sum when either color is achromatic.
+    chromatic = (c1p * c2p) != 0
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, np.where(dhp < -180, dhp + 360, dhp))
+    dhp = np.where(chromatic, dhp, 0)
+    h_sum = h1p + h2p
+    wrapped = np.abs(h1p - h2p) > 180
+    h_bar = np.where(wrapped, np.where(h_sum < 360, h_sum + 360, h_sum - 360), h_sum) / 2
+    h_bar = np.where(chromatic, h_bar, h_sum)
+
+    dlp = l2 - l1
+    dcp = c2p - c1p
+    dhp_big = 2 * np.sqrt(c1p * c2p) * np.sin(np.radians(dhp) / 2)
+
+    l_bar50 = ((l1 + l2) / 2 - 50) ** 2
+    c_bar_p = (c1p + c2p) / 2
+    c_bar_p7 = c_bar_p ** 7
+    t = (1 - 0.17 * np.cos(np.radians(h_bar - 30)) + 0.24 * np.cos(np.radians(2 * h_bar))
+         + 0.32 * np.cos(np.radians(3 * h_bar + 6)) - 0.20 * np.cos(np.radians(4 * h_bar - 63)))
+    d_theta = 30 * np.exp(-(((h_bar - 275) / 25) ** 2))
+    r_c = 2 * np.sqrt(c_bar_p7 / (c_bar_p7 + 25.0 ** 7))
+
+    s_l = 1 + 0.015 * l_bar50 / np.sqrt(20 + l_bar50)
+    s_c = 1 + 0.045 * c_bar_p
+    s_h = 1 + 0.015 * c_bar_p * t
+    r_t = -np.sin(np.radians(2 * d_theta)) * r_c
+
+    dl_term = dlp / s_l
+    dc_term = dcp / s_c
+    dh_term = dhp_big / s_h
+    return np.sqrt(np.maximum(dl_term ** 2 + dc_term ** 2 + dh_term ** 2 + r_t * dc_term * dh_term, 0))
+
+# Row-wise Delta E kernels selectable by name, with the label reported in results
+DELTA_E_METRICS: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    "cie76": delta_e_cie76,
+    "cie94": delta_e_cie94,
+    "ciede2000": delta_e_ciede2000
+}
+DELTA_E_METHOD_NAMES = {
+    "cie76": "CIE76 (Euclidean on Standard Lab)",
+    "cie94": "CIE94 (graphic arts, symmetric chroma weighting)",
+    "ciede2000": "CIEDE2000"
+}
+
+def get_delta_e_metric(name: str) -> Callable[[np.ndarray, np.ndarray], np.ndarray]:
+    """
+    Row-wise Delta E kernel registered under the (case-insensitive) name.
+    """
+    kernel = DELTA_E_METRICS.get(name.lower())
+    if kernel is None:
+        raise ValueError(f"Unknown Delta E metric: {name}")
+    return kernel
@@ -1,12 +1,73 @@
 import cv2
 import numpy as np
 import time
-from typing import List, Tuple
-from .schemas import BoundingBox, DetectionResult
-from .color import bgr_to_lab, calculate_delta_e_cie76
-from .geometry import get_outline_coordinates, check_overlap_mask, mark_occupied, is_valid_candidate
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+from .schemas import BoxArray, DetectionResult, StageStats, pack_color
+from .stages import StageTimer
+from .color import bgr_to_lab, DELTA_E_METHOD_NAMES, DELTA_E_METRICS
+from .geometry import perimeter_indices, is_valid_candidate, select_exclusive, EXCLUSIVITY_ENGINES
+from .validation import score_boxes, select_boxes, CandidateScores
+from .cache import PreprocessCache, content_digest
+from .overlay import create_overlay_image
+from .edges import apply_sobel_edge_detection, detect_edges, sobel_magnitude
 
-def get_dominant_color(bgr_image: np.ndarray, x: int, y: int, w: int, h: int) -> str:
+# "contours" walks cv2.findContours results in Python; "components" builds the
+# same boxes as one array from connected components (see component_boxes)
+CANDIDATE_GENERATORS = ("contours", "components")
+
+# "scores" keeps threshold-independent scores, "early_exit" validates one
+# threshold with early rejection (see _detect_in_image)
+VALIDATION_MODES = ("scores", "early_exit")
+
+# "full" converts the whole image to Lab, "sparse" only the sampled perimeter
+# pixels, "auto" picks sparse when perimeters cover few of the image's pixels
+LAB_CONVERSIONS = ("full", "sparse", "auto")
+
+# Under "auto", perimeters totalling less than this fraction of the image's
+# pixels are converted sparsely (a sampled pixel costs about twice as much as
+# a pixel of the full-image conversion)
+SPARSE_LAB_MAX_FRACTION = 0.5
+
+COLOR_ESTIMATORS = ("mean", "median", "mode", "kmeans")
+COLOR_REGIONS = ("interior", "perimeter", "box")
+
+# Histogram mode quantizes each channel to this many bits (32 levels)
+MODE_BITS_PER_CHANNEL = 5
+
+def get_region_pixels(bgr_image: np.ndarray, x: int, y: int, w: int, h: int, region: str = "interior") -> np.ndarray:
+    """
+    Collect the BGR pixels of a bounding box region as an (N, 3) array.
+    
+    Args:
+        bgr_image: BGR color image
+        x, y: Top-left corner coordinates
+        w, h: Width and height
+        region: "interior" for the pixels enclosed by the outline (the whole box
+            when it is too thin to have an inside), "perimeter" for the outline
+            itself, "box" for the whole box, outline included
+    """
+    if region == "perimeter":
+        rows, cols = perimeter_indices(x, y, w, h, bgr_image.shape)
+        return bgr_image[rows, cols]
+    
+    if region not in ("interior", "box"):
+        raise ValueError(f"Unknown color region: {region}")
+    
+    if region == "interior" and w > 2 and h > 2:
+        x, y, w, h = x + 1, y + 1, w - 2, h - 2
+    return bgr_image[max(y, 0):y+h, max(x, 0):x+w].reshape((-1, 3))
+
+def get_dominant_color(
+    bgr_image: np.ndarray,
+    x: int,
+    y: int,
+    w: int,
+    h: int,
+    estimator: str = "mean",
+    region: str = "interior"
+) -> Optional[str]:
     """
     Extract the dominant color from a bounding box region.
     
@@ -14,25 +75,45 @@ def get_dominant_color(bgr_image: np.ndarray, x: int, y: int, w: int, h: int) ->
         bgr_image: BGR color image
         x, y: Top-left corner coordinates
         w, h: Width and height
+        estimator: "mean", "median", "mode" (most populated color histogram bin)
+            or "kmeans" (K=1 k-means, by far the most expensive)
+        region: "interior", "perimeter" or "box", see get_region_pixels.
+            "kmeans" over "box" is the estimator used before estimators
+            and regions could be chosen
         
     Returns:
-        Hex color string (e.g., "#FF0000")
+        Hex color string (e.g., "#FF0000"), or None if the region has no pixels
     """
-    # Crop region
-    region = bgr_image[y:y+h, x:x+w]
+    if estimator not in COLOR_ESTIMATORS:
+        raise ValueError(f"Unknown color estimator: {estimator}")
     
     # Reshape to list of pixels
-    pixels = region.reshape((-1, 3))
-    
-    # Convert to float
-    pixels = np.float32(pixels)
+    pixels = get_region_pixels(bgr_image, x, y, w, h, region)
+    if len(pixels) == 0:
+        return None
     
-    # K-means clustering to find dominant color
-    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
-    _, _, centers = cv2.kmeans(pixels, 1, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-    
-    # Get the dominant color (BGR format)
-    dominant_color_bgr = centers[0].astype(int)
+    if estimator == "mean":
+        dominant_color_bgr = np.rint(pixels.mean(axis=0)).astype(int)
+    elif estimator == "median":
+        dominant_color_bgr = np.rint(np.median(pixels, axis=0)).astype(int)
+    elif estimator == "mode":
+        # Most populated bin of a quantized color histogram, reported as the
+        # mean of the pixels that fell into it
+        shift = 8 - MODE_BITS_PER_CHANNEL
+        quantized = (pixels >> shift).astype(np.int32)
+        bins = (quantized[:, 0] << (2 * MODE_BITS_PER_CHANNEL)) | (quantized[:, 1] << MODE_BITS_PER_CHANNEL) | quantized[:, 2]
+        mode_bin = np.argmax(np.bincount(bins))
+        dominant_color_bgr = np.rint(pixels[bins == mode_bin].mean(axis=0)).astype(int)
+    else:
+        # Convert to float
+        pixels = np.float32(pixels)
+        
+        # K-means clustering to find dominant color
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+        _, _, centers = cv2.kmeans(pixels, 1, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+        
+        # Get the dominant color (BGR format)
+        dominant_color_bgr = centers[0].astype(int)
     
     # Convert BGR to RGB
     r, g, b = dominant_color_bgr[2], dominant_color_bgr[1], dominant_color_bgr[0]
@@ -42,134 +123,515 @@ def get_dominant_color(bgr_image: np.ndarray, x: int, y: int, w: int, h: int) ->
     
     return hex_color
 
-def apply_sobel_edge_detection(gray_image: np.ndarray) -> np.ndarray:
+def contour_boxes(edges: np.ndarray) -> List[Tuple[int, int, int, int]]:
     """
-    Apply Sobel edge detection to an image.
+    Distinct contour bounding boxes of an edge map, before any size filtering.
+    Boxes are listed in contour order; a box shared by several contours appears
+    once, at its first contour.
+    """
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    
+    # Bounding boxes are computed first, then deduplicated in order
+    return list(dict.fromkeys(cv2.boundingRect(cnt) for cnt in contours))
+
+def _first_pixel_index(labels: np.ndarray, num_labels: int) -> np.ndarray:
+    """
+    Flat index of the first pixel, in raster order, of every label (0 for label 0).
+    """
+    flat = labels.ravel()
+    idx = np.flatnonzero(flat)
+    first = np.zeros(num_labels, dtype=np.int64)
+    # Assigned in reverse so each label's smallest index is written last
+    first[flat[idx][::-1]] = idx[::-1]
+    return first
+
+def component_boxes(edges: np.ndarray) -> np.ndarray:
+    """
+    Array-based equivalent of contour_boxes, built on connected components.
+    
+    findContours(RETR_LIST) returns one outer border per 8-connected edge
+    component and one hole border per 4-connected background region that does
+    not touch the image border. The first have the component's bounding box;
+    the second have the hole's bounding box grown by one pixel. Each contour
+    starts at its region's first pixel in raster order (one pixel to the left
+    of it for holes), and contours are reported by descending start point.
+    Rebuilding that order gives exactly the boxes and order of contour_boxes,
+    without any per-contour Python work.
     
-    Args:
-        gray_image: Grayscale image
-        
     Returns:
-        Binary edge map
+        (N, 4) int32 array of distinct (x, y, w, h) boxes, in contour order
     """
-    # Apply Sobel operator in x and y directions
-    sobelx = cv2.Sobel(gray_image, cv2.CV_64F, 1, 0, ksize=3)
-    sobely = cv2.Sobel(gray_image, cv2.CV_64F, 0, 1, ksize=3)
+    h_img, w_img = edges.shape[:2]
+    foreground = (edges > 0).astype(np.uint8)
+    
+    num_outer, outer_labels, outer_stats, _ = cv2.connectedComponentsWithStats(foreground, connectivity=8, ltype=cv2.CV_32S)
+    outer_boxes = outer_stats[1:, :4]
+    outer_starts = _first_pixel_index(outer_labels, num_outer)[1:]
+    del outer_labels
     
-    # Compute magnitude
-    magnitude = np.sqrt(sobelx**2 + sobely**2)
+    num_holes, hole_labels, hole_stats, _ = cv2.connectedComponentsWithStats(1 - foreground, connectivity=4, ltype=cv2.CV_32S)
+    hole_boxes = hole_stats[1:, :4]
+    hole_starts = _first_pixel_index(hole_labels, num_holes)[1:] - 1
+    del hole_labels
     
-    # Normalize to 0-255
-    magnitude = np.uint8(255 * magnitude / np.max(magnitude))
+    x, y, w, h = hole_boxes.T
+    enclosed = (x > 0) & (y > 0) & (x + w < w_img) & (y + h < h_img)
+    hole_boxes = hole_boxes[enclosed] + np.array([-1, -1, 2, 2])
+    hole_starts = hole_starts[enclosed]
     
-    # Apply threshold to get binary image
-    _, edges = cv2.threshold(magnitude, 100, 255, cv2.THRESH_BINARY)
+    boxes = np.concatenate([outer_boxes, hole_boxes]).astype(np.int32)
+    starts = np.concatenate([outer_starts, hole_starts])
+    boxes = boxes[np.argsort(-starts, kind="stable")]
     
-    return edges
+    # Keep each distinct box at its first occurrence
+    _, first = np.unique(boxes, axis=0, return_index=True)
+    return boxes[np.sort(first)]
 
-def detect_features(
-    image_path: str,
+def filter_box_array(boxes: np.ndarray, min_w: int, max_w: int, min_h: int, max_h: int) -> np.ndarray:
+    """
+    Vectorized filter_boxes for an (N, 4) array of (x, y, w, h) boxes.
+    """
+    w, h = boxes[:, 2], boxes[:, 3]
+    return boxes[(w >= min_w) & (w <= max_w) & (h >= min_h) & (h <= max_h)]
+
+def filter_boxes(
+    boxes: List[Tuple[int, int, int, int]],
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int
+) -> List[Tuple[int, int, int, int]]:
+    return [box for box in boxes if is_valid_candidate(box[2], box[3], min_w, max_w, min_h, max_h)]
+
+def _cached(cache: Optional[PreprocessCache], key: Optional[Hashable], compute: Callable[[], Any]) -> Any:
+    if cache is None or key is None:
+        return compute()
+    return cache.get_or_compute(key, compute)
+
+def prepare_candidates(
+    bgr_image: np.ndarray,
     min_w: int,
     max_w: int,
     min_h: int,
     max_h: int,
-    delta_e_threshold: float,
-    edge_detection_method: str = "canny"
-) -> DetectionResult:
-    start_time = time.time()
+    edge_detection_method: str = "canny",
+    cache: Optional[PreprocessCache] = None,
+    digest: Optional[str] = None,
+    candidate_generator: str = "contours",
+    lab_conversion: str = "full",
+    timer: Optional[StageTimer] = None
+) -> Tuple[Optional[np.ndarray], List[Tuple[int, int, int, int]]]:
+    """
+    Lab conversion, edge detection, candidate boxes and size filtering.
+    candidate_generator selects contour_boxes ("contours") or the equivalent
+    array-based component_boxes ("components"). lab_conversion selects
+    whether the whole image is converted to Lab (see LAB_CONVERSIONS).
+    
+    With a cache and the image's content digest, the Lab image, edge map and
+    candidate boxes are reused from (and stored into) the cache.
+    
+    Stages (gray, edges, contours, filter, lab) are recorded on the timer.
+    
+    Returns:
+        The Lab image, or None when only the sampled pixels are to be
+        converted, and the size-filtered candidate boxes, in contour order
+    """
+    method = edge_detection_method.lower()
+    timer = timer or StageTimer()
+    
+    def key(*parts) -> Optional[tuple]:
+        return (digest,) + parts if digest is not None else None
+    
+    def edge_map() -> np.ndarray:
+        with timer.stage("gray"):
+            gray = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2GRAY)
+        with timer.stage("edges"):
+            return detect_edges(gray, method)
     
-    bgr_image = cv2.imread(image_path)
+    def edge_boxes():
+        edges = _cached(cache, key("edges", method), edge_map)
+        with timer.stage("contours") as stage:
+            boxes = component_boxes(edges) if candidate_generator == "components" else contour_boxes(edges)
+            stage.count = len(boxes)
+        return boxes
+    
+    all_boxes = _cached(cache, key(candidate_generator, method), edge_boxes)
+    with timer.stage("filter") as stage:
+        if candidate_generator == "components":
+            candidate_boxes = [tuple(box) for box in filter_box_array(all_boxes, min_w, max_w, min_h, max_h).tolist()]
+        else:
+            candidate_boxes = filter_boxes(all_boxes, min_w, max_w, min_h, max_h)
+        stage.count = len(candidate_boxes)
+    
+    if lab_conversion == "auto":
+        perimeter_pixels = sum(2 * (w + h) for _, _, w, h in candidate_boxes)
+        h_img, w_img = bgr_image.shape[:2]
+        lab_conversion = "sparse" if perimeter_pixels < SPARSE_LAB_MAX_FRACTION * h_img * w_img else "full"
+    if lab_conversion == "sparse":
+        return None, candidate_boxes
+    
+    with timer.stage("lab"):
+        lab_image = _cached(cache, key("lab"), lambda: bgr_to_lab(bgr_image))
+    return lab_image, candidate_boxes
+
+def score_candidates(
+    bgr_image: np.ndarray,
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int,
+    edge_detection_method: str = "canny",
+    executor: Optional[Executor] = None,
+    num_chunks: int = 1,
+    cache: Optional[PreprocessCache] = None,
+    digest: Optional[str] = None,
+    candidate_generator: str = "contours",
+    lab_conversion: str = "full",
+    delta_e_metric: str = "cie76",
+    timer: Optional[StageTimer] = None
+) -> CandidateScores:
+    """
+    Run every threshold-independent detection step on an image: the steps of
+    prepare_candidates, then perimeter scoring. Perimeter scoring is split
+    over the executor when one is given (see score_boxes).
+    
+    Returns:
+        CandidateScores that can be selected at any Delta E threshold
+    """
+    timer = timer or StageTimer()
+    lab_image, candidate_boxes = prepare_candidates(
+        bgr_image, min_w, max_w, min_h, max_h, edge_detection_method,
+        cache, digest, candidate_generator, lab_conversion, timer
+    )
+    
+    # Score every candidate perimeter in batched passes
+    with timer.stage("validation"):
+        if lab_image is None:
+            return score_boxes(bgr_image, candidate_boxes, executor, num_chunks, from_bgr=True, delta_e_metric=delta_e_metric)
+        return score_boxes(lab_image, candidate_boxes, executor, num_chunks, delta_e_metric=delta_e_metric)
+
+def _decode(data: bytes) -> np.ndarray:
+    bgr_image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
     if bgr_image is None:
         raise ValueError("Could not load image")
-        
-    lab_image = bgr_to_lab(bgr_image)
-    h_img, w_img, _ = bgr_image.shape
-    
-    gray = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2GRAY)
+    return bgr_image
+
+def load_image(
+    image: Union[str, bytes, np.ndarray],
+    cache: Optional[PreprocessCache] = None
+) -> Tuple[np.ndarray, Optional[str]]:
+    """
+    Decode an image given as a file path, encoded bytes (PNG, JPEG, ...) or an
+    already decoded BGR array.
     
-    # Apply selected edge detection method
-    if edge_detection_method.lower() == "sobel":
-        edges = apply_sobel_edge_detection(gray)
-    else:  # default to canny
-        edges = cv2.Canny(gray, 50, 150)
+    Returns:
+        The BGR image and, when a cache is given, its content digest (the
+        decoded image itself is then cached under it)
+    """
+    if isinstance(image, np.ndarray):
+        if image.ndim != 3 or image.shape[2] != 3:
+            raise ValueError("Expected an (H, W, 3) BGR image")
+        return image, content_digest(image) if cache is not None else None
     
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        data = bytes(image)
+    elif cache is None:
+        bgr_image = cv2.imread(image)
+        if bgr_image is None:
+            raise ValueError("Could not load image")
+        return bgr_image, None
+    else:
+        try:
+            with open(image, "rb") as f:
+                data = f.read()
+        except OSError:
+            raise ValueError("Could not load image")
     
-    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    if cache is None:
+        return _decode(data), None
+    digest = content_digest(data)
+    return cache.get_or_compute((digest, "bgr"), lambda: _decode(data)), digest
+
+def detect_features(
+    image: Union[str, bytes, np.ndarray],
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int,
+    delta_e_threshold: float,
+    edge_detection_method: str = "canny",
+    color_estimator: str = "mean",
+    color_region: str = "interior",
+    exclusivity_engine: str = "index",
+    num_threads: int = 1,
+    cache: Optional[PreprocessCache] = None,
+    candidate_generator: str = "contours",
+    validation_mode: str = "scores",
+    lab_conversion: str = "full",
+    delta_e_metric: str = "cie76",
+    on_stage: Optional[Callable[[StageStats], None]] = None,
+    trace_memory: bool = False
+) -> DetectionResult:
+    """
+    Detect features in an image file path, encoded image bytes or BGR array.
     
-    candidates = []
+    With a PreprocessCache, the image is identified by a hash of its content
+    and every threshold-independent step (decoding, Lab conversion, edges,
+    contours, candidate scores) is reused from earlier calls on the same
+    content. Re-running with only a new Delta E threshold skips straight to
+    selection.
     
-    seen_boxes = set()
+    The result's stages hold the time and output count of every stage that
+    ran (see DETECTION_STAGES). on_stage is called as each one finishes, and
+    trace_memory adds each stage's tracemalloc peak.
+    """
+    start_time = time.perf_counter()
     
-    for cnt in contours:
-        x, y, w, h = cv2.boundingRect(cnt)
-        
-        if not is_valid_candidate(w, h, min_w, max_w, min_h, max_h):
-            continue
-            
-        box_key = (x, y, w, h)
-        if box_key in seen_boxes:
-            continue
-        seen_boxes.add(box_key)
-        
-        perimeter_coords = get_outline_coordinates(x, y, w, h)
+    with StageTimer(on_stage, trace_memory) as timer:
+        with timer.stage("decode"):
+            bgr_image, digest = load_image(image, cache)
         
-        valid_coords = []
-        for px, py in perimeter_coords:
-            if 0 <= px < w_img and 0 <= py < h_img:
-                valid_coords.append((px, py))
-        
-        if not valid_coords:
-            continue
-            
-        rows = [c[1] for c in valid_coords]
-        cols = [c[0] for c in valid_coords]
-        colors = lab_image[rows, cols] # Shape (N, 3)
-        
-        N = len(colors)
-        has_match = np.zeros(N, dtype=bool)
+        return _detect_in_image(
+            bgr_image, min_w, max_w, min_h, max_h, delta_e_threshold,
+            edge_detection_method, color_estimator, color_region, exclusivity_engine,
+            num_threads, cache=cache, digest=digest, start_time=start_time,
+            candidate_generator=candidate_generator, validation_mode=validation_mode,
+            lab_conversion=lab_conversion, delta_e_metric=delta_e_metric, timer=timer
+        )
+
+def detect_features_with_overlay(
+    image: Union[str, bytes, np.ndarray],
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int,
+    delta_e_threshold: float,
+    edge_detection_method: str = "canny",
+    **options
+) -> Tuple[DetectionResult, np.ndarray]:
+    """
+    Decode the image once, detect features in it and draw them on a copy.
+    
+    Args:
+        **options: Further detect_features keyword arguments
+    
+    Returns:
+        The DetectionResult, with an overlay stage, and the BGR overlay image
+    """
+    start_time = time.perf_counter()
+    on_stage = options.pop("on_stage", None)
+    trace_memory = options.pop("trace_memory", False)
+    
+    with StageTimer(on_stage, trace_memory) as timer:
+        with timer.stage("decode"):
+            bgr_image, digest = load_image(image, options.get("cache"))
         
-        for k in range(1, 11):
-            
-            # Forward neighbors
-            shifted_fwd = np.roll(colors, -k, axis=0)
-            dists_fwd = np.linalg.norm(colors - shifted_fwd, axis=1)
-            has_match |= (dists_fwd <= delta_e_threshold)
-            
-            # Backward neighbors
-            shifted_bwd = np.roll(colors, k, axis=0)
-            dists_bwd = np.linalg.norm(colors - shifted_bwd, axis=1)
-            has_match |= (dists_bwd <= delta_e_threshold)
-            
-        match_count = np.sum(has_match)
-        validation_ratio = match_count / N if N > 0 else 0
+        result = _detect_in_image(
+            bgr_image, min_w, max_w, min_h, max_h, delta_e_threshold,
+            edge_detection_method, digest=digest, start_time=start_time, timer=timer, **options
+        )
+        with timer.stage("overlay"):
+            overlay = create_overlay_image(bgr_image, result.bounding_boxes)
+    return result, overlay
+
+def check_selection_options(
+    color_estimator: str,
+    color_region: str,
+    delta_e_metric: str,
+    exclusivity_engine: str = "index"
+) -> str:
+    """
+    Validate the scoring, exclusivity and color options every detection mode
+    shares, raising ValueError for an unknown one.
+    
+    Returns:
+        delta_e_metric, lowercased
+    """
+    if color_estimator not in COLOR_ESTIMATORS:
+        raise ValueError(f"Unknown color estimator: {color_estimator}")
+    if color_region not in COLOR_REGIONS:
+        raise ValueError(f"Unknown color region: {color_region}")
+    if exclusivity_engine not in EXCLUSIVITY_ENGINES:
+        raise ValueError(f"Unknown exclusivity engine: {exclusivity_engine}")
+    delta_e_metric = delta_e_metric.lower()
+    if delta_e_metric not in DELTA_E_METRICS:
+        raise ValueError(f"Unknown Delta E metric: {delta_e_metric}")
+    return delta_e_metric
+
+def _detect_in_image(
+    bgr_image: np.ndarray,
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int,
+    delta_e_threshold: float,
+    edge_detection_method: str = "canny",
+    color_estimator: str = "mean",
+    color_region: str = "interior",
+    exclusivity_engine: str = "index",
+    num_threads: int = 1,
+    cache: Optional[PreprocessCache] = None,
+    digest: Optional[str] = None,
+    start_time: Optional[float] = None,
+    candidate_generator: str = "contours",
+    validation_mode: str = "scores",
+    lab_conversion: str = "full",
+    delta_e_metric: str = "cie76",
+    timer: Optional[StageTimer] = None,
+    on_stage: Optional[Callable[[StageStats], None]] = None,
+    trace_memory: bool = False
+) -> DetectionResult:
+    """
+    Detection on an already decoded BGR image. With a cache and the image's
+    content digest, preprocessing and candidate scores are cached.
+
+    validation_mode "scores" computes threshold-independent CandidateScores
+    (cached, so threshold changes are cheap). "early_exit" validates at this
+    threshold only, stopping on each candidate as soon as it cannot reach the
+    required support (see streaming_select). It is cheaper when most candidates
+    fail, and accepts exactly the same boxes with the same ratios.
+
+    lab_conversion "sparse" converts only the sampled perimeter pixels to Lab
+    instead of the whole image, with the same values; "auto" chooses by the
+    total perimeter length of the candidates.
+
+    delta_e_metric selects the color difference used for validation: "cie76"
+    (default), "cie94" or "ciede2000" (see DELTA_E_METRICS). The threshold is
+    in the units of that metric.
+
+    With num_threads > 1, perimeter scoring and color extraction are spread
+    over a thread pool. Results are merged in candidate order before the
+    score sort, so they are identical for any thread count.
+
+    Stages are recorded on timer, or without one on a StageTimer of its own
+    built from on_stage and trace_memory (see detect_features).
+    """
+    delta_e_metric = check_selection_options(color_estimator, color_region, delta_e_metric, exclusivity_engine)
+    if num_threads < 1:
+        raise ValueError("num_threads must be at least 1")
+    if candidate_generator not in CANDIDATE_GENERATORS:
+        raise ValueError(f"Unknown candidate generator: {candidate_generator}")
+    if validation_mode not in VALIDATION_MODES:
+        raise ValueError(f"Unknown validation mode: {validation_mode}")
+    if lab_conversion not in LAB_CONVERSIONS:
+        raise ValueError(f"Unknown Lab conversion: {lab_conversion}")
+    
+    if start_time is None:
+        start_time = time.perf_counter()
+    owns_timer = timer is None
+    if owns_timer:
+        timer = StageTimer(on_stage, trace_memory)
+    
+    with timer if owns_timer else nullcontext():
+        executor = ThreadPoolExecutor(max_workers=num_threads) if num_threads > 1 else None
+        try:
+            if validation_mode == "early_exit":
+                lab_image, candidate_boxes = prepare_candidates(
+                    bgr_image, min_w, max_w, min_h, max_h, edge_detection_method,
+                    cache, digest, candidate_generator, lab_conversion, timer
+                )
+                with timer.stage("validation") as stage:
+                    if lab_image is None:
+                        boxes, passing, ratios = select_boxes(
+                            bgr_image, candidate_boxes, delta_e_threshold, executor, num_threads,
+                            from_bgr=True, delta_e_metric=delta_e_metric
+                        )
+                    else:
+                        boxes, passing, ratios = select_boxes(
+                            lab_image, candidate_boxes, delta_e_threshold, executor, num_threads,
+                            delta_e_metric=delta_e_metric
+                        )
+                    stage.count = len(passing)
+            else:
+                # Only the threshold changed since a previous call: skip straight to selection
+                score_key = None
+                if digest is not None:
+                    score_key = (digest, "scores", delta_e_metric, candidate_generator, edge_detection_method.lower(), min_w, max_w, min_h, max_h)
+                scores = _cached(cache, score_key, lambda: score_candidates(
+                    bgr_image, min_w, max_w, min_h, max_h, edge_detection_method,
+                    executor=executor, num_chunks=num_threads, cache=cache, digest=digest,
+                    candidate_generator=candidate_generator, lab_conversion=lab_conversion,
+                    delta_e_metric=delta_e_metric, timer=timer
+                ))
+                boxes = scores.boxes
+                with timer.stage("validation") as stage:
+                    passing, ratios = scores.select(delta_e_threshold)
+                    stage.count = len(passing)
         
-        if validation_ratio >= 0.80:
-            # Extract dominant color from the region
-            color_hex = get_dominant_color(bgr_image, x, y, w, h)
-            
-            candidates.append(BoundingBox(
-                x=x, y=y, w=w, h=h,
-                score=validation_ratio,
-                validation_ratio=validation_ratio,
-                color_hex=color_hex
-            ))
-            
-    candidates.sort(key=lambda b: b.score, reverse=True)
-    
-    final_boxes = []
-    occupancy_mask = np.zeros((h_img, w_img), dtype=np.uint8)
-    
-    for box in candidates:
-        if not check_overlap_mask(occupancy_mask, box.x, box.y, box.w, box.h):
-            final_boxes.append(box)
-            mark_occupied(occupancy_mask, box.x, box.y, box.w, box.h)
-            
-    processing_time = (time.time() - start_time) * 1000
+            final_boxes = select_features(
+                bgr_image, boxes, passing, ratios,
+                color_estimator, color_region, exclusivity_engine, executor, timer=timer
+            )
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    
+    processing_time = (time.perf_counter() - start_time) * 1000
     
     return DetectionResult(
         bounding_boxes=final_boxes,
-        delta_e_method="CIE76 (Euclidean on Standard Lab)",
+        delta_e_method=DELTA_E_METHOD_NAMES[delta_e_metric],
         delta_e_threshold=delta_e_threshold,
-        processing_time_ms=processing_time
+        processing_time_ms=processing_time,
+        stages=timer.stages
     )
 
+
+def select_features(
+    bgr_image: np.ndarray,
+    boxes: Sequence[Tuple[int, int, int, int]],
+    passing: np.ndarray,
+    ratios: np.ndarray,
+    color_estimator: str = "mean",
+    color_region: str = "interior",
+    exclusivity_engine: str = "index",
+    executor: Optional[Executor] = None,
+    color_cache: Optional[Dict[Tuple[int, int, int, int], Optional[str]]] = None,
+    timer: Optional[StageTimer] = None
+) -> BoxArray:
+    """
+    Rank the validated candidates by score, keep the exclusive ones and
+    extract their dominant colors.
+    
+    Args:
+        boxes: Candidate (x, y, w, h) boxes, in candidate order
+        passing: Indices into boxes of the candidates that passed validation,
+            in candidate order
+        ratios: Their validation ratios
+        executor: Optional pool the color extraction is spread over
+        color_cache: Optional box -> color map, reused and filled in, for
+            callers selecting from the same image many times
+        timer: Optional StageTimer recording the exclusivity and color stages
+    
+    Returns:
+        The final bounding boxes, in score order
+    """
+    h_img, w_img = bgr_image.shape[:2]
+    timer = timer or StageTimer()
+    
+    with timer.stage("exclusivity") as stage:
+        candidate_boxes = np.array([boxes[i] for i in passing], dtype=np.int32).reshape(-1, 4)
+        ratios = np.asarray(ratios, dtype=np.float64)
+        
+        # Stable, so equal scores keep candidate order
+        order = np.argsort(-ratios, kind="stable")
+        candidate_boxes, ratios = candidate_boxes[order], ratios[order]
+        
+        kept = select_exclusive([tuple(box) for box in candidate_boxes.tolist()], (h_img, w_img), exclusivity_engine)
+        final_boxes = BoxArray.from_columns(candidate_boxes[kept], ratios[kept], ratios[kept])
+        stage.count = len(final_boxes)
+    
+    # Extract dominant colors only for the boxes that survived exclusivity
+    def box_color(box: Tuple[int, int, int, int]) -> Optional[str]:
+        if color_cache is None:
+            return get_dominant_color(bgr_image, *box, color_estimator, color_region)
+        if box not in color_cache:
+            color_cache[box] = get_dominant_color(bgr_image, *box, color_estimator, color_region)
+        return color_cache[box]
+    
+    with timer.stage("color", count=len(final_boxes)):
+        kept_boxes = [tuple(box) for box in final_boxes.boxes().tolist()]
+        colors = executor.map(box_color, kept_boxes) if executor is not None else map(box_color, kept_boxes)
+        final_boxes["color"][:] = [pack_color(color_hex) for color_hex in colors]
+    
+    return final_boxes
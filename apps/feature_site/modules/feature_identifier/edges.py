@@ -0,0 +1,190 @@
+import cv2
+import numpy as np
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Canny hysteresis thresholds
+CANNY_LOW = 50
+CANNY_HIGH = 150
+
+# Gradient magnitude threshold on the 0-255 normalized scale
+SOBEL_THRESHOLD = 100
+
+@dataclass
+class EdgeBackend:
+    """
+    An edge detector selectable by name through edge_detection_method.
+
+    detect(gray, max_magnitude) returns a binary uint8 edge map. Backends that
+    normalize by the image's maximum gradient also provide magnitude(gray), so
+    tiled callers can compute the whole-image maximum and pass it back in.
+    """
+    name: str
+    detect: Callable[[np.ndarray, Optional[float]], np.ndarray]
+    magnitude: Optional[Callable[[np.ndarray], np.ndarray]] = None
+
+EDGE_BACKENDS: Dict[str, EdgeBackend] = {}
+
+# Backend used for unknown method names
+DEFAULT_EDGE_BACKEND = "canny"
+
+def register_edge_backend(
+    name: str,
+    detect: Callable[[np.ndarray, Optional[float]], np.ndarray],
+    magnitude: Optional[Callable[[np.ndarray], np.ndarray]] = None
+) -> EdgeBackend:
+    backend = EdgeBackend(name=name.lower(), detect=detect, magnitude=magnitude)
+    EDGE_BACKENDS[backend.name] = backend
+    return backend
+
+def get_edge_backend(edge_detection_method: str) -> EdgeBackend:
+    """
+    Backend registered under the (case-insensitive) name. Unknown names fall
+    back to Canny, as the detector always has.
+    """
+    return EDGE_BACKENDS.get(edge_detection_method.lower(), EDGE_BACKENDS[DEFAULT_EDGE_BACKEND])
+
+def sobel_magnitude(gray_image: np.ndarray) -> np.ndarray:
+    """
+    Gradient magnitude of a grayscale image (float64, 3x3 Sobel).
+    """
+    # Apply Sobel operator in x and y directions
+    sobelx = cv2.Sobel(gray_image, cv2.CV_64F, 1, 0, ksize=3)
+    sobely = cv2.Sobel(gray_image, cv2.CV_64F, 0, 1, ksize=3)
+
+    # Compute magnitude
+    return np.sqrt(sobelx**2 + sobely**2)
+
+def apply_sobel_edge_detection(gray_image: np.ndarray, max_magnitude: Optional[float] = None) -> np.ndarray:
+    """
+    Apply Sobel edge detection to an image.
+
+    Args:
+        gray_image: Grayscale image
+        max_magnitude: Magnitude normalized to 255. Defaults to the image's own
+            maximum; pass the whole image's maximum when processing a tile of it.
+
+    Returns:
+        Binary edge map
+    """
+    magnitude = sobel_magnitude(gray_image)
+
+    if max_magnitude is None:
+        max_magnitude = np.max(magnitude)
+
+    # Normalize to 0-255
+    magnitude = np.uint8(255 * magnitude / max_magnitude)
+
+    # Apply threshold to get binary image
+    _, edges = cv2.threshold(magnitude, SOBEL_THRESHOLD, 255, cv2.THRESH_BINARY)
+
+    return edges
+
+def sobel_gradients(gray_image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    int16 3x3 Sobel gradients with the border handling cv2.Canny uses
+    internally, so they can be fed to it directly.
+    """
+    dx = cv2.Sobel(gray_image, cv2.CV_16S, 1, 0, ksize=3, borderType=cv2.BORDER_REPLICATE)
+    dy = cv2.Sobel(gray_image, cv2.CV_16S, 0, 1, ksize=3, borderType=cv2.BORDER_REPLICATE)
+    return dx, dy
+
+def threshold_normalized(magnitude: np.ndarray, max_magnitude: Optional[float] = None) -> np.ndarray:
+    """
+    Binary edge map of a gradient magnitude: pixels whose magnitude, scaled so
+    max_magnitude maps to 255 and truncated, exceeds SOBEL_THRESHOLD.
+    Computed without materializing the scaled image.
+    """
+    if max_magnitude is None:
+        max_magnitude = float(np.max(magnitude)) if magnitude.size else 0.0
+    if max_magnitude <= 0:
+        return np.zeros(magnitude.shape, dtype=np.uint8)
+    # uint8(255 * m / max) > T  <=>  m >= (T + 1) * max / 255
+    return cv2.compare(magnitude, (SOBEL_THRESHOLD + 1) * max_magnitude / 255.0, cv2.CMP_GE)
+
+def sobel_f32_magnitude(gray_image: np.ndarray) -> np.ndarray:
+    sobelx = cv2.Sobel(gray_image, cv2.CV_32F, 1, 0, ksize=3)
+    sobely = cv2.Sobel(gray_image, cv2.CV_32F, 0, 1, ksize=3)
+    return cv2.magnitude(sobelx, sobely)
+
+def sobel_l1_magnitude(gray_image: np.ndarray) -> np.ndarray:
+    # |dx| + |dy| of 3x3 Sobel gradients is at most 2040, well within int16
+    dx, dy = sobel_gradients(gray_image)
+    return cv2.add(np.abs(dx), np.abs(dy))
+
+def scharr_magnitude(gray_image: np.ndarray) -> np.ndarray:
+    scharrx = cv2.Scharr(gray_image, cv2.CV_32F, 1, 0)
+    scharry = cv2.Scharr(gray_image, cv2.CV_32F, 0, 1)
+    return cv2.magnitude(scharrx, scharry)
+
+def canny_from_gradients(gray_image: np.ndarray, max_magnitude: Optional[float] = None) -> np.ndarray:
+    """
+    Canny on precomputed int16 Sobel gradients. Same edges as cv2.Canny on
+    the image, with the gradients available for reuse.
+    """
+    dx, dy = sobel_gradients(gray_image)
+    return cv2.Canny(dx, dy, CANNY_LOW, CANNY_HIGH)
+
+def _normalized_backend(magnitude: Callable[[np.ndarray], np.ndarray]) -> Callable[[np.ndarray, Optional[float]], np.ndarray]:
+    def detect(gray_image: np.ndarray, max_magnitude: Optional[float] = None) -> np.ndarray:
+        return threshold_normalized(magnitude(gray_image), max_magnitude)
+    return detect
+
+register_edge_backend("canny", lambda gray, max_magnitude=None: cv2.Canny(gray, CANNY_LOW, CANNY_HIGH))
+register_edge_backend("canny_gradients", canny_from_gradients)
+register_edge_backend("sobel", apply_sobel_edge_detection, sobel_magnitude)
+register_edge_backend("sobel_f32", _normalized_backend(sobel_f32_magnitude), sobel_f32_magnitude)
+register_edge_backend("sobel_l1", _normalized_backend(sobel_l1_magnitude), sobel_l1_magnitude)
+register_edge_backend("scharr", _normalized_backend(scharr_magnitude), scharr_magnitude)
+
+def detect_edges(gray_image: np.ndarray, edge_detection_method: str = "canny", max_magnitude: Optional[float] = None) -> np.ndarray:
+    """
+    Binary edge map of a grayscale image with the selected backend (see EDGE_BACKENDS).
+    max_magnitude is forwarded to backends that normalize by the maximum gradient.
+    """
+    return get_edge_backend(edge_detection_method).detect(gray_image, max_magnitude)
+
+def profile_edge_backends(
+    gray_image: np.ndarray,
+    methods: Optional[Iterable[str]] = None,
+    repeat: int = 3
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time and memory of each edge backend on an image.
+
+    Returns:
+        Per backend: best wall time over `repeat` runs (time_ms), peak memory
+        allocated through NumPy during one run (peak_bytes; OpenCV's internal
+        scratch buffers are not seen) and the fraction of pixels marked as
+        edges (edge_fraction)
+    """
+    methods = list(methods) if methods is not None else list(EDGE_BACKENDS)
+    report = {}
+    for method in methods:
+        backend = get_edge_backend(method)
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            edges = backend.detect(gray_image, None)
+            best = min(best, time.perf_counter() - start)
+        del edges
+
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        edges = backend.detect(gray_image, None)
+        _, peak = tracemalloc.get_traced_memory()
+        if not was_tracing:
+            tracemalloc.stop()
+
+        report[backend.name] = {
+            "time_ms": best * 1000,
+            "peak_bytes": peak - baseline,
+            "edge_fraction": float(np.count_nonzero(edges)) / edges.size if edges.size else 0.0
+        }
+    return report
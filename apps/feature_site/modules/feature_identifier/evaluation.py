@@ -0,0 +1,157 @@
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+import numpy as np
+from .detector import detect_features
+from .edges import DEFAULT_EDGE_BACKEND
+from .geometry import match_boxes
+
+def ground_truth_boxes(features: Iterable[Mapping[str, Any]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Boxes of create_sample_image / generate_scene features as the detector
+    reports them. A rectangle covers one pixel past w and h. An ellipse is
+    drawn with semi-axes w // 2 and h // 2 around (x + w // 2, y + h // 2),
+    so it covers 2 * (w // 2) + 1 by 2 * (h // 2) + 1 pixels, one short of
+    a rectangle's when w or h is even.
+    """
+    boxes = []
+    for f in features:
+        if f.get('shape') == 'ellipse':
+            boxes.append((f['x'], f['y'], 2 * (f['w'] // 2) + 1, 2 * (f['h'] // 2) + 1))
+        else:
+            boxes.append((f['x'], f['y'], f['w'] + 1, f['h'] + 1))
+    return boxes
+
+@dataclass
+class EvaluationStats:
+    """
+    Accuracy and speed of one detector configuration over a corpus.
+    """
+    config: Dict[str, Any]
+    edge_detection_method: str
+    images: int = 0
+    megapixels: float = 0.0
+    truth: int = 0           # Ground-truth features
+    detected: int = 0        # Boxes returned by the detector
+    matched: int = 0         # One-to-one matches with IoU >= min_iou
+    iou_sum: float = 0.0     # Summed IoU of the matches
+    detect_seconds: float = 0.0
+    per_image_recall: List[float] = field(default_factory=list, repr=False)
+
+    @property
+    def precision(self) -> float:
+        return self.matched / self.detected if self.detected else 0.0
+
+    @property
+    def recall(self) -> float:
+        return self.matched / self.truth if self.truth else 0.0
+
+    @property
+    def f1(self) -> float:
+        total = self.detected + self.truth
+        return 2 * self.matched / total if total else 0.0
+
+    @property
+    def mean_iou(self) -> float:
+        return self.iou_sum / self.matched if self.matched else 0.0
+
+    @property
+    def worst_image_recall(self) -> float:
+        return min(self.per_image_recall) if self.per_image_recall else 0.0
+
+    @property
+    def images_per_second(self) -> float:
+        return self.images / self.detect_seconds if self.detect_seconds else 0.0
+
+    @property
+    def megapixels_per_second(self) -> float:
+        return self.megapixels / self.detect_seconds if self.detect_seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Counts and derived metrics, JSON-serializable.
+        """
+        stats = asdict(self)
+        del stats['per_image_recall']
+        for name in ('precision', 'recall', 'f1', 'mean_iou', 'worst_image_recall', 'images_per_second', 'megapixels_per_second'):
+            stats[name] = getattr(self, name)
+        return stats
+
+def evaluate_detector(
+    corpus: Iterable[Tuple[np.ndarray, Sequence[Mapping[str, Any]]]],
+    configs: Iterable[Mapping[str, Any]] = ({},),
+    edge_methods: Sequence[str] = (DEFAULT_EDGE_BACKEND,),
+    min_iou: float = 0.5,
+    warmup: bool = True,
+    **base: Any
+) -> List[EvaluationStats]:
+    """
+    Run detect_features with every configuration and edge method on every
+    image of a corpus, and match the detections to the ground truth.
+
+    Each configuration holds detect_features keyword arguments, applied
+    over base (which typically holds min_w, max_w, min_h, max_h and
+    delta_e_threshold), e.g. from sweep.parameter_grid. A configuration
+    holding edge_detection_method runs with that method only, instead of
+    every one in edge_methods. Throughput counts
+    only detect_features time, on images already decoded, with no cache
+    shared between runs. With warmup, every run is first done once untimed
+    on the first image, so one-time costs do not land on the first entry.
+
+    Args:
+        corpus: (BGR image, ground-truth feature dicts) pairs, such as
+            dataset_builder.iter_dataset produces
+        min_iou: Lowest IoU counted as a match
+
+    Returns:
+        One EvaluationStats per (configuration, edge method), in that order
+    """
+    if 'edge_detection_method' in base:
+        raise ValueError("Pass edge methods through edge_methods or the configurations")
+    stats = []
+    for config in configs:
+        config = dict(config)
+        methods = [config.pop('edge_detection_method')] if 'edge_detection_method' in config else edge_methods
+        stats.extend(EvaluationStats(config=config, edge_detection_method=method) for method in methods)
+    for position, (image, features) in enumerate(corpus):
+        if warmup and position == 0:
+            for entry in stats:
+                detect_features(image, edge_detection_method=entry.edge_detection_method, **dict(base, **entry.config))
+        truth = ground_truth_boxes(features)
+        megapixels = image.shape[0] * image.shape[1] / 1e6
+        for entry in stats:
+            options = dict(base, **entry.config)
+            start = time.perf_counter()
+            result = detect_features(image, edge_detection_method=entry.edge_detection_method, **options)
+            entry.detect_seconds += time.perf_counter() - start
+
+            matches = match_boxes(truth, result.bounding_boxes.boxes(), min_iou)
+            entry.images += 1
+            entry.megapixels += megapixels
+            entry.truth += len(truth)
+            entry.detected += len(result.bounding_boxes)
+            entry.matched += len(matches)
+            entry.iou_sum += sum(iou for _, _, iou in matches)
+            entry.per_image_recall.append(len(matches) / len(truth) if truth else 1.0)
+    return stats
+
+def format_evaluation_table(stats: Sequence[EvaluationStats]) -> str:
+    """
+    Plain-text table of evaluation results, one row per configuration and
+    edge method.
+    """
+    def describe(config):
+        return ' '.join(f"{name}={value}" for name, value in config.items()) or '(defaults)'
+
+    width = max([len('config')] + [len(describe(entry.config)) for entry in stats])
+    lines = [
+        f"{'config':<{width}} {'edges':<16} {'truth':>7} {'found':>7} {'precision':>9} {'recall':>7} "
+        f"{'f1':>6} {'iou':>5} {'images/s':>9} {'MP/s':>7}"
+    ]
+    for entry in stats:
+        lines.append(
+            f"{describe(entry.config):<{width}} {entry.edge_detection_method:<16} {entry.truth:>7} {entry.detected:>7} "
+            f"{entry.precision:>9.1%} {entry.recall:>7.1%} {entry.f1:>6.3f} {entry.mean_iou:>5.2f} "
+            f"{entry.images_per_second:>9.1f} {entry.megapixels_per_second:>7.1f}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,161 @@
+import io
+import json
+import struct
+import numpy as np
+from typing import Dict, Iterator, Optional
+from .schemas import BOX_DTYPE, NO_COLOR, BoxArray, DetectionResult
+
+# Export format -> Content-Type
+EXPORT_FORMATS: Dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+    "npz": "application/x-npz",
+    "binary": "application/octet-stream"
+}
+
+EXPORT_EXTENSIONS = {"ndjson": "ndjson", "json": "json", "npz": "npz", "binary": "fidb"}
+
+DEFAULT_EXPORT_FORMAT = "ndjson"
+
+# Boxes serialized per yielded chunk by the streaming formats
+EXPORT_CHUNK_BOXES = 4096
+
+# Fixed-width binary layout: a header, the UTF-8 Delta E method name, then
+# one little-endian BOX_DTYPE record (36 bytes, no padding) per box
+BINARY_MAGIC = b"FIDB"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sHHQddI")  # magic, version, record size, count, threshold, time, name length
+BINARY_RECORD_DTYPE = BOX_DTYPE.newbyteorder("<")
+
+def negotiate_export_format(requested: Optional[str] = None, accept: Optional[str] = None) -> str:
+    """
+    Export format from an explicit name (e.g. a query parameter) or else an
+    Accept header, in the header's order. Defaults to DEFAULT_EXPORT_FORMAT.
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {requested}")
+        return requested
+
+    by_type = {content_type: name for name, content_type in EXPORT_FORMATS.items()}
+    for media_range in (accept or "").split(","):
+        content_type = media_range.split(";")[0].strip().lower()
+        if content_type in by_type:
+            return by_type[content_type]
+    return DEFAULT_EXPORT_FORMAT
+
+def _metadata(result: DetectionResult) -> Dict[str, object]:
+    return {
+        "delta_e_method": result.delta_e_method,
+        "delta_e_threshold": result.delta_e_threshold,
+        "processing_time_ms": result.processing_time_ms
+    }
+
+# Compact JSON object of one box, as json.dumps(..., separators=(",", ":"))
+# writes it: ints and float reprs as is, the color as a string or null
+_BOX_JSON = '{{"x":{},"y":{},"w":{},"h":{},"score":{!r},"validation_ratio":{!r},"color_hex":{}}}'
+
+def _box_lines(boxes: BoxArray, separator: str) -> Iterator[str]:
+    """
+    Compact JSON objects of the boxes, EXPORT_CHUNK_BOXES at a time, joined
+    by separator (each chunk also ends with it). Formatted from the columns
+    directly, without building a dict per box.
+    """
+    rows = boxes.rows
+    template = _BOX_JSON + separator
+    for start in range(0, len(rows), EXPORT_CHUNK_BOXES):
+        chunk = rows[start:start + EXPORT_CHUNK_BOXES]
+        colors = [
+            "null" if color == NO_COLOR else f'"#{color:06X}"'
+            for color in chunk["color"].tolist()
+        ]
+        columns = [chunk[name].tolist() for name in BOX_DTYPE.names[:-1]] + [colors]
+        yield "".join(template.format(*values) for values in zip(*columns))
+
+def iter_ndjson(result: DetectionResult) -> Iterator[bytes]:
+    """
+    Newline-delimited JSON: a first line with the result's metadata and box
+    count, then one line per box.
+    """
+    header = dict(_metadata(result), count=len(result.bounding_boxes))
+    yield (json.dumps(header, separators=(",", ":")) + "\n").encode()
+    for lines in _box_lines(result.bounding_boxes, "\n"):
+        yield lines.encode()
+
+def iter_json(result: DetectionResult) -> Iterator[bytes]:
+    """
+    The same document as the web page's JSON response, compact, built and
+    yielded in chunks.
+    """
+    yield b'{"bounding_boxes":['
+    first = True
+    for lines in _box_lines(result.bounding_boxes, ","):
+        # Every chunk ends with a separator; the next chunk supplies it instead
+        if not first:
+            yield b","
+        yield lines[:-1].encode()
+        first = False
+    metadata = json.dumps(_metadata(result), separators=(",", ":"))
+    yield b"]," + metadata[1:].encode()
+
+def to_npz(result: DetectionResult) -> bytes:
+    """
+    NumPy .npz archive with one array per BOX_DTYPE column plus the metadata
+    (delta_e_method as a 0-d string array).
+    """
+    rows = result.bounding_boxes.rows
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        **{name: rows[name] for name in BOX_DTYPE.names},
+        delta_e_method=np.array(result.delta_e_method),
+        delta_e_threshold=np.array(result.delta_e_threshold, dtype=np.float64),
+        processing_time_ms=np.array(result.processing_time_ms, dtype=np.float64)
+    )
+    return buffer.getvalue()
+
+def iter_binary(result: DetectionResult) -> Iterator[bytes]:
+    """
+    Fixed-width binary layout (see BINARY_HEADER). Records can be read
+    with np.frombuffer(data, BINARY_RECORD_DTYPE, count, offset).
+    """
+    method = result.delta_e_method.encode()
+    rows = result.bounding_boxes.rows.astype(BINARY_RECORD_DTYPE, copy=False)
+    yield BINARY_HEADER.pack(
+        BINARY_MAGIC, BINARY_VERSION, BINARY_RECORD_DTYPE.itemsize, len(rows),
+        result.delta_e_threshold, result.processing_time_ms, len(method)
+    ) + method
+    for start in range(0, len(rows), EXPORT_CHUNK_BOXES):
+        yield rows[start:start + EXPORT_CHUNK_BOXES].tobytes()
+
+def read_binary(data: bytes) -> DetectionResult:
+    """
+    Parse the output of iter_binary. The boxes are a read-only view of data.
+    """
+    magic, version, record_size, count, threshold, time_ms, name_length = BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION or record_size != BINARY_RECORD_DTYPE.itemsize:
+        raise ValueError("Not a version 1 detection result")
+    offset = BINARY_HEADER.size
+    method = bytes(data[offset:offset + name_length]).decode()
+    rows = np.frombuffer(data, BINARY_RECORD_DTYPE, count, offset + name_length)
+    return DetectionResult(
+        bounding_boxes=BoxArray(rows.astype(BOX_DTYPE, copy=False)),
+        delta_e_method=method,
+        delta_e_threshold=threshold,
+        processing_time_ms=time_ms
+    )
+
+def export_result(result: DetectionResult, export_format: str) -> Iterator[bytes]:
+    """
+    Serialized result in the given format, as an iterator of byte chunks.
+    """
+    if export_format == "ndjson":
+        return iter_ndjson(result)
+    if export_format == "json":
+        return iter_json(result)
+    if export_format == "npz":
+        return iter([to_npz(result)])
+    if export_format == "binary":
+        return iter_binary(result)
+    raise ValueError(f"Unknown export format: {export_format}")
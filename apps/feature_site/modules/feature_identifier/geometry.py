@@ -1,5 +1,13 @@
 import numpy as np
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Distinct box sizes whose perimeter templates are kept (see perimeter_template)
+PERIMETER_TEMPLATE_CACHE_SIZE = 4096
+
+# Rectangles wider or taller than this many RectangleIndex cells go to a
+# coarser index instead of the grid
+LARGE_RECT_CELLS = 4
 
 def get_outline_coordinates(x: int, y: int, w: int, h: int) -> List[Tuple[int, int]]:
     """
@@ -20,6 +28,81 @@ def get_outline_coordinates(x: int, y: int, w: int, h: int) -> List[Tuple[int, i
 
     return top + right + bottom + left
 
+@lru_cache(maxsize=PERIMETER_TEMPLATE_CACHE_SIZE)
+def perimeter_template(w: int, h: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row and column offsets of a w x h box perimeter from its top-left corner,
+    as int32 arrays in get_outline_coordinates order.
+    
+    Templates are memoized by size and shared between callers, so the
+    returned arrays are read-only.
+    """
+    if w == 1:
+        rows, cols = np.arange(h), np.zeros(h, dtype=int)
+    elif h == 1:
+        rows, cols = np.zeros(w, dtype=int), np.arange(w)
+    else:
+        # Top -> right -> bottom -> left, as in get_outline_coordinates
+        top = np.arange(w)
+        right = np.arange(1, h)
+        bottom = np.arange(w - 2, -1, -1)
+        left = np.arange(h - 2, 0, -1)
+        rows = np.concatenate([np.zeros_like(top), right, np.full_like(bottom, h - 1), left])
+        cols = np.concatenate([top, np.full_like(right, w - 1), bottom, np.zeros_like(left)])
+    
+    rows, cols = rows.astype(np.int32), cols.astype(np.int32)
+    rows.flags.writeable = False
+    cols.flags.writeable = False
+    return rows, cols
+
+def perimeter_indices(x: int, y: int, w: int, h: int, image_shape: Tuple[int, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row and column indices (int32) of the in-bounds perimeter pixels of a box,
+    in perimeter order.
+    """
+    h_img, w_img = image_shape[:2]
+    t_rows, t_cols = perimeter_template(w, h)
+    rows, cols = t_rows + np.int32(y), t_cols + np.int32(x)
+    if x < 0 or y < 0 or x + w > w_img or y + h > h_img:
+        inside = (cols >= 0) & (cols < w_img) & (rows >= 0) & (rows < h_img)
+        rows, cols = rows[inside], cols[inside]
+    return rows, cols
+
+def pack_perimeter_indices(
+    boxes: Iterable[Tuple[int, int, int, int]],
+    image_shape: Tuple[int, ...]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[int]]:
+    """
+    In-bounds perimeter pixels of many boxes as flat int32 index arrays.
+    
+    Returns:
+        rows, cols, offsets (box k of the result owns rows[offsets[k]:offsets[k + 1]])
+        and the indices of the boxes kept (boxes without any in-bounds
+        perimeter pixel are dropped)
+    """
+    h_img, w_img = image_shape[:2]
+    boxes = np.asarray(list(boxes), dtype=np.int32).reshape(-1, 4)
+    if len(boxes) == 0:
+        empty = np.empty(0, dtype=np.int32)
+        return empty, empty, np.zeros(1, dtype=np.intp), []
+    
+    templates = [perimeter_template(w, h) for w, h in boxes[:, 2:].tolist()]
+    lengths = np.fromiter((len(t_rows) for t_rows, _ in templates), dtype=np.intp, count=len(templates))
+    rows = np.concatenate([t_rows for t_rows, _ in templates]) + np.repeat(boxes[:, 1], lengths)
+    cols = np.concatenate([t_cols for _, t_cols in templates]) + np.repeat(boxes[:, 0], lengths)
+    
+    # Clip at the image border in one pass over every pixel
+    inside = (cols >= 0) & (cols < w_img) & (rows >= 0) & (rows < h_img)
+    if not inside.all():
+        owner = np.repeat(np.arange(len(boxes)), lengths)
+        rows, cols = rows[inside], cols[inside]
+        lengths = np.bincount(owner[inside], minlength=len(boxes))
+    
+    kept = np.flatnonzero(lengths)
+    offsets = np.zeros(len(kept) + 1, dtype=np.intp)
+    np.cumsum(lengths[kept], out=offsets[1:])
+    return rows, cols, offsets, kept.tolist()
+
 def check_overlap_mask(mask: np.ndarray, x: int, y: int, w: int, h: int) -> bool:
     """
     Check if the region defined by x,y,w,h overlaps with any occupied pixels in the mask.
@@ -47,8 +130,169 @@ def mark_occupied(mask: np.ndarray, x: int, y: int, w: int, h: int) -> None:
     x2 = min(w_img, x + w)
     y2 = min(h_img, y + h)
     
+    # A negative end would wrap around as a slice index
+    if x1 >= x2 or y1 >= y2:
+        return
+        
     mask[y1:y2, x1:x2] = 1
 
 def is_valid_candidate(w: int, h: int, min_w: int, max_w: int, min_h: int, max_h: int) -> bool:
     return (min_w <= w <= max_w) and (min_h <= h <= max_h)
 
+
+EXCLUSIVITY_ENGINES = ("index", "mask")
+
+class RectangleIndex:
+    """
+    Uniform-grid spatial index of half-open rectangles [x1, x2) x [y1, y2).
+    Each rectangle is registered in every grid cell it touches, so an overlap
+    query only compares against rectangles sharing a cell with it. The cost
+    depends on the number of stored rectangles, not on their pixel area:
+    rectangles more than LARGE_RECT_CELLS cells across go to a coarser index
+    (LARGE_RECT_CELLS times the cell size, and so on for larger ones), and a
+    query covering more cells than are occupied scans the occupied cells
+    instead.
+    """
+    def __init__(self, cell_size: int = 64):
+        self.cell_size = max(1, int(cell_size))
+        self._cells: Dict[Tuple[int, int], List[Tuple[int, int, int, int]]] = {}
+        self._coarser: Optional["RectangleIndex"] = None
+
+    def _cells_for(self, x1: int, y1: int, x2: int, y2: int):
+        cs = self.cell_size
+        for cy in range(y1 // cs, (y2 - 1) // cs + 1):
+            for cx in range(x1 // cs, (x2 - 1) // cs + 1):
+                yield cx, cy
+
+    def _candidates(self, x1: int, y1: int, x2: int, y2: int):
+        cs = self.cell_size
+        cx1, cy1, cx2, cy2 = x1 // cs, y1 // cs, (x2 - 1) // cs, (y2 - 1) // cs
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self._cells):
+            for (cx, cy), rects in self._cells.items():
+                if cx1 <= cx <= cx2 and cy1 <= cy <= cy2:
+                    yield rects
+        else:
+            for cell in self._cells_for(x1, y1, x2, y2):
+                yield self._cells.get(cell, ())
+
+    def overlaps(self, x1: int, y1: int, x2: int, y2: int) -> bool:
+        if self._coarser is not None and self._coarser.overlaps(x1, y1, x2, y2):
+            return True
+        for rects in self._candidates(x1, y1, x2, y2):
+            for ox1, oy1, ox2, oy2 in rects:
+                if x1 < ox2 and ox1 < x2 and y1 < oy2 and oy1 < y2:
+                    return True
+        return False
+
+    def insert(self, x1: int, y1: int, x2: int, y2: int) -> None:
+        rect = (x1, y1, x2, y2)
+        limit = LARGE_RECT_CELLS * self.cell_size
+        if x2 - x1 > limit or y2 - y1 > limit:
+            if self._coarser is None:
+                self._coarser = RectangleIndex(limit)
+            self._coarser.insert(x1, y1, x2, y2)
+            return
+        for cell in self._cells_for(x1, y1, x2, y2):
+            self._cells.setdefault(cell, []).append(rect)
+
+def clip_box(x: int, y: int, w: int, h: int, w_img: int, h_img: int) -> Tuple[int, int, int, int]:
+    """
+    Clip the box to the image, returning (x1, y1, x2, y2) corners (may be empty).
+    """
+    return max(0, x), max(0, y), min(w_img, x + w), min(h_img, y + h)
+
+def select_exclusive(
+    boxes: Sequence[Tuple[int, int, int, int]],
+    image_shape: Tuple[int, int],
+    engine: str = "index"
+) -> List[int]:
+    """
+    Greedy exclusivity: walk the (x, y, w, h) boxes in order and keep each box
+    that does not overlap an already kept one (after clipping to the image).
+
+    Args:
+        boxes: Boxes in priority order (highest score first)
+        image_shape: (height, width) of the image
+        engine: "index" for a RectangleIndex, "mask" for a full-image
+            occupancy mask. Both make the same decisions.
+
+    Returns:
+        Indices of the kept boxes, in input order
+    """
+    h_img, w_img = image_shape[:2]
+    kept = []
+
+    if engine == "mask":
+        occupancy_mask = np.zeros((h_img, w_img), dtype=np.uint8)
+        for i, (x, y, w, h) in enumerate(boxes):
+            if not check_overlap_mask(occupancy_mask, x, y, w, h):
+                kept.append(i)
+                mark_occupied(occupancy_mask, x, y, w, h)
+        return kept
+
+    if engine != "index":
+        raise ValueError(f"Unknown exclusivity engine: {engine}")
+
+    # Size grid cells to the typical box so each box touches only a few cells
+    sizes = [max(w, h) for _, _, w, h in boxes]
+    index = RectangleIndex(cell_size=int(np.median(sizes)) if sizes else 64)
+
+    for i, (x, y, w, h) in enumerate(boxes):
+        x1, y1, x2, y2 = clip_box(x, y, w, h, w_img, h_img)
+        if x1 >= x2 or y1 >= y2:
+            # Mirrors the mask path: an empty region never overlaps or occupies
+            kept.append(i)
+            continue
+        if not index.overlaps(x1, y1, x2, y2):
+            kept.append(i)
+            index.insert(x1, y1, x2, y2)
+
+    return kept
+
+def box_iou(a: Tuple[int, int, int, int], b: Tuple[int, int, int, int]) -> float:
+    """
+    Intersection over union of two (x, y, w, h) boxes.
+    """
+    ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+def match_boxes(
+    reference: Sequence[Tuple[int, int, int, int]],
+    predicted: Sequence[Tuple[int, int, int, int]],
+    min_iou: float = 0.5
+) -> List[Tuple[int, int, float]]:
+    """
+    One-to-one matching of predicted boxes to reference boxes.
+    Pairs are taken greedily by decreasing IoU; ties go to the lower indices.
+
+    Returns:
+        (reference index, predicted index, IoU) for every match with IoU >= min_iou
+    """
+    if not len(reference) or not len(predicted):
+        return []
+
+    ref = np.asarray(reference, dtype=np.float64).reshape(-1, 4)
+    pred = np.asarray(predicted, dtype=np.float64).reshape(-1, 4)
+
+    ix = np.minimum(ref[:, None, 0] + ref[:, None, 2], pred[None, :, 0] + pred[None, :, 2]) - np.maximum(ref[:, None, 0], pred[None, :, 0])
+    iy = np.minimum(ref[:, None, 1] + ref[:, None, 3], pred[None, :, 1] + pred[None, :, 3]) - np.maximum(ref[:, None, 1], pred[None, :, 1])
+    inter = np.clip(ix, 0, None) * np.clip(iy, 0, None)
+    union = (ref[:, 2] * ref[:, 3])[:, None] + (pred[:, 2] * pred[:, 3])[None, :] - inter
+    iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+    rows, cols = np.nonzero(iou >= min_iou)
+    order = np.lexsort((cols, rows, -iou[rows, cols]))
+
+    matches = []
+    used_ref = set()
+    used_pred = set()
+    for r, c in zip(rows[order], cols[order]):
+        if r in used_ref or c in used_pred:
+            continue
+        used_ref.add(r)
+        used_pred.add(c)
+        matches.append((int(r), int(c), float(iou[r, c])))
+    return matches
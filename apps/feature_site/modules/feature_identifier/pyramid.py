@@ -0,0 +1,283 @@
+import cv2
+import numpy as np
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from .schemas import DetectionResult, StageStats
+from .stages import StageTimer
+from .color import DELTA_E_METHOD_NAMES
+from .geometry import is_valid_candidate, match_boxes
+from .validation import pack_perimeters, CandidateScores
+from .edges import detect_edges, get_edge_backend
+from .detector import _detect_in_image, check_selection_options, select_features
+
+# Smallest feature side, in pixels of the coarse level, that edge detection
+# still resolves reliably. The coarse level is picked so min_w and min_h stay above it.
+PYRAMID_MIN_FEATURE = 16
+
+# Deepest level used (a factor of 2 ** PYRAMID_MAX_LEVEL)
+PYRAMID_MAX_LEVEL = 4
+
+# Coarse box sides may be off by this many coarse pixels after downscaling
+COARSE_SIZE_SLACK = 2
+
+# Coarse candidates more than this many times max_w or max_h across are not
+# refined. Contours merging a few nearby features stay below it, while one
+# tracing a large region would make its refinement window most of the image.
+COARSE_MAX_OVERSIZE = 2
+
+# Extra full-resolution context read around every refinement window, so
+# 3x3 filters and non-maximum suppression see the box edges as on the whole image
+REFINE_PADDING = 8
+
+def pyramid_level(min_w: int, min_h: int, min_feature: int = PYRAMID_MIN_FEATURE) -> int:
+    """
+    Number of 2x downscales for the coarse candidate pass: the deepest level
+    at which the smallest allowed box is still min_feature pixels wide.
+    """
+    level = 0
+    smallest = min(min_w, min_h)
+    while level < PYRAMID_MAX_LEVEL and smallest / 2 ** (level + 1) >= min_feature:
+        level += 1
+    return level
+
+def _coarse_candidates(
+    gray: np.ndarray,
+    level: int,
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int,
+    edge_detection_method: str
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Candidate regions found on the downscaled image, in full-resolution coordinates.
+    The minimum size is applied, but the maximum only loosely (see below).
+    """
+    factor = 2 ** level
+    h_img, w_img = gray.shape
+    small = cv2.resize(gray, (max(1, w_img // factor), max(1, h_img // factor)), interpolation=cv2.INTER_AREA)
+
+    edges = detect_edges(small, edge_detection_method)
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    # Features only a few pixels apart merge into one contour once downscaled,
+    # so oversized contours are kept up to COARSE_MAX_OVERSIZE: their window
+    # still holds each feature
+    slack = COARSE_SIZE_SLACK
+    limit_w = COARSE_MAX_OVERSIZE * max_w / factor + slack
+    limit_h = COARSE_MAX_OVERSIZE * max_h / factor + slack
+    boxes = set()
+    for cnt in contours:
+        x, y, w, h = cv2.boundingRect(cnt)
+        if w < min_w / factor - slack or h < min_h / factor - slack:
+            continue
+        if w > limit_w or h > limit_h:
+            continue
+        boxes.add((x * factor, y * factor, w * factor, h * factor))
+    return sorted(boxes)
+
+def detect_features_pyramid(
+    bgr_image: Union[str, np.ndarray],
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int,
+    delta_e_threshold: float,
+    edge_detection_method: str = "canny",
+    level: Optional[int] = None,
+    color_estimator: str = "mean",
+    color_region: str = "interior",
+    delta_e_metric: str = "cie76",
+    on_stage: Optional[Callable[[StageStats], None]] = None,
+    trace_memory: bool = False
+) -> DetectionResult:
+    """
+    Coarse-to-fine detection for large images with large minimum box sizes.
+
+    Edge detection and contour finding first run on a downscaled copy of the
+    image (see pyramid_level). Each coarse candidate is then refined at full
+    resolution: edges and contours are recomputed in a small window around it,
+    and the full-resolution boxes found there go through the usual size
+    filter, Delta E validation, score ranking and exclusivity.
+
+    This is an approximation of detect_features: a feature whose outline does
+    not survive downscaling, or that merges into a coarse contour far larger
+    than max_w or max_h, is missed. Backends that normalize by the maximum
+    gradient take it from the refinement windows rather than the whole image.
+    Use pyramid_recall_report to measure what is lost on a given corpus.
+    With level 0 this is detect_features.
+
+    Stages are recorded as in detect_features. The coarse pass and the
+    refinement windows' gradients count as edges, contours and filter are
+    summed over the windows, and validation includes the Lab conversion of
+    the perimeter pixels (there is no separate lab stage).
+
+    Args:
+        bgr_image: Image path or BGR array
+        level: Number of 2x downscales; chosen from min_w and min_h by default
+    """
+    delta_e_metric = check_selection_options(color_estimator, color_region, delta_e_metric)
+
+    start_time = time.perf_counter()
+
+    with StageTimer(on_stage, trace_memory) as timer:
+        if not isinstance(bgr_image, np.ndarray):
+            path = bgr_image
+            with timer.stage("decode"):
+                bgr_image = cv2.imread(path)
+            if bgr_image is None:
+                raise ValueError("Could not load image")
+
+        if level is None:
+            level = pyramid_level(min_w, min_h)
+        if level <= 0:
+            return _detect_in_image(
+                bgr_image, min_w, max_w, min_h, max_h, delta_e_threshold,
+                edge_detection_method, color_estimator, color_region, start_time=start_time,
+                delta_e_metric=delta_e_metric, timer=timer
+            )
+
+        h_img, w_img = bgr_image.shape[:2]
+        with timer.stage("gray"):
+            gray = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2GRAY)
+
+        factor = 2 ** level
+        margin = 2 * factor + REFINE_PADDING
+
+        # Refinement windows, each with the part of it away from the padding
+        # (boxes reaching into the padding may be truncated by the window)
+        windows = []
+        with timer.stage("edges"):
+            coarse = _coarse_candidates(gray, level, min_w, max_w, min_h, max_h, edge_detection_method)
+        for cx, cy, cw, ch in coarse:
+            rx1, ry1 = max(0, cx - margin), max(0, cy - margin)
+            rx2, ry2 = min(w_img, cx + cw + margin), min(h_img, cy + ch + margin)
+            inner = (
+                rx1 if rx1 == 0 else rx1 + REFINE_PADDING,
+                ry1 if ry1 == 0 else ry1 + REFINE_PADDING,
+                rx2 if rx2 == w_img else rx2 - REFINE_PADDING,
+                ry2 if ry2 == h_img else ry2 - REFINE_PADDING,
+            )
+            windows.append(((rx1, ry1, rx2, ry2), inner))
+
+        # Gradient-normalizing backends share one maximum across windows, as the
+        # single-shot path uses the whole image's. Away from the padding a window's
+        # magnitude equals the whole image's, and the strongest gradients are on
+        # the outlines the windows were cut around, so the full-resolution
+        # gradient of the whole image is never computed.
+        backend = get_edge_backend(edge_detection_method)
+        max_magnitude = None
+        if backend.magnitude is not None and windows:
+            max_magnitude = 0.0
+            with timer.stage("edges"):
+                for (rx1, ry1, rx2, ry2), (ix1, iy1, ix2, iy2) in windows:
+                    magnitude = backend.magnitude(gray[ry1:ry2, rx1:rx2])[iy1 - ry1:iy2 - ry1, ix1 - rx1:ix2 - rx1]
+                    if magnitude.size:
+                        max_magnitude = max(max_magnitude, float(np.max(magnitude)))
+
+        # Full-resolution box -> start point of its first contour in scan order
+        found: Dict[Tuple[int, int, int, int], Tuple[int, int]] = {}
+        num_contours = 0
+
+        for (rx1, ry1, rx2, ry2), (inner_x1, inner_y1, inner_x2, inner_y2) in windows:
+            with timer.stage("edges"):
+                edges = detect_edges(gray[ry1:ry2, rx1:rx2], edge_detection_method, max_magnitude)
+            # CHAIN_APPROX_NONE keeps each contour's first point at its scan position,
+            # which fixes its whole-image contour rank
+            with timer.stage("contours") as stage:
+                contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
+                num_contours += len(contours)
+                stage.count = num_contours
+
+            with timer.stage("filter") as stage:
+                for cnt in contours:
+                    x, y, w, h = cv2.boundingRect(cnt)
+                    gx, gy = x + rx1, y + ry1
+
+                    if not is_valid_candidate(w, h, min_w, max_w, min_h, max_h):
+                        continue
+                    if gx < inner_x1 or gy < inner_y1 or gx + w > inner_x2 or gy + h > inner_y2:
+                        continue
+
+                    start_col, start_row = cnt[0][0]
+                    start = (int(start_row) + ry1, int(start_col) + rx1)
+                    box_key = (gx, gy, w, h)
+
+                    # Like the single-shot dedup, a box keeps its first contour in scan order
+                    if start > found.get(box_key, (-1, -1)):
+                        found[box_key] = start
+                stage.count = len(found)
+
+        # Refinement windows overlap, so convert only the perimeter pixels to Lab
+        with timer.stage("validation") as stage:
+            boxes = list(found)
+            perimeters, kept = pack_perimeters(bgr_image, boxes, from_bgr=True)
+            scores = CandidateScores.from_batch([boxes[i] for i in kept], perimeters, delta_e_metric)
+            passing, ratios = scores.select(delta_e_threshold)
+            stage.count = len(passing)
+
+        owned = [(found[scores.boxes[i]], scores.boxes[i], ratio) for i, ratio in zip(passing, ratios)]
+
+        # findContours reports contours in descending scan order of their first point
+        owned.sort(key=lambda item: item[0], reverse=True)
+
+        final_boxes = select_features(
+            bgr_image, [box for _, box, _ in owned], np.arange(len(owned)), [ratio for _, _, ratio in owned],
+            color_estimator, color_region, timer=timer
+        )
+
+    processing_time = (time.perf_counter() - start_time) * 1000
+
+    return DetectionResult(
+        bounding_boxes=final_boxes,
+        delta_e_method=DELTA_E_METHOD_NAMES[delta_e_metric],
+        delta_e_threshold=delta_e_threshold,
+        processing_time_ms=processing_time,
+        stages=timer.stages
+    )
+
+def pyramid_recall_report(
+    images: Iterable[np.ndarray],
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int,
+    delta_e_threshold: float,
+    edge_detection_method: str = "canny",
+    level: Optional[int] = None,
+    min_iou: float = 0.9
+) -> Dict[str, float]:
+    """
+    Compare detect_features_pyramid against the full-resolution path.
+
+    Returns:
+        Totals over all images: boxes found by each path, exact and IoU
+        matches, recall of the full-resolution boxes (exact and IoU) and
+        the summed processing times with the resulting speedup
+    """
+    report = {
+        "images": 0, "full_boxes": 0, "pyramid_boxes": 0,
+        "exact_matches": 0, "iou_matches": 0,
+        "full_time_ms": 0.0, "pyramid_time_ms": 0.0
+    }
+
+    for bgr_image in images:
+        full = _detect_in_image(bgr_image, min_w, max_w, min_h, max_h, delta_e_threshold, edge_detection_method)
+        pyramid = detect_features_pyramid(bgr_image, min_w, max_w, min_h, max_h, delta_e_threshold, edge_detection_method, level)
+
+        full_boxes = [(b.x, b.y, b.w, b.h) for b in full.bounding_boxes]
+        pyramid_boxes = [(b.x, b.y, b.w, b.h) for b in pyramid.bounding_boxes]
+
+        report["images"] += 1
+        report["full_boxes"] += len(full_boxes)
+        report["pyramid_boxes"] += len(pyramid_boxes)
+        report["exact_matches"] += len(set(full_boxes) & set(pyramid_boxes))
+        report["iou_matches"] += len(match_boxes(full_boxes, pyramid_boxes, min_iou))
+        report["full_time_ms"] += full.processing_time_ms
+        report["pyramid_time_ms"] += pyramid.processing_time_ms
+
+    total = report["full_boxes"]
+    report["exact_recall"] = report["exact_matches"] / total if total else 1.0
+    report["iou_recall"] = report["iou_matches"] / total if total else 1.0
+    report["speedup"] = report["full_time_ms"] / report["pyramid_time_ms"] if report["pyramid_time_ms"] else 0.0
+    return report
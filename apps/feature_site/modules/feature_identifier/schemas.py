@@ -1,5 +1,7 @@
-from dataclasses import dataclass
-from typing import List, Tuple, Optional
+import numpy as np
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Optional, Union
 
 @dataclass
 class BoundingBox:
@@ -11,10 +13,227 @@ class BoundingBox:
     validation_ratio: float
     color_hex: Optional[str] = None  # RGB hex color, e.g., "#FF0000"
 
+# One row per detected box. color packs RGB as 0xRRGGBB.
+BOX_DTYPE = np.dtype([
+    ("x", np.int32),
+    ("y", np.int32),
+    ("w", np.int32),
+    ("h", np.int32),
+    ("score", np.float64),
+    ("validation_ratio", np.float64),
+    ("color", np.uint32)
+])
+
+# Packed color of a box without one (color_hex None)
+NO_COLOR = 0xFFFFFFFF
+
+def pack_color(color_hex: Optional[str]) -> int:
+    return NO_COLOR if color_hex is None else int(color_hex[1:], 16)
+
+def unpack_color(color: int) -> Optional[str]:
+    return None if color == NO_COLOR else f"#{int(color):06X}"
+
+BOX_FIELDS = ("x", "y", "w", "h", "score", "validation_ratio", "color_hex")
+
+class BoxView:
+    """
+    One row of a BoxArray with the attributes of a BoundingBox, read from
+    (and written to) the array on access. Compares equal to a BoundingBox
+    with the same values.
+    """
+    __slots__ = ("_rows", "_index")
+
+    def __init__(self, rows: np.ndarray, index: int):
+        self._rows = rows
+        self._index = index
+
+    def _get(self, name: str):
+        return self._rows[name][self._index].item()
+
+    def _set(self, name: str, value) -> None:
+        self._rows[name][self._index] = value
+
+    x = property(lambda self: self._get("x"), lambda self, value: self._set("x", value))
+    y = property(lambda self: self._get("y"), lambda self, value: self._set("y", value))
+    w = property(lambda self: self._get("w"), lambda self, value: self._set("w", value))
+    h = property(lambda self: self._get("h"), lambda self, value: self._set("h", value))
+    score = property(lambda self: self._get("score"), lambda self, value: self._set("score", value))
+    validation_ratio = property(
+        lambda self: self._get("validation_ratio"),
+        lambda self, value: self._set("validation_ratio", value)
+    )
+    color_hex = property(
+        lambda self: unpack_color(self._get("color")),
+        lambda self, value: self._set("color", pack_color(value))
+    )
+
+    def astuple(self) -> Tuple:
+        return tuple(getattr(self, name) for name in BOX_FIELDS)
+
+    def to_box(self) -> BoundingBox:
+        return BoundingBox(*self.astuple())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (BoxView, BoundingBox)):
+            return self.astuple() == tuple(getattr(other, name) for name in BOX_FIELDS)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={value!r}" for name, value in zip(BOX_FIELDS, self.astuple()))
+        return f"BoxView({values})"
+
+class BoxArray(Sequence):
+    """
+    Detected boxes stored column-wise in one structured array (BOX_DTYPE),
+    instead of one BoundingBox object per box.
+
+    Indexing with an int gives a BoxView, with a column name the column
+    itself, and with a slice, mask or index array another BoxArray (slices
+    share memory with this one, as NumPy slices do). Iterating yields BoxViews,
+    so code written for a list of BoundingBox keeps working.
+    """
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: Optional[np.ndarray] = None):
+        if rows is None:
+            rows = np.empty(0, dtype=BOX_DTYPE)
+        if rows.dtype != BOX_DTYPE:
+            raise ValueError("BoxArray rows must have dtype BOX_DTYPE")
+        self.rows = rows
+
+    @classmethod
+    def from_boxes(cls, boxes: Iterable[Union[BoundingBox, BoxView]]) -> "BoxArray":
+        boxes = list(boxes)
+        rows = np.empty(len(boxes), dtype=BOX_DTYPE)
+        for name in BOX_DTYPE.names:
+            if name == "color":
+                rows[name] = [pack_color(box.color_hex) for box in boxes]
+            else:
+                rows[name] = [getattr(box, name) for box in boxes]
+        return cls(rows)
+
+    @classmethod
+    def from_columns(
+        cls,
+        boxes: np.ndarray,
+        score: np.ndarray,
+        validation_ratio: np.ndarray,
+        color: Optional[np.ndarray] = None
+    ) -> "BoxArray":
+        """
+        Build from an (N, 4) array of x, y, w, h and per-box values.
+        Boxes without a color array get NO_COLOR.
+        """
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        rows = np.empty(len(boxes), dtype=BOX_DTYPE)
+        rows["x"], rows["y"], rows["w"], rows["h"] = boxes.T
+        rows["score"] = score
+        rows["validation_ratio"] = validation_ratio
+        rows["color"] = NO_COLOR if color is None else color
+        return cls(rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.rows[key]
+        if isinstance(key, (int, np.integer)):
+            index = int(key)
+            if index < 0:
+                index += len(self.rows)
+            if not 0 <= index < len(self.rows):
+                raise IndexError("box index out of range")
+            return BoxView(self.rows, index)
+        return BoxArray(self.rows[key])
+
+    def __iter__(self) -> Iterator[BoxView]:
+        for index in range(len(self.rows)):
+            yield BoxView(self.rows, index)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes
+
+    def sorted(self, column: str = "score", descending: bool = True) -> "BoxArray":
+        """
+        Copy sorted by a column. The sort is stable in both directions:
+        boxes with equal values keep their order.
+        """
+        values = self.rows[column]
+        if descending:
+            # Negating would wrap unsigned columns (color) and INT_MIN, so the
+            # ascending order of the reversed column is reversed instead, which
+            # keeps equal values in their original order
+            n = len(values)
+            order = n - 1 - np.argsort(values[::-1], kind="stable")[::-1]
+        else:
+            order = np.argsort(values, kind="stable")
+        return BoxArray(self.rows[order])
+
+    def filter(self, mask: np.ndarray) -> "BoxArray":
+        return BoxArray(self.rows[mask])
+
+    def boxes(self) -> np.ndarray:
+        """
+        (N, 4) int32 array of x, y, w, h.
+        """
+        return np.stack([self.rows["x"], self.rows["y"], self.rows["w"], self.rows["h"]], axis=-1)
+
+    def to_boxes(self) -> List[BoundingBox]:
+        return [view.to_box() for view in self]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """
+        One dict per box with the BoundingBox attributes, built column-wise.
+        """
+        columns = [self.rows[name].tolist() for name in BOX_DTYPE.names[:-1]]
+        columns.append([unpack_color(color) for color in self.rows["color"].tolist()])
+        return [dict(zip(BOX_FIELDS, values)) for values in zip(*columns)]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, BoxArray):
+            return self.rows.shape == other.rows.shape and bool(np.all(self.rows == other.rows))
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and all(view == box for view, box in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"BoxArray({self.to_boxes()!r})"
+
+@dataclass
+class StageStats:
+    """
+    Time spent in one detection stage (see stages.StageTimer).
+    """
+    name: str
+    time_ns: int = 0
+    count: Optional[int] = None       # Items the stage produced, e.g. candidate boxes
+    peak_bytes: Optional[int] = None  # Peak traced allocation, when tracing memory
+    calls: int = 0
+
+    @property
+    def time_ms(self) -> float:
+        return self.time_ns / 1e6
+
 @dataclass
 class DetectionResult:
-    bounding_boxes: List[BoundingBox]
+    bounding_boxes: BoxArray
     delta_e_method: str
     delta_e_threshold: float
     processing_time_ms: float
+    # Per-stage breakdown, in the order the stages first ran
+    stages: Dict[str, StageStats] = field(default_factory=dict, compare=False)
+
+    def __post_init__(self):
+        # Paths that build BoundingBox objects get the same columnar storage
+        if not isinstance(self.bounding_boxes, BoxArray):
+            self.bounding_boxes = BoxArray.from_boxes(self.bounding_boxes)
 
+    @property
+    def nbytes(self) -> int:
+        return self.bounding_boxes.nbytes
@@ -0,0 +1,88 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+from .schemas import StageStats
+
+# Stages reported by detect_features and the other detection modes, in
+# pipeline order. Stages served from the preprocessing cache, or that a mode
+# folds into another, are not reported.
+DETECTION_STAGES = (
+    "decode", "gray", "edges", "contours", "filter", "lab",
+    "validation", "exclusivity", "color", "overlay"
+)
+
+class StageTimer:
+    """
+    Collects per-stage wall time (perf_counter_ns), output counts and,
+    optionally, tracemalloc peak memory.
+
+    A stage run more than once (e.g. validation, which is split into scoring
+    and threshold selection) is accumulated under its name. on_stage, if
+    given, is called with the StageStats of every single run as it finishes.
+
+    With trace_memory, each stage records the peak memory allocated during
+    it, above what was allocated when it started. Used as a context manager,
+    the timer starts tracemalloc if needed and stops it again on exit.
+    Stages must not be nested when tracing memory.
+    """
+    def __init__(self, on_stage: Optional[Callable[[StageStats], None]] = None, trace_memory: bool = False):
+        self.on_stage = on_stage
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, StageStats] = {}
+        self._started_tracing = False
+
+    def __enter__(self) -> "StageTimer":
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name: str, count: Optional[int] = None) -> Iterator[StageStats]:
+        """
+        Time the body of a with block. The yielded StageStats can be given
+        the stage's output count before the block ends.
+        """
+        run = StageStats(name=name, count=count, calls=1)
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter_ns()
+
+        yield run
+
+        run.time_ns = time.perf_counter_ns() - start
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            run.peak_bytes = peak - baseline
+        self._add(run)
+        if self.on_stage is not None:
+            self.on_stage(run)
+
+    def merge(self, stages: Dict[str, StageStats], share: int = 1) -> None:
+        """
+        Accumulate the stages recorded by another timer, with 1/share of
+        their time, for work shared between several results. on_stage is not
+        called again for them.
+        """
+        for stats in stages.values():
+            self._add(StageStats(stats.name, stats.time_ns // share, stats.count, stats.peak_bytes, stats.calls))
+
+    def _add(self, run: StageStats) -> None:
+        total = self.stages.get(run.name)
+        if total is None:
+            self.stages[run.name] = StageStats(run.name, run.time_ns, run.count, run.peak_bytes, run.calls)
+            return
+        total.time_ns += run.time_ns
+        total.calls += run.calls
+        if run.count is not None:
+            total.count = run.count
+        if run.peak_bytes is not None:
+            total.peak_bytes = max(total.peak_bytes or 0, run.peak_bytes)
@@ -0,0 +1,149 @@
+import cv2
+import itertools
+import numpy as np
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Union
+from .schemas import DetectionResult, StageStats
+from .stages import StageTimer
+from .color import bgr_to_lab, DELTA_E_METHOD_NAMES
+from .validation import score_boxes
+from .edges import detect_edges
+from .detector import check_selection_options, contour_boxes, filter_boxes, select_features
+
+SWEEP_PARAMETERS = ("min_w", "max_w", "min_h", "max_h", "delta_e_threshold", "edge_detection_method")
+
+def parameter_grid(**axes: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Every combination of the given parameter values, as config dicts.
+    A scalar value is held fixed.
+
+    Example:
+        parameter_grid(min_w=10, max_w=[100, 200], min_h=10, max_h=200,
+                       delta_e_threshold=[1.0, 2.3, 5.0])
+    """
+    names = list(axes)
+    values = [v if isinstance(v, (list, tuple, range, np.ndarray)) else [v] for v in axes.values()]
+    for combination in itertools.product(*values):
+        yield dict(zip(names, combination))
+
+def detect_features_sweep(
+    image: Union[str, np.ndarray],
+    configs: Iterable[Mapping[str, Any]],
+    color_estimator: str = "mean",
+    color_region: str = "interior",
+    exclusivity_engine: str = "index",
+    delta_e_metric: str = "cie76",
+    on_stage: Optional[Callable[[StageStats], None]] = None,
+    trace_memory: bool = False
+) -> List[DetectionResult]:
+    """
+    Run detection on one image for many parameter sets, sharing the work
+    that does not depend on them.
+
+    The image is decoded and converted to Lab and grayscale once. Edge
+    detection, contour finding and perimeter scoring run once per edge method,
+    over every box that fits any of the configs' size ranges (a box's scores
+    do not depend on the size range or threshold). Each config then only
+    selects its boxes, ranks them and applies exclusivity. Results are
+    identical to calling detect_features once per config.
+
+    Args:
+        image: Image path or BGR array
+        configs: Mappings with min_w, max_w, min_h, max_h, delta_e_threshold
+            and optionally edge_detection_method (defaults to "canny")
+        delta_e_metric: Delta E kernel shared by every config (see DELTA_E_METRICS)
+
+    Returns:
+        One DetectionResult per config, in order. processing_time_ms includes
+        the config's share of the common work, and so do the times in stages
+        (recorded as in detect_features; counts and memory peaks of shared
+        stages are those of the shared run). on_stage sees every shared run
+        once.
+    """
+    delta_e_metric = check_selection_options(color_estimator, color_region, delta_e_metric, exclusivity_engine)
+
+    configs = [dict(config) for config in configs]
+    for config in configs:
+        unknown = set(config) - set(SWEEP_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+        missing = set(SWEEP_PARAMETERS[:5]) - set(config)
+        if missing:
+            raise ValueError(f"Missing sweep parameters: {sorted(missing)}")
+        config["edge_detection_method"] = config.get("edge_detection_method", "canny").lower()
+
+    start_time = time.perf_counter()
+
+    with StageTimer(on_stage, trace_memory) as shared:
+        if isinstance(image, np.ndarray):
+            bgr_image = image
+        else:
+            with shared.stage("decode"):
+                bgr_image = cv2.imread(image)
+            if bgr_image is None:
+                raise ValueError("Could not load image")
+
+        with shared.stage("gray"):
+            gray = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2GRAY)
+        with shared.stage("lab"):
+            lab_image = bgr_to_lab(bgr_image)
+        shared_ms = (time.perf_counter() - start_time) * 1000 / max(1, len(configs))
+
+        results: List[DetectionResult] = [None] * len(configs)
+        color_cache = {}
+
+        methods = dict.fromkeys(config["edge_detection_method"] for config in configs)
+        for method in methods:
+            members = [i for i, config in enumerate(configs) if config["edge_detection_method"] == method]
+            method_start = time.perf_counter()
+            method_timer = StageTimer(on_stage, trace_memory)
+
+            # Score every box any of this method's configs could accept
+            with method_timer.stage("edges"):
+                edges = detect_edges(gray, method)
+            with method_timer.stage("contours") as stage:
+                candidate_boxes = contour_boxes(edges)
+                stage.count = len(candidate_boxes)
+            with method_timer.stage("filter") as stage:
+                boxes = filter_boxes(
+                    candidate_boxes,
+                    min(configs[i]["min_w"] for i in members), max(configs[i]["max_w"] for i in members),
+                    min(configs[i]["min_h"] for i in members), max(configs[i]["max_h"] for i in members)
+                )
+                stage.count = len(boxes)
+            with method_timer.stage("validation"):
+                scores = score_boxes(lab_image, boxes, delta_e_metric=delta_e_metric)
+            sizes = np.asarray(scores.boxes, dtype=np.int64).reshape(-1, 4)
+            widths, heights = sizes[:, 2], sizes[:, 3]
+            del edges, candidate_boxes
+
+            method_ms = (time.perf_counter() - method_start) * 1000 / len(members)
+
+            for i in members:
+                config = configs[i]
+                config_start = time.perf_counter()
+                timer = StageTimer(on_stage, trace_memory)
+                timer.merge(shared.stages, len(configs))
+                timer.merge(method_timer.stages, len(members))
+
+                with timer.stage("validation") as stage:
+                    in_range = (
+                        (widths >= config["min_w"]) & (widths <= config["max_w"]) &
+                        (heights >= config["min_h"]) & (heights <= config["max_h"])
+                    )
+                    passing, ratios = scores.select(config["delta_e_threshold"], among=in_range)
+                    stage.count = len(passing)
+                final_boxes = select_features(
+                    bgr_image, scores.boxes, passing, ratios,
+                    color_estimator, color_region, exclusivity_engine, color_cache=color_cache, timer=timer
+                )
+
+                results[i] = DetectionResult(
+                    bounding_boxes=final_boxes,
+                    delta_e_method=DELTA_E_METHOD_NAMES[delta_e_metric],
+                    delta_e_threshold=config["delta_e_threshold"],
+                    processing_time_ms=shared_ms + method_ms + (time.perf_counter() - config_start) * 1000,
+                    stages=timer.stages
+                )
+
+    return results
@@ -0,0 +1,241 @@
+import os
+import cv2
+import numpy as np
+import time
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+from .schemas import DetectionResult, StageStats
+from .stages import StageTimer
+from .color import bgr_to_lab, DELTA_E_METHOD_NAMES
+from .geometry import is_valid_candidate
+from .validation import pack_perimeters, CandidateScores
+from .edges import detect_edges, get_edge_backend
+from .detector import check_selection_options, select_features
+
+# Extra context read around every tile so 3x3 filters and non-maximum
+# suppression see the same neighborhood as on the whole image
+FILTER_PADDING = 8
+
+DEFAULT_TILE_SIZE = 2048
+
+class ImageSource:
+    """
+    Window reader over a BGR image that does not have to fit in memory.
+
+    Backed by an ndarray, which may be a np.memmap: .npy files are opened
+    memory-mapped, so only the windows being read are paged in. Encoded images
+    (PNG, JPEG, ...) have no random access and are decoded once up front.
+    """
+    def __init__(self, array: np.ndarray):
+        if array.ndim != 3 or array.shape[2] != 3:
+            raise ValueError("Expected an (H, W, 3) BGR image")
+        self._array = array
+
+    @classmethod
+    def open(cls, source: Union[str, np.ndarray, "ImageSource"]) -> "ImageSource":
+        if isinstance(source, ImageSource):
+            return source
+        if isinstance(source, np.ndarray):
+            return cls(source)
+        if os.path.splitext(str(source))[1].lower() == ".npy":
+            return cls(np.load(source, mmap_mode="r"))
+
+        bgr_image = cv2.imread(str(source))
+        if bgr_image is None:
+            raise ValueError("Could not load image")
+        return cls(bgr_image)
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self._array.shape
+
+    def read(self, x1: int, y1: int, x2: int, y2: int) -> np.ndarray:
+        """
+        Copy the window [x1, x2) x [y1, y2) into a contiguous in-memory array.
+        """
+        return np.ascontiguousarray(self._array[y1:y2, x1:x2])
+
+def iter_tiles(h_img: int, w_img: int, tile_size: int) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Yield the (x1, y1, x2, y2) core regions of a raster-order tiling.
+    Core regions do not overlap and together cover the image.
+    """
+    for y1 in range(0, h_img, tile_size):
+        for x1 in range(0, w_img, tile_size):
+            yield x1, y1, min(x1 + tile_size, w_img), min(y1 + tile_size, h_img)
+
+def _max_magnitude(
+    source: ImageSource,
+    tile_size: int,
+    magnitude: Callable[[np.ndarray], np.ndarray],
+    timer: Optional[StageTimer] = None
+) -> float:
+    """
+    Maximum gradient magnitude over the whole image, computed tile by tile.
+    """
+    timer = timer or StageTimer()
+    h_img, w_img = source.shape[:2]
+    max_magnitude = 0.0
+    for x1, y1, x2, y2 in iter_tiles(h_img, w_img, tile_size):
+        rx1, ry1 = max(0, x1 - 1), max(0, y1 - 1)
+        rx2, ry2 = min(w_img, x2 + 1), min(h_img, y2 + 1)
+        with timer.stage("decode"):
+            bgr_tile = source.read(rx1, ry1, rx2, ry2)
+        with timer.stage("gray"):
+            gray = cv2.cvtColor(bgr_tile, cv2.COLOR_BGR2GRAY)
+        with timer.stage("edges"):
+            core = magnitude(gray)[y1 - ry1:y2 - ry1, x1 - rx1:x2 - rx1]
+            max_magnitude = max(max_magnitude, float(np.max(core)))
+    return max_magnitude
+
+def detect_features_tiled(
+    image_source: Union[str, np.ndarray, ImageSource],
+    min_w: int,
+    max_w: int,
+    min_h: int,
+    max_h: int,
+    delta_e_threshold: float,
+    edge_detection_method: str = "canny",
+    tile_size: int = DEFAULT_TILE_SIZE,
+    overlap: Optional[int] = None,
+    color_estimator: str = "mean",
+    color_region: str = "interior",
+    delta_e_metric: str = "cie76",
+    on_stage: Optional[Callable[[StageStats], None]] = None,
+    trace_memory: bool = False
+) -> DetectionResult:
+    """
+    Detect features tile by tile, so peak memory is bounded by the tile size
+    instead of the image size.
+
+    Every tile is read with `overlap` extra pixels to the right and bottom.
+    A box belongs to the tile holding its top-left corner and is kept only if
+    it fits entirely inside the tile's readable area, so every box no larger
+    than the overlap is found exactly once, with the same perimeter, score
+    and contour rank as in detect_features. Candidates from all tiles are then
+    merged in whole-image contour order and go through the usual greedy
+    exclusivity pass.
+
+    Canny's hysteresis can follow a weak edge chain across a tile seam, so a
+    tiled Canny run may rarely differ from the single-shot one there. The
+    gradient-threshold methods (Sobel, Scharr) normalize by the whole-image
+    maximum and match exactly.
+
+    Stages are recorded as in detect_features, summed over the tiles, with
+    counts summed as well. Reading the tiles is reported as decode, and Lab
+    conversion covers every tile holding a candidate. on_stage is called
+    once per stage and tile.
+
+    Args:
+        image_source: Image path (.npy files are memory-mapped), BGR array
+            (a np.memmap works) or ImageSource
+        tile_size: Side of the square core region of each tile
+        overlap: Largest box side guaranteed to be found; defaults to
+            max(max_w, max_h) so every candidate is covered
+    """
+    delta_e_metric = check_selection_options(color_estimator, color_region, delta_e_metric)
+
+    start_time = time.perf_counter()
+
+    with StageTimer(on_stage, trace_memory) as timer:
+        with timer.stage("decode"):
+            source = ImageSource.open(image_source)
+        h_img, w_img = source.shape[:2]
+
+        if overlap is None:
+            overlap = max(max_w, max_h)
+
+        # Gradient-normalizing backends must use the whole image's maximum
+        backend = get_edge_backend(edge_detection_method)
+        max_magnitude = None
+        if backend.magnitude is not None:
+            max_magnitude = _max_magnitude(source, tile_size, backend.magnitude, timer)
+
+        # (start_row, start_col) of the contour, box, validation ratio
+        owned: List[Tuple[Tuple[int, int], Tuple[int, int, int, int], float]] = []
+        num_contours = num_candidates = 0
+
+        for x1, y1, x2, y2 in iter_tiles(h_img, w_img, tile_size):
+            rx1, ry1 = max(0, x1 - FILTER_PADDING), max(0, y1 - FILTER_PADDING)
+            rx2 = min(w_img, x2 + overlap + FILTER_PADDING)
+            ry2 = min(h_img, y2 + overlap + FILTER_PADDING)
+
+            # Boxes reaching into the padding next to a seam may be truncated
+            limit_x = rx2 if rx2 == w_img else rx2 - FILTER_PADDING
+            limit_y = ry2 if ry2 == h_img else ry2 - FILTER_PADDING
+
+            with timer.stage("decode"):
+                bgr_tile = source.read(rx1, ry1, rx2, ry2)
+            with timer.stage("gray"):
+                gray = cv2.cvtColor(bgr_tile, cv2.COLOR_BGR2GRAY)
+            with timer.stage("edges"):
+                edges = detect_edges(gray, edge_detection_method, max_magnitude)
+
+            # CHAIN_APPROX_NONE keeps each contour's first point at the scan
+            # position where it was found, which fixes its whole-image rank
+            with timer.stage("contours") as stage:
+                contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
+                num_contours += len(contours)
+                stage.count = num_contours
+            del gray, edges
+
+            tile_boxes = []
+            tile_starts = []
+            seen_boxes = set()
+
+            with timer.stage("filter") as stage:
+                for cnt in contours:
+                    x, y, w, h = cv2.boundingRect(cnt)
+                    gx, gy = x + rx1, y + ry1
+
+                    if not is_valid_candidate(w, h, min_w, max_w, min_h, max_h):
+                        continue
+                    if not (x1 <= gx < x2 and y1 <= gy < y2):
+                        continue
+                    if gx + w > limit_x or gy + h > limit_y:
+                        continue
+
+                    box_key = (x, y, w, h)
+                    if box_key in seen_boxes:
+                        continue
+                    seen_boxes.add(box_key)
+                    tile_boxes.append(box_key)
+                    start_col, start_row = cnt[0][0]
+                    tile_starts.append((int(start_row) + ry1, int(start_col) + rx1))
+                num_candidates += len(tile_boxes)
+                stage.count = num_candidates
+            del contours
+
+            if not tile_boxes:
+                continue
+
+            with timer.stage("lab"):
+                lab_tile = bgr_to_lab(bgr_tile)
+            with timer.stage("validation") as stage:
+                perimeters, kept = pack_perimeters(lab_tile, tile_boxes)
+                scores = CandidateScores.from_batch([tile_boxes[i] for i in kept], perimeters, delta_e_metric)
+                passing, ratios = scores.select(delta_e_threshold)
+                del bgr_tile, lab_tile
+
+                for i, validation_ratio in zip(passing, ratios):
+                    x, y, w, h = scores.boxes[i]
+                    owned.append((tile_starts[kept[i]], (x + rx1, y + ry1, w, h), validation_ratio))
+                stage.count = len(owned)
+
+        # findContours reports contours in descending scan order of their first point
+        owned.sort(key=lambda item: item[0], reverse=True)
+
+        # Colors are read from the source array, which pages in only the final boxes
+        final_boxes = select_features(
+            source._array, [box for _, box, _ in owned], np.arange(len(owned)), [ratio for _, _, ratio in owned],
+            color_estimator, color_region, timer=timer
+        )
+
+    processing_time = (time.perf_counter() - start_time) * 1000
+
+    return DetectionResult(
+        bounding_boxes=final_boxes,
+        delta_e_method=DELTA_E_METHOD_NAMES[delta_e_metric],
+        delta_e_threshold=delta_e_threshold,
+        processing_time_ms=processing_time,
+        stages=timer.stages
+    )
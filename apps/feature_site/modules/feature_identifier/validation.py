@@ -0,0 +1,394 @@
+import numpy as np
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+from .geometry import pack_perimeter_indices
+from .color import bgr_pixels_to_lab, get_delta_e_metric
+
+# Neighbors searched on each side of a perimeter pixel, along the perimeter path
+NEIGHBOR_RADIUS = 10
+
+# Fraction of supported perimeter pixels required to accept a candidate
+MIN_VALIDATION_RATIO = 0.80
+
+@dataclass
+class PerimeterBatch:
+    """
+    Perimeter colors of many candidates packed into one flat array.
+    Candidate i owns colors[offsets[i]:offsets[i + 1]], in perimeter order.
+    """
+    colors: np.ndarray   # Shape (P, 3), Lab colors of every perimeter pixel
+    offsets: np.ndarray  # Shape (N + 1,), start of each candidate in colors
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+def pack_perimeters(
+    lab_image: np.ndarray,
+    boxes: Iterable[Tuple[int, int, int, int]],
+    from_bgr: bool = False
+) -> Tuple[PerimeterBatch, List[int]]:
+    """
+    Gather the in-bounds perimeter pixels of every box into one PerimeterBatch.
+
+    Args:
+        lab_image: Lab image the colors are sampled from
+        boxes: (x, y, w, h) tuples
+        from_bgr: lab_image is the BGR image instead; only the gathered
+            pixels are converted to Lab (see bgr_pixels_to_lab)
+
+    Returns:
+        The packed batch and the indices of the boxes it contains
+        (boxes without any in-bounds perimeter pixel are dropped).
+    """
+    rows, cols, offsets, kept = pack_perimeter_indices(boxes, lab_image.shape)
+    colors = lab_image[rows, cols]
+    if from_bgr:
+        colors = bgr_pixels_to_lab(colors)
+
+    return PerimeterBatch(colors=colors, offsets=offsets), kept
+
+def validation_ratio(colors: np.ndarray, delta_e_threshold: float) -> float:
+    """
+    Fraction of perimeter pixels with a neighbor (within NEIGHBOR_RADIUS along the
+    perimeter, wrapping around) whose Delta E is <= delta_e_threshold.
+
+    Per-candidate reference implementation of batch_validation_ratios.
+    """
+    N = len(colors)
+    has_match = np.zeros(N, dtype=bool)
+
+    for k in range(1, NEIGHBOR_RADIUS + 1):
+
+        # Forward neighbors
+        shifted_fwd = np.roll(colors, -k, axis=0)
+        dists_fwd = np.linalg.norm(colors - shifted_fwd, axis=1)
+        has_match |= (dists_fwd <= delta_e_threshold)
+
+        # Backward neighbors
+        shifted_bwd = np.roll(colors, k, axis=0)
+        dists_bwd = np.linalg.norm(colors - shifted_bwd, axis=1)
+        has_match |= (dists_bwd <= delta_e_threshold)
+
+    match_count = np.sum(has_match)
+    return match_count / N if N > 0 else 0
+
+def batch_validation_ratios(batch: PerimeterBatch, delta_e_threshold: float, delta_e_metric: str = "cie76") -> np.ndarray:
+    """
+    Compute the validation ratio of every candidate in the batch at once.
+    delta_e_metric names the Delta E kernel (see DELTA_E_METRICS).
+
+    Neighbor lookups wrap around within each candidate's own segment, so the
+    result matches validation_ratio() applied to each candidate separately.
+    Each forward distance is also the backward distance of the neighbor it
+    points to, so only the forward distances are computed.
+    """
+    lengths = batch.lengths
+    total = len(batch.colors)
+    if total == 0:
+        return np.zeros(len(batch), dtype=np.float64)
+
+    distance = get_delta_e_metric(delta_e_metric)
+    colors = batch.colors
+    starts = np.repeat(batch.offsets[:-1], lengths)
+    sizes = np.repeat(lengths, lengths)
+    local = np.arange(total, dtype=np.intp) - starts
+
+    has_match = np.zeros(total, dtype=bool)
+
+    for k in range(1, NEIGHBOR_RADIUS + 1):
+        neighbors = starts + (local + k) % sizes
+        dists = distance(colors, colors[neighbors])
+        close = dists <= delta_e_threshold
+
+        # Forward match for the pixel, backward match for its neighbor
+        has_match |= close
+        has_match[neighbors[close]] = True
+
+    match_counts = np.add.reduceat(has_match, batch.offsets[:-1], dtype=np.int64)
+    return match_counts / lengths
+
+def batch_min_neighbor_distances(batch: PerimeterBatch, delta_e_metric: str = "cie76") -> np.ndarray:
+    """
+    For every perimeter pixel in the batch, the minimum Delta E to any neighbor
+    within NEIGHBOR_RADIUS along its candidate's perimeter.
+
+    A pixel is supported at threshold t exactly when this distance is <= t, so
+    the result is all that validation needs, whatever the threshold.
+    Every kernel in DELTA_E_METRICS is symmetric, so a forward distance is
+    also the neighbor's backward distance.
+    """
+    lengths = batch.lengths
+    total = len(batch.colors)
+    min_dists = np.full(total, np.inf, dtype=np.float32)
+    if total == 0:
+        return min_dists
+
+    distance = get_delta_e_metric(delta_e_metric)
+    colors = batch.colors
+    starts = np.repeat(batch.offsets[:-1], lengths)
+    sizes = np.repeat(lengths, lengths)
+    local = np.arange(total, dtype=np.intp) - starts
+
+    for k in range(1, NEIGHBOR_RADIUS + 1):
+        neighbors = starts + (local + k) % sizes
+        dists = distance(colors, colors[neighbors])
+
+        # Forward distance for the pixel, backward distance for its neighbor.
+        # neighbors is a permutation within each segment, so no index repeats.
+        np.minimum(min_dists, dists, out=min_dists)
+        min_dists[neighbors] = np.minimum(min_dists[neighbors], dists)
+
+    return min_dists
+
+def min_supported_counts(lengths: np.ndarray) -> np.ndarray:
+    """
+    Smallest supported-pixel count m with m / n >= MIN_VALIDATION_RATIO, per length n.
+    Computed with the same float comparison used for acceptance.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    counts = np.ceil(lengths * MIN_VALIDATION_RATIO).astype(np.int64)
+    counts -= ((counts - 1) / lengths >= MIN_VALIDATION_RATIO)
+    counts += (counts / lengths < MIN_VALIDATION_RATIO)
+    return counts
+
+@dataclass
+class CandidateScores:
+    """
+    Threshold-independent validation data for a set of candidate boxes.
+
+    For candidate i, min_distances[offsets[i]:offsets[i + 1]] holds the minimum
+    neighbor Delta E of each of its perimeter pixels, sorted ascending, so the
+    validation ratio at any threshold is a binary search.
+    """
+    boxes: List[Tuple[int, int, int, int]]
+    min_distances: np.ndarray
+    offsets: np.ndarray
+    # Per candidate: the smallest threshold at which it passes validation
+    critical_distances: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    @property
+    def nbytes(self) -> int:
+        # Boxes are tuples of four small ints: about 100 bytes each in CPython
+        return self.min_distances.nbytes + self.offsets.nbytes + self.critical_distances.nbytes + 100 * len(self.boxes)
+
+    @classmethod
+    def from_batch(
+        cls,
+        boxes: List[Tuple[int, int, int, int]],
+        batch: PerimeterBatch,
+        delta_e_metric: str = "cie76"
+    ) -> "CandidateScores":
+        lengths = batch.lengths
+        min_dists = batch_min_neighbor_distances(batch, delta_e_metric)
+
+        # Sort each candidate's segment independently
+        segment_ids = np.repeat(np.arange(len(lengths)), lengths)
+        min_dists = min_dists[np.lexsort((min_dists, segment_ids))]
+
+        if len(lengths):
+            critical = min_dists[batch.offsets[:-1] + min_supported_counts(lengths) - 1]
+        else:
+            critical = np.empty(0, dtype=np.float32)
+
+        return cls(boxes=list(boxes), min_distances=min_dists, offsets=batch.offsets, critical_distances=critical)
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["CandidateScores"]) -> "CandidateScores":
+        """
+        Join scores computed for consecutive slices of a candidate list, in order.
+        """
+        boxes = [box for part in parts for box in part.boxes]
+        if not parts:
+            return cls(boxes=[], min_distances=np.empty(0, dtype=np.float32),
+                       offsets=np.zeros(1, dtype=np.intp), critical_distances=np.empty(0, dtype=np.float32))
+
+        offsets = [np.zeros(1, dtype=np.intp)]
+        base = 0
+        for part in parts:
+            offsets.append(part.offsets[1:] + base)
+            base += part.offsets[-1]
+
+        return cls(
+            boxes=boxes,
+            min_distances=np.concatenate([part.min_distances for part in parts]),
+            offsets=np.concatenate(offsets),
+            critical_distances=np.concatenate([part.critical_distances for part in parts])
+        )
+
+    def validation_ratio(self, i: int, delta_e_threshold: float) -> float:
+        segment = self.min_distances[self.offsets[i]:self.offsets[i + 1]]
+        # Compare in the distances' own precision, like `dists <= threshold` does
+        threshold = segment.dtype.type(delta_e_threshold)
+        return np.searchsorted(segment, threshold, side='right') / len(segment)
+
+    def select(self, delta_e_threshold: float, among: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Candidates passing validation at delta_e_threshold.
+
+        Args:
+            among: Optional boolean mask restricting the candidates considered
+
+        Returns:
+            Indices of the passing candidates (ascending) and their validation ratios
+        """
+        accepted = self.critical_distances <= delta_e_threshold
+        if among is not None:
+            accepted &= among
+        passing = np.flatnonzero(accepted)
+        ratios = np.array([self.validation_ratio(i, delta_e_threshold) for i in passing], dtype=np.float64)
+        return passing, ratios
+
+def score_boxes(
+    lab_image: np.ndarray,
+    boxes: Sequence[Tuple[int, int, int, int]],
+    executor: Optional[Executor] = None,
+    num_chunks: int = 1,
+    from_bgr: bool = False,
+    delta_e_metric: str = "cie76"
+) -> CandidateScores:
+    """
+    Pack and score the perimeters of boxes (see CandidateScores).
+
+    With an executor, the boxes are split into num_chunks consecutive slices
+    scored concurrently. The NumPy work releases the GIL, so threads run in
+    parallel. Slices are joined back in order, so the result does not depend
+    on the number of chunks or on which slice finishes first.
+
+    With from_bgr, lab_image is the BGR image (see pack_perimeters).
+    """
+    if executor is None or num_chunks <= 1 or len(boxes) < 2:
+        perimeters, kept = pack_perimeters(lab_image, boxes, from_bgr)
+        return CandidateScores.from_batch([boxes[i] for i in kept], perimeters, delta_e_metric)
+
+    bounds = np.linspace(0, len(boxes), min(num_chunks, len(boxes)) + 1).astype(int)
+    chunks = [boxes[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    parts = list(executor.map(lambda chunk: score_boxes(lab_image, chunk, from_bgr=from_bgr, delta_e_metric=delta_e_metric), chunks))
+    return CandidateScores.concatenate(parts)
+
+# Early-exit validation: every PRECHECK_STRIDE-th perimeter pixel is checked
+# first, then the rest in chunks of STREAM_CHUNK pixels per candidate
+PRECHECK_STRIDE = 4
+STREAM_CHUNK = 64
+
+def _count_unsupported(
+    batch: PerimeterBatch,
+    candidate_ids: np.ndarray,
+    local: np.ndarray,
+    threshold: float,
+    distance: Callable[[np.ndarray, np.ndarray], np.ndarray]
+) -> np.ndarray:
+    """
+    Number of unsupported pixels per candidate among the given pixels
+    (candidate index and position along its perimeter). A pixel's neighbors
+    are only compared while it is still unsupported.
+    """
+    sizes = batch.lengths[candidate_ids]
+    starts = batch.offsets[candidate_ids]
+    colors = batch.colors[starts + local]
+    pending = np.arange(len(local))
+
+    for k in range(1, NEIGHBOR_RADIUS + 1):
+        for step in (k, -k):
+            if not len(pending):
+                break
+            neighbors = starts[pending] + (local[pending] + step) % sizes[pending]
+            dists = distance(colors[pending], batch.colors[neighbors])
+            pending = pending[dists > threshold]
+
+    return np.bincount(candidate_ids[pending], minlength=len(batch))
+
+def _chunk_pixels(candidate_ids: np.ndarray, lengths: np.ndarray, begin: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (candidate index, local position) of every pixel at positions [begin, end)
+    of the given candidates' perimeters.
+    """
+    counts = np.clip(lengths[candidate_ids] - begin, 0, end - begin)
+    ids = np.repeat(candidate_ids, counts)
+    firsts = np.repeat(np.cumsum(counts) - counts, counts)
+    local = begin + np.arange(len(ids), dtype=np.intp) - firsts
+    return ids, local
+
+def streaming_select(batch: PerimeterBatch, delta_e_threshold: float, delta_e_metric: str = "cie76") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Candidates passing validation at delta_e_threshold, evaluated with early exit.
+
+    A candidate of n perimeter pixels may leave at most n - m of them
+    unsupported (m from min_supported_counts). A sub-sampled pre-check counts
+    the unsupported pixels among every PRECHECK_STRIDE-th one, which is a lower
+    bound, and drops candidates already over budget. The remaining pixels are
+    then checked in chunks, and a candidate is dropped as soon as it goes over
+    budget. Accepted candidates have all their pixels checked, so the result is
+    the same as CandidateScores.select.
+
+    Returns:
+        Indices of the passing candidates (ascending) and their validation ratios
+    """
+    lengths = batch.lengths
+    if not len(lengths):
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+
+    distance = get_delta_e_metric(delta_e_metric)
+    # Compare in the colors' own precision, like the full computation
+    threshold = batch.colors.dtype.type(delta_e_threshold)
+    budget = lengths - min_supported_counts(lengths)
+    unsupported = np.zeros(len(lengths), dtype=np.int64)
+    everyone = np.arange(len(lengths))
+
+    # Pre-check on every PRECHECK_STRIDE-th pixel
+    counts = (lengths + PRECHECK_STRIDE - 1) // PRECHECK_STRIDE
+    ids = np.repeat(everyone, counts)
+    local = (np.arange(len(ids)) - np.repeat(np.cumsum(counts) - counts, counts)) * PRECHECK_STRIDE
+    unsupported += _count_unsupported(batch, ids, local, threshold, distance)
+    active = everyone[unsupported <= budget]
+
+    # The other pixels, chunk by chunk
+    begin = 0
+    while len(active) and begin < lengths[active].max():
+        ids, local = _chunk_pixels(active, lengths, begin, begin + STREAM_CHUNK)
+        skip = local % PRECHECK_STRIDE == 0
+        unsupported += _count_unsupported(batch, ids[~skip], local[~skip], threshold, distance)
+        active = active[unsupported[active] <= budget[active]]
+        begin += STREAM_CHUNK
+
+    return active, (lengths[active] - unsupported[active]) / lengths[active]
+
+def select_boxes(
+    lab_image: np.ndarray,
+    boxes: Sequence[Tuple[int, int, int, int]],
+    delta_e_threshold: float,
+    executor: Optional[Executor] = None,
+    num_chunks: int = 1,
+    from_bgr: bool = False,
+    delta_e_metric: str = "cie76"
+) -> Tuple[List[Tuple[int, int, int, int]], np.ndarray, np.ndarray]:
+    """
+    Threshold-specific counterpart of score_boxes: validate boxes at one
+    threshold with streaming_select, optionally over an executor.
+
+    Returns:
+        The boxes that could be sampled, and the indices into them of the
+        passing ones with their validation ratios (as CandidateScores.select)
+    """
+    if executor is None or num_chunks <= 1 or len(boxes) < 2:
+        perimeters, kept = pack_perimeters(lab_image, boxes, from_bgr)
+        passing, ratios = streaming_select(perimeters, delta_e_threshold, delta_e_metric)
+        return [boxes[i] for i in kept], passing, ratios
+
+    bounds = np.linspace(0, len(boxes), min(num_chunks, len(boxes)) + 1).astype(int)
+    chunks = [boxes[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+    parts = list(executor.map(lambda chunk: select_boxes(lab_image, chunk, delta_e_threshold, from_bgr=from_bgr, delta_e_metric=delta_e_metric), chunks))
+
+    kept_boxes, passing, ratios = [], [], []
+    for part_boxes, part_passing, part_ratios in parts:
+        passing.append(part_passing + len(kept_boxes))
+        ratios.append(part_ratios)
+        kept_boxes.extend(part_boxes)
+    return kept_boxes, np.concatenate(passing), np.concatenate(ratios)
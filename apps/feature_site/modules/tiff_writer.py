@@ -0,0 +1,169 @@
+import struct
+import zlib
+import cv2
+import numpy as np
+
+# TIFF field types
+SHORT = 3
+LONG = 4
+LONG8 = 16
+
+COMPRESSIONS = {None: 1, 'deflate': 8}
+
+DEFAULT_ROWS_PER_STRIP = 64
+
+# zlib level for deflate strips; generated canvases are mostly flat
+# background, where level 1 is about 3x faster than 6 for a similar size
+DEFLATE_LEVEL = 1
+
+# Classic TIFF addresses at most 4 GiB; larger files are written as BigTIFF
+CLASSIC_TIFF_LIMIT = 2**32
+
+class TiffStripWriter:
+    """
+    Writes an 8-bit RGB TIFF one strip at a time, so images far larger than
+    memory can be encoded as they are produced.
+
+    Rows are appended in any number per call (BGR, as OpenCV uses) and are
+    buffered only until a strip of rows_per_strip rows is complete. Strips
+    are written as they fill, and the directory follows them on close.
+    Readers such as OpenCV, libtiff and Pillow open the result.
+
+    bigtiff=None picks BigTIFF when the uncompressed image would not fit the
+    4 GiB classic TIFF address space.
+    """
+    def __init__(self, path, width, height, rows_per_strip=DEFAULT_ROWS_PER_STRIP, compression='deflate', bigtiff=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if width < 1 or height < 1 or rows_per_strip < 1:
+            raise ValueError("Width, height and rows_per_strip must be positive")
+        if bigtiff is None:
+            # Deflate can grow incompressible data slightly
+            bigtiff = width * height * 3 * 1.01 + 2**20 >= CLASSIC_TIFF_LIMIT
+        self.width = width
+        self.height = height
+        self.rows_per_strip = rows_per_strip
+        self.compression = compression
+        self.bigtiff = bigtiff
+        self.rows_written = 0
+        self._pending = []
+        self._pending_rows = 0
+        self._offsets = []
+        self._byte_counts = []
+        self._file = open(path, 'wb')
+        # Header; the first directory offset is filled in on close
+        if bigtiff:
+            self._file.write(b'II' + struct.pack('<HHHQ', 43, 8, 0, 0))
+        else:
+            self._file.write(b'II' + struct.pack('<HI', 42, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def write(self, rows):
+        """
+        Append (n, width, 3) BGR rows.
+        """
+        if rows.ndim != 3 or rows.shape[1:] != (self.width, 3):
+            raise ValueError(f"Expected rows of shape (n, {self.width}, 3)")
+        if self.rows_written + self._pending_rows + len(rows) > self.height:
+            raise ValueError("More rows than the image height")
+        start = 0
+        while start < len(rows):
+            take = min(len(rows) - start, self.rows_per_strip - self._pending_rows)
+            self._pending.append(cv2.cvtColor(np.ascontiguousarray(rows[start:start + take]), cv2.COLOR_BGR2RGB))
+            self._pending_rows += take
+            start += take
+            if self._pending_rows == self.rows_per_strip:
+                self._flush_strip()
+
+    def _flush_strip(self):
+        data = b''.join(chunk.tobytes() for chunk in self._pending)
+        if self.compression == 'deflate':
+            data = zlib.compress(data, DEFLATE_LEVEL)
+        self._offsets.append(self._file.tell())
+        self._byte_counts.append(len(data))
+        self._file.write(data)
+        self.rows_written += self._pending_rows
+        self._pending = []
+        self._pending_rows = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._pending_rows:
+            self._flush_strip()
+        if self.rows_written != self.height:
+            self._file.close()
+            raise ValueError(f"Only {self.rows_written} of {self.height} rows were written")
+
+        if not self.bigtiff and self._file.tell() >= CLASSIC_TIFF_LIMIT - 2**16:
+            self._file.close()
+            raise ValueError("Image too large for classic TIFF; use bigtiff=True")
+
+        offset_type = LONG8 if self.bigtiff else LONG
+        entries = [
+            (256, LONG, [self.width]),                     # ImageWidth
+            (257, LONG, [self.height]),                    # ImageLength
+            (258, SHORT, [8, 8, 8]),                       # BitsPerSample
+            (259, SHORT, [COMPRESSIONS[self.compression]]),
+            (262, SHORT, [2]),                             # PhotometricInterpretation: RGB
+            (273, offset_type, self._offsets),             # StripOffsets
+            (277, SHORT, [3]),                             # SamplesPerPixel
+            (278, LONG, [self.rows_per_strip]),            # RowsPerStrip
+            (279, offset_type, self._byte_counts),         # StripByteCounts
+            (284, SHORT, [1]),                             # PlanarConfiguration: contiguous
+        ]
+        self._write_directory(entries)
+        self._file.close()
+
+    def _write_directory(self, entries):
+        formats = {SHORT: 'H', LONG: 'I', LONG8: 'Q'}
+        inline = 8 if self.bigtiff else 4
+        # Values too large for their entry go before the directory
+        values = []
+        for tag, field_type, data in entries:
+            packed = struct.pack(f'<{len(data)}{formats[field_type]}', *data)
+            if len(packed) > inline:
+                self._align()
+                offset = self._file.tell()
+                self._file.write(packed)
+                packed = struct.pack('<Q' if self.bigtiff else '<I', offset)
+            values.append((tag, field_type, len(data), packed.ljust(inline, b'\0')))
+
+        self._align()
+        directory = self._file.tell()
+        if self.bigtiff:
+            self._file.write(struct.pack('<Q', len(values)))
+            for tag, field_type, count, packed in values:
+                self._file.write(struct.pack('<HHQ', tag, field_type, count) + packed)
+            self._file.write(struct.pack('<Q', 0))
+            self._file.seek(8)
+            self._file.write(struct.pack('<Q', directory))
+        else:
+            self._file.write(struct.pack('<H', len(values)))
+            for tag, field_type, count, packed in values:
+                self._file.write(struct.pack('<HHI', tag, field_type, count) + packed)
+            self._file.write(struct.pack('<I', 0))
+            self._file.seek(4)
+            self._file.write(struct.pack('<I', directory))
+
+    def _align(self):
+        if self._file.tell() % 2:
+            self._file.write(b'\0')
+
+def write_tiff(image, path, band_rows=1024, **options):
+    """
+    Write a BGR image, typically a np.memmap, as a strip TIFF, reading
+    band_rows rows at a time. options go to TiffStripWriter.
+    """
+    height, width = image.shape[:2]
+    with TiffStripWriter(path, width, height, **options) as writer:
+        for y in range(0, height, band_rows):
+            writer.write(np.asarray(image[y:y + band_rows]))
@@ -4,6 +4,15 @@ APP_FOLDER = os.path.dirname(__file__)
 UPLOADS_FOLDER = os.path.join(APP_FOLDER, 'uploads')
 T_FOLDER = os.path.join(APP_FOLDER, 'translations')
 
+# Threads used to validate the candidates of a single image (1 = no thread pool)
+DETECTION_THREADS = int(os.environ.get('FEATURE_SITE_DETECTION_THREADS', 1))
+
+# Memory budget of the detector's preprocessing cache, shared by all requests
+PREPROCESS_CACHE_MB = int(os.environ.get('FEATURE_SITE_PREPROCESS_CACHE_MB', 256))
+
+# Memory budget for recent detection results kept for the export endpoint
+RESULT_STORE_MB = int(os.environ.get('FEATURE_SITE_RESULT_STORE_MB', 64))
+
 if not os.path.exists(UPLOADS_FOLDER):
     os.makedirs(UPLOADS_FOLDER)
 
@@ -0,0 +1,63 @@
+"""
+Build a ground-truth corpus of create_sample_image images on a process
+pool: images under OUTPUT/images/ and one manifest line per image in
+OUTPUT/manifest.jsonl. Rerun the same command to resume an interrupted
+build, or with a larger --count to extend it.
+
+    python benchmarks/build_dataset.py /data/corpus --count 100000 --workers 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.dataset_builder import IMAGE_FORMATS, build_dataset
+
+def int_range(text):
+    low, _, high = text.partition('-')
+    return (int(low), int(high or low))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output')
+    parser.add_argument('--count', type=int, required=True)
+    parser.add_argument('--width', type=int_range, default=(200, 1200), help='LOW-HIGH, or a single value')
+    parser.add_argument('--height', type=int_range, default=(200, 1200), help='LOW-HIGH, or a single value')
+    parser.add_argument('--features', type=int_range, default=(5, 60), help='LOW-HIGH, or a single value')
+    parser.add_argument('--min-size', type=int, default=10)
+    parser.add_argument('--max-size', type=int, default=40)
+    parser.add_argument('--shapes', default='rectangle,ellipse,mixed', help='comma-separated choices')
+    parser.add_argument('--format', choices=IMAGE_FORMATS, default='png')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    distribution = {
+        'width': args.width,
+        'height': args.height,
+        'num_features': args.features,
+        'min_size': args.min_size,
+        'max_size': args.max_size,
+        'shape': args.shapes.split(','),
+    }
+    start = time.perf_counter()
+    last_report = [start]
+
+    def progress(completed, count):
+        now = time.perf_counter()
+        if now - last_report[0] >= 5 or completed == count:
+            last_report[0] = now
+            print(f"{completed}/{count} images", flush=True)
+
+    summary = build_dataset(
+        args.output, args.count, distribution, seed=args.seed, workers=args.workers,
+        image_format=args.format, progress=progress
+    )
+    elapsed = time.perf_counter() - start
+    print(f"generated {summary['generated']} images ({summary['already_present']} already present) "
+          f"in {elapsed:.1f} s, {summary['generated'] / max(elapsed, 1e-9):.1f} images/s")
+
+if __name__ == '__main__':
+    main()
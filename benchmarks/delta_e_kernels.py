@@ -0,0 +1,80 @@
+"""
+Cost of each Delta E kernel relative to CIE76: raw kernel throughput, the
+perimeter-neighbor scoring pass on the candidates of generated sample
+images, and whole detection time with the number of boxes found.
+
+    python benchmarks/delta_e_kernels.py --images 3 --width 2000 --height 1500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.feature_identifier.color import DELTA_E_METRICS, bgr_to_lab
+from apps.feature_site.modules.feature_identifier.detector import contour_boxes, detect_features, filter_boxes
+from apps.feature_site.modules.feature_identifier.edges import detect_edges
+from apps.feature_site.modules.feature_identifier.validation import batch_min_neighbor_distances, pack_perimeters
+
+def best_time_ms(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=3)
+    parser.add_argument('--width', type=int, default=2000)
+    parser.add_argument('--height', type=int, default=1500)
+    parser.add_argument('--features', type=int, default=150)
+    parser.add_argument('--threshold', type=float, default=2.3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Raw kernel cost on random Lab pairs, at typical perimeter batch sizes
+    rng = np.random.RandomState(args.seed)
+    print(f"{'pixels':>9} " + ' '.join(f"{name + ' ms':>14}" for name in DELTA_E_METRICS))
+    for size in (1000, 10000, 100000, 1000000):
+        lab1 = np.stack([rng.uniform(0, 100, size), rng.uniform(-100, 100, size), rng.uniform(-100, 100, size)], axis=1).astype(np.float32)
+        lab2 = lab1 + rng.normal(0, 3, lab1.shape).astype(np.float32)
+        times = [best_time_ms(lambda: kernel(lab1, lab2), args.repeat) for kernel in DELTA_E_METRICS.values()]
+        print(f"{size:>9} " + ' '.join(f"{t:>14.3f}" for t in times))
+    print()
+
+    totals = {name: {'scoring_ms': 0.0, 'detect_ms': 0.0, 'found': 0} for name in DELTA_E_METRICS}
+    perimeter_pixels = 0
+
+    for i in range(args.images):
+        random.seed(args.seed + i)
+        image, _ = create_sample_image(args.width, args.height, args.features)
+
+        boxes = filter_boxes(contour_boxes(detect_edges(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))), 5, 60, 5, 60)
+        batch, _ = pack_perimeters(bgr_to_lab(image), boxes)
+        perimeter_pixels += len(batch.colors)
+
+        for name in DELTA_E_METRICS:
+            totals[name]['scoring_ms'] += best_time_ms(lambda: batch_min_neighbor_distances(batch, name), args.repeat)
+            start = time.perf_counter()
+            result = detect_features(image, 5, 60, 5, 60, args.threshold, delta_e_metric=name)
+            totals[name]['detect_ms'] += (time.perf_counter() - start) * 1000
+            totals[name]['found'] += len(result.bounding_boxes)
+
+    base = totals['cie76']
+    print(f"{perimeter_pixels // max(1, args.images)} perimeter pixels per image on average")
+    print(f"{'metric':<10} {'scoring ms':>11} {'x cie76':>8} {'detect ms':>10} {'x cie76':>8} {'found':>6}")
+    for name, t in totals.items():
+        print(f"{name:<10} {t['scoring_ms'] / args.images:>11.1f} {t['scoring_ms'] / base['scoring_ms']:>8.2f} "
+              f"{t['detect_ms'] / args.images:>10.1f} {t['detect_ms'] / base['detect_ms']:>8.2f} {t['found']:>6}")
+
+if __name__ == '__main__':
+    main()
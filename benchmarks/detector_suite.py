@@ -0,0 +1,174 @@
+"""
+Detector speed and memory on generated sample images of fixed sizes and
+seeds, per edge method and per detection stage, checked against a stored
+baseline.
+
+    python benchmarks/detector_suite.py                       # compare to the baseline
+    python benchmarks/detector_suite.py --save                # record a new baseline
+    python benchmarks/detector_suite.py --cases all --tolerance 0.5
+
+Exits with status 1 when a case's total time, a stage slower than --min-ms,
+or the peak traced memory exceeds the baseline by more than the tolerance,
+and also when there is no baseline to check against (unless --save).
+Baselines are only comparable on the machine that recorded them.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import generate_scene
+from apps.feature_site.modules.feature_identifier.detector import detect_features
+from apps.feature_site.modules.feature_identifier.edges import EDGE_BACKENDS
+
+# Case name -> (width, height, features)
+CASES = {
+    '0.1mp': (400, 250, 10),
+    '1mp': (1250, 800, 250),
+    '10mp': (4000, 2500, 2500),
+    '100mp': (12500, 8000, 50000),
+}
+
+DEFAULT_CASES = ('0.1mp', '1mp', '10mp')
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'detector.json')
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+    }
+
+def run_case(image, method, args):
+    """
+    Best-of-repeat total and per-stage times, then one traced run for the
+    peak memory of the whole detection. The timed runs follow an untimed
+    one, so one-time initialization (OpenCV's first conversions, caches)
+    is not charged to the first case.
+    """
+    detect_features(image, args.min_size, args.max_size, args.min_size, args.max_size, args.threshold, method)
+    total_ms = float('inf')
+    stage_ms = {}
+    found = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = detect_features(image, args.min_size, args.max_size, args.min_size, args.max_size, args.threshold, method)
+        total_ms = min(total_ms, (time.perf_counter() - start) * 1000)
+        for name, stats in result.stages.items():
+            stage_ms[name] = min(stage_ms.get(name, float('inf')), stats.time_ms)
+        found = len(result.bounding_boxes)
+
+    tracemalloc.start()
+    try:
+        detect_features(image, args.min_size, args.max_size, args.min_size, args.max_size, args.threshold, method)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'total_ms': total_ms, 'stages_ms': stage_ms, 'peak_bytes': peak_bytes, 'found': found}
+
+def compare(current, baseline, tolerance, memory_tolerance, min_ms):
+    """
+    Regressions of current against baseline, as readable lines. Entries
+    missing from either side are skipped.
+    """
+    regressions = []
+    for key, entry in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        timings = [('total', entry['total_ms'], base['total_ms'])]
+        timings += [
+            (stage, ms, base['stages_ms'][stage]) for stage, ms in entry['stages_ms'].items()
+            if base['stages_ms'].get(stage, 0.0) >= min_ms
+        ]
+        for name, ms, base_ms in timings:
+            if ms > base_ms * (1 + tolerance):
+                regressions.append(f"{key} {name}: {ms:.1f} ms vs {base_ms:.1f} ms baseline ({ms / base_ms:.2f}x)")
+        if entry['peak_bytes'] > base['peak_bytes'] * (1 + memory_tolerance):
+            regressions.append(
+                f"{key} peak memory: {entry['peak_bytes'] / 2**20:.1f} MB vs "
+                f"{base['peak_bytes'] / 2**20:.1f} MB baseline"
+            )
+        if entry['found'] != base['found']:
+            print(f"warning: {key} found {entry['found']} boxes, baseline {base['found']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', default=','.join(DEFAULT_CASES), help=f"comma-separated, or 'all' ({', '.join(CASES)})")
+    parser.add_argument('--edge-methods', default=','.join(EDGE_BACKENDS), help='comma-separated')
+    parser.add_argument('--min-size', type=int, default=5)
+    parser.add_argument('--max-size', type=int, default=60)
+    parser.add_argument('--threshold', type=float, default=2.3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help='write the results to the baseline instead of checking')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, as a fraction')
+    parser.add_argument('--memory-tolerance', type=float, default=0.1, help='allowed peak memory growth, as a fraction')
+    parser.add_argument('--min-ms', type=float, default=10.0, help='stages faster than this in the baseline are not gated')
+    args = parser.parse_args()
+
+    case_names = list(CASES) if args.cases == 'all' else args.cases.split(',')
+    methods = args.edge_methods.split(',')
+    for name in case_names:
+        if name not in CASES:
+            parser.error(f"unknown case: {name}")
+    for method in methods:
+        if method not in EDGE_BACKENDS:
+            parser.error(f"unknown edge method: {method}")
+
+    current = {}
+    print(f"{'case':<22} {'total ms':>9} {'peak MB':>8} {'found':>6}  stages ms")
+    for case in case_names:
+        width, height, features = CASES[case]
+        image, _ = generate_scene(width, height, features, seed=args.seed)
+        for method in methods:
+            key = f"{case}/{method}"
+            entry = current[key] = run_case(image, method, args)
+            stages = ' '.join(f"{name}={ms:.1f}" for name, ms in entry['stages_ms'].items())
+            print(f"{key:<22} {entry['total_ms']:>9.1f} {entry['peak_bytes'] / 2**20:>8.1f} {entry['found']:>6}  {stages}")
+
+    if args.save:
+        stored = {'environment': environment(), 'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored['results'] = json.load(f)['results']
+        stored['results'].update(current)
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+        print(f"saved {len(current)} results to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save to record one")
+        sys.exit(1)
+    with open(args.baseline) as f:
+        stored = json.load(f)
+    if stored.get('environment') != environment():
+        print(f"warning: baseline recorded on a different environment: {stored.get('environment')}")
+
+    regressions = compare(current, stored['results'], args.tolerance, args.memory_tolerance, args.min_ms)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nno regressions beyond {args.tolerance:.0%} of the baseline")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Time, memory and detection recall of every edge backend on generated
+sample images, to pick the cheapest backend with acceptable recall.
+
+    python benchmarks/edge_backends.py --images 4 --width 3000 --height 2000
+"""
+import argparse
+import os
+import random
+import sys
+
+import cv2
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.feature_identifier.detector import detect_features
+from apps.feature_site.modules.feature_identifier.edges import EDGE_BACKENDS, profile_edge_backends
+from apps.feature_site.modules.feature_identifier.evaluation import ground_truth_boxes
+from apps.feature_site.modules.feature_identifier.geometry import match_boxes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=4)
+    parser.add_argument('--width', type=int, default=2000)
+    parser.add_argument('--height', type=int, default=1500)
+    parser.add_argument('--features', type=int, default=150)
+    parser.add_argument('--threshold', type=float, default=2.3)
+    parser.add_argument('--min-iou', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    totals = {name: {'time_ms': 0.0, 'peak_bytes': 0, 'matched': 0, 'found': 0} for name in EDGE_BACKENDS}
+    truth_count = 0
+
+    for i in range(args.images):
+        random.seed(args.seed + i)
+        image, features = create_sample_image(args.width, args.height, args.features)
+        truth = ground_truth_boxes(features)
+        truth_count += len(truth)
+
+        profile = profile_edge_backends(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        for name, stats in profile.items():
+            totals[name]['time_ms'] += stats['time_ms']
+            totals[name]['peak_bytes'] = max(totals[name]['peak_bytes'], stats['peak_bytes'])
+
+            result = detect_features(image, 5, 60, 5, 60, args.threshold, name)
+            boxes = [(b.x, b.y, b.w, b.h) for b in result.bounding_boxes]
+            totals[name]['found'] += len(boxes)
+            totals[name]['matched'] += len(match_boxes(truth, boxes, args.min_iou))
+
+    print(f"{'backend':<16} {'edges ms':>9} {'peak MB':>8} {'found':>6} {'recall':>7} {'precision':>9}")
+    for name, t in totals.items():
+        recall = t['matched'] / truth_count if truth_count else 0.0
+        precision = t['matched'] / t['found'] if t['found'] else 0.0
+        print(f"{name:<16} {t['time_ms'] / args.images:>9.1f} {t['peak_bytes'] / 2**20:>8.1f} "
+              f"{t['found']:>6} {recall:>7.1%} {precision:>9.1%}")
+
+if __name__ == '__main__':
+    main()
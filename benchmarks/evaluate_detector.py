@@ -0,0 +1,94 @@
+"""
+Precision, recall and throughput of detector configurations against ground
+truth, per edge method, on a built dataset (see build_dataset.py) or on
+seeded generated scenes.
+
+    python benchmarks/evaluate_detector.py --dataset /data/corpus --limit 500
+    python benchmarks/evaluate_detector.py --images 20 --grid delta_e_threshold=1,2.3,5 --json results.json
+    python benchmarks/evaluate_detector.py --grid color_estimator=mean,median --edge-methods canny
+
+Each --grid NAME=V1,V2 adds a detect_features keyword as an axis; every
+combination is run with every edge method (a grid over edge_detection_method
+replaces --edge-methods). Throughput counts detection time only, on decoded
+images.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.dataset_builder import iter_dataset
+from apps.feature_site.modules.demo_utils import generate_scene
+from apps.feature_site.modules.feature_identifier.edges import EDGE_BACKENDS
+from apps.feature_site.modules.feature_identifier.evaluation import evaluate_detector, format_evaluation_table
+from apps.feature_site.modules.feature_identifier.sweep import parameter_grid
+
+def parse_value(text):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return {'true': True, 'false': False, 'none': None}.get(text.lower(), text)
+
+def grid_axis(text):
+    name, separator, values = text.partition('=')
+    if not separator or not name or not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,... not {text!r}")
+    return name, [parse_value(value) for value in values.split(',')]
+
+def generated_corpus(count, width, height, num_features, min_size, max_size, seed):
+    for i in range(count):
+        yield generate_scene(width, height, num_features, min_size=min_size, max_size=max_size, seed=seed + i)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', help='dataset directory; generated scenes are used without it')
+    parser.add_argument('--limit', type=int, default=None, help='only dataset images with a lower index')
+    parser.add_argument('--images', type=int, default=10, help='generated scenes')
+    parser.add_argument('--width', type=int, default=1200)
+    parser.add_argument('--height', type=int, default=900)
+    parser.add_argument('--features', type=int, default=60)
+    parser.add_argument('--min-size', type=int, default=10, help='smallest feature, generated and detected')
+    parser.add_argument('--max-size', type=int, default=40, help='largest feature, generated and detected')
+    parser.add_argument('--size-margin', type=int, default=5, help='pixels the detected size range extends past the generated one')
+    parser.add_argument('--threshold', type=float, default=2.3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--edge-methods', default=','.join(EDGE_BACKENDS), help='comma-separated')
+    parser.add_argument('--grid', type=grid_axis, action='append', default=[], metavar='NAME=V1,V2')
+    parser.add_argument('--min-iou', type=float, default=0.5)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    methods = args.edge_methods.split(',')
+    for method in methods + dict(args.grid).get('edge_detection_method', []):
+        if method not in EDGE_BACKENDS:
+            parser.error(f"unknown edge method: {method}")
+
+    if args.dataset:
+        corpus = iter_dataset(args.dataset, args.limit)
+    else:
+        corpus = generated_corpus(args.images, args.width, args.height, args.features, args.min_size, args.max_size, args.seed)
+    configs = list(parameter_grid(**dict(args.grid)))
+    # Edge outlines come out a pixel or two off the drawn size, so the
+    # detected range is a little wider than the generated one
+    min_size = max(1, args.min_size - args.size_margin)
+    max_size = args.max_size + 1 + args.size_margin
+    stats = evaluate_detector(
+        corpus, configs, methods, args.min_iou,
+        min_w=min_size, max_w=max_size, min_h=min_size, max_h=max_size, delta_e_threshold=args.threshold
+    )
+    if not stats or not stats[0].images:
+        parser.error('no images to evaluate')
+
+    print(f"{stats[0].images} images, {stats[0].megapixels:.1f} MP, {stats[0].truth} features, IoU >= {args.min_iou}")
+    print(format_evaluation_table(stats))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'min_iou': args.min_iou, 'results': [entry.to_dict() for entry in stats]}, f, indent=2)
+        print(f"wrote {len(stats)} results to {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Recall and speed of pyramid detection against the full-resolution path,
+on a corpus of generated sample images.
+
+    python benchmarks/pyramid_recall.py --images 8 --min-size 64
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.feature_identifier.pyramid import pyramid_level, pyramid_recall_report
+
+def sample_corpus(count, width, height, num_features, min_size, max_size, seed):
+    for i in range(count):
+        random.seed(seed + i)
+        image, _ = create_sample_image(width, height, num_features, min_size=min_size, max_size=max_size)
+        yield image
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--width', type=int, default=2400)
+    parser.add_argument('--height', type=int, default=1800)
+    parser.add_argument('--features', type=int, default=120)
+    parser.add_argument('--min-size', type=int, default=64)
+    parser.add_argument('--max-size', type=int, default=200)
+    parser.add_argument('--threshold', type=float, default=2.3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Size range slightly wider than the generated shapes, whose outlines
+    # come out a pixel or two larger than the drawn size
+    min_size, max_size = args.min_size, args.max_size + 50
+
+    print(f"{'method':<8} {'level':>5} {'full':>6} {'pyramid':>8} {'exact':>7} {'iou>=.9':>8} {'speedup':>8}")
+    auto_level = pyramid_level(min_size, min_size)
+    for method in ('canny', 'sobel'):
+        for level in sorted({1, auto_level}):
+            corpus = sample_corpus(args.images, args.width, args.height, args.features, args.min_size, args.max_size, args.seed)
+            report = pyramid_recall_report(corpus, min_size, max_size, min_size, max_size, args.threshold, method, level)
+            print(f"{method:<8} {level:>5} {report['full_boxes']:>6} {report['pyramid_boxes']:>8} "
+                  f"{report['exact_recall']:>7.1%} {report['iou_recall']:>8.1%} {report['speedup']:>7.2f}x")
+
+if __name__ == '__main__':
+    main()
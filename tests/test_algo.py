@@ -2,12 +2,22 @@ import unittest
 import numpy as np
 import sys
 import os
+import random
+import cv2
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
 
 # Add apps to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from apps.feature_site.modules.feature_identifier.color import calculate_delta_e_cie76, bgr_to_lab
-from apps.feature_site.modules.feature_identifier.geometry import check_overlap_mask, mark_occupied, get_outline_coordinates
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.feature_identifier.color import calculate_delta_e_cie76, bgr_to_lab, bgr_pixels_to_lab, delta_e_cie76, delta_e_cie94, delta_e_ciede2000
+from apps.feature_site.modules.feature_identifier.geometry import check_overlap_mask, mark_occupied, get_outline_coordinates, perimeter_template, perimeter_indices, pack_perimeter_indices, select_exclusive, RectangleIndex, box_iou, match_boxes
+from apps.feature_site.modules.feature_identifier.detector import get_dominant_color, _detect_in_image, detect_features, detect_features_with_overlay, contour_boxes, component_boxes, filter_boxes, filter_box_array
+from apps.feature_site.modules.feature_identifier.cache import PreprocessCache
+from apps.feature_site.modules.feature_identifier.stages import DETECTION_STAGES
+from apps.feature_site.modules.feature_identifier.edges import detect_edges, profile_edge_backends, EDGE_BACKENDS
+from apps.feature_site.modules.feature_identifier.validation import pack_perimeters, batch_validation_ratios, validation_ratio, CandidateScores, score_boxes, streaming_select, select_boxes
 
 class TestFeatureIdentifier(unittest.TestCase):
     
@@ -19,6 +29,57 @@ class TestFeatureIdentifier(unittest.TestCase):
         c3 = np.array([60.0, 0.0, 0.0])
         self.assertAlmostEqual(calculate_delta_e_cie76(c1, c3), 10.0)
         
+    def test_delta_e_kernels(self):
+        # Pairs and expected values from Sharma, Wu and Dalal's CIEDE2000 test data
+        pairs = np.array([
+            [50.0, 2.6772, -79.7751, 50.0, 0.0, -82.7485, 2.0425],
+            [50.0, -1.0, 2.0, 50.0, 0.0, 0.0, 2.3669],
+            [50.0, 2.49, -0.001, 50.0, -2.49, 0.0009, 7.1792],
+            [50.0, 2.5, 0.0, 73.0, 25.0, -18.0, 27.1492],
+            [60.2574, -34.0099, 36.2677, 60.4626, -34.1751, 39.4387, 1.2644],
+            [2.0776, 0.0795, -1.1350, 0.9033, -0.0636, -0.5514, 0.9082],
+        ], dtype=np.float32)
+        lab1, lab2 = pairs[:, :3], pairs[:, 3:6]
+        np.testing.assert_allclose(delta_e_ciede2000(lab1, lab2), pairs[:, 6], atol=1e-4)
+
+        for kernel in (delta_e_cie76, delta_e_cie94, delta_e_ciede2000):
+            np.testing.assert_allclose(kernel(lab1, lab2), kernel(lab2, lab1), rtol=1e-6)
+            self.assertEqual(kernel(lab1, lab2).dtype, np.float32)
+
+        # CIE94 reduces to CIE76 on a lightness difference and discounts chroma
+        np.testing.assert_allclose(delta_e_cie94(np.array([[50.0, 20.0, 0.0]]), np.array([[60.0, 20.0, 0.0]])), [10.0])
+        self.assertLess(delta_e_cie94(np.array([[50.0, 60.0, 0.0]]), np.array([[50.0, 70.0, 0.0]]))[0], 10.0)
+
+        random.seed(11)
+        img, _ = create_sample_image(300, 200, 20, min_size=8, max_size=40)
+        for metric in ('cie94', 'ciede2000'):
+            result = _detect_in_image(img, 5, 60, 5, 60, 2.3, delta_e_metric=metric)
+            early = _detect_in_image(img, 5, 60, 5, 60, 2.3, delta_e_metric=metric, validation_mode='early_exit')
+            self.assertEqual(early.bounding_boxes, result.bounding_boxes)
+            self.assertTrue(result.delta_e_method.startswith(metric.upper()))
+        with self.assertRaises(ValueError):
+            _detect_in_image(img, 5, 60, 5, 60, 2.3, delta_e_metric='cie2525')
+
+    def test_lab_conversions(self):
+        rng = np.random.RandomState(7)
+        img = rng.randint(0, 256, (40, 60, 3)).astype(np.uint8)
+
+        lab = bgr_to_lab(img)
+        l, a, b = cv2.split(cv2.cvtColor(img, cv2.COLOR_BGR2Lab).astype(np.float32))
+        np.testing.assert_array_equal(lab, cv2.merge([l * 100.0 / 255.0, a - 128.0, b - 128.0]))
+
+        rows, cols = rng.randint(0, 40, 100), rng.randint(0, 60, 100)
+        np.testing.assert_array_equal(bgr_pixels_to_lab(img[rows, cols]), lab[rows, cols])
+        self.assertEqual(bgr_pixels_to_lab(img[:0, 0]).shape, (0, 3))
+
+        random.seed(4)
+        sample, _ = create_sample_image(300, 200, 20, min_size=8, max_size=40)
+        expected = _detect_in_image(sample, 5, 60, 5, 60, 2.3).bounding_boxes
+        for mode in ('sparse', 'auto'):
+            self.assertEqual(_detect_in_image(sample, 5, 60, 5, 60, 2.3, lab_conversion=mode).bounding_boxes, expected)
+        with self.assertRaises(ValueError):
+            _detect_in_image(sample, 5, 60, 5, 60, 2.3, lab_conversion='bogus')
+
     def test_overlap_logic(self):
         h, w = 100, 100
         mask = np.zeros((h, w), dtype=np.uint8)
@@ -30,6 +91,61 @@ class TestFeatureIdentifier(unittest.TestCase):
         self.assertTrue(check_overlap_mask(mask, 15, 15, 20, 20))
         self.assertFalse(check_overlap_mask(mask, 50, 50, 10, 10))
         
+    def test_rectangle_index(self):
+        index = RectangleIndex(cell_size=16)
+        index.insert(10, 10, 30, 30)
+        self.assertTrue(index.overlaps(10, 10, 30, 30))
+        self.assertTrue(index.overlaps(29, 29, 60, 60))
+        self.assertFalse(index.overlaps(30, 10, 40, 30))  # Touching edges do not overlap
+        self.assertFalse(index.overlaps(50, 50, 60, 60))
+
+    def test_exclusivity_engines_agree(self):
+        rng = np.random.RandomState(2)
+        for _ in range(20):
+            boxes = [(int(x), int(y), int(w), int(h)) for x, y, w, h in zip(
+                rng.randint(-20, 200, 150), rng.randint(-20, 150, 150),
+                rng.randint(1, 60, 150), rng.randint(1, 60, 150))]
+            self.assertEqual(select_exclusive(boxes, (150, 200), engine='index'),
+                             select_exclusive(boxes, (150, 200), engine='mask'))
+
+    def test_exclusivity_with_large_boxes(self):
+        # One box covering most of a 100k x 100k image among small ones: a
+        # grid sized to the small boxes would register it in ~10^8 cells
+        rng = np.random.RandomState(3)
+        small = [(int(x), int(y), 10, 10) for x, y in zip(rng.randint(0, 100000, 2000), rng.randint(0, 100000, 2000))]
+        boxes = [(20000, 20000, 60000, 60000)] + small[:1000] + [(0, 0, 5000, 90000)] + small[1000:]
+
+        def brute_force(boxes):
+            kept = []
+            for i, (x, y, w, h) in enumerate(boxes):
+                if not any(x < kx + kw and kx < x + w and y < ky + kh and ky < y + h for kx, ky, kw, kh in (boxes[k] for k in kept)):
+                    kept.append(i)
+            return kept
+
+        kept = select_exclusive(boxes, (100000, 100000), engine='index')
+        self.assertEqual(kept, brute_force(boxes))
+        # The first large box is kept and suppresses the small ones inside it
+        self.assertEqual(kept[0], 0)
+        self.assertLess(len(kept), len(boxes) - 500)
+
+        index = RectangleIndex(cell_size=10)
+        index.insert(0, 0, 50000, 50000)
+        index.insert(60000, 0, 60010, 10)
+        self.assertEqual(len(index._cells), 1)
+        self.assertTrue(index.overlaps(49990, 49990, 50010, 50010))
+        self.assertFalse(index.overlaps(50000, 0, 60000, 100000))
+        self.assertTrue(index.overlaps(0, 0, 100000, 100000))
+
+    def test_box_matching(self):
+        self.assertAlmostEqual(box_iou((0, 0, 10, 10), (5, 0, 10, 10)), 50 / 150)
+        self.assertEqual(box_iou((0, 0, 10, 10), (10, 10, 5, 5)), 0.0)
+
+        reference = [(0, 0, 10, 10), (20, 20, 10, 10), (50, 50, 4, 4)]
+        predicted = [(21, 20, 10, 10), (0, 0, 10, 10), (0, 1, 10, 10)]
+        matches = match_boxes(reference, predicted, min_iou=0.5)
+        self.assertEqual([(r, p) for r, p, _ in matches], [(0, 1), (1, 0)])
+        self.assertEqual(match_boxes(reference, [], 0.5), [])
+
     def test_perimeter_coordinates(self):
         coords = get_outline_coordinates(0, 0, 3, 3)
         self.assertEqual(len(coords), 8)
@@ -38,6 +154,232 @@ class TestFeatureIdentifier(unittest.TestCase):
         
         self.assertNotIn((1,1), coords) # Interior pixel
 
+    def test_perimeter_templates(self):
+        for w, h in [(1, 1), (1, 5), (6, 1), (2, 2), (3, 3), (7, 4)]:
+            rows, cols = perimeter_template(w, h)
+            self.assertEqual((rows.dtype, cols.dtype), (np.int32, np.int32))
+            self.assertEqual(list(zip(cols.tolist(), rows.tolist())), get_outline_coordinates(0, 0, w, h))
+        self.assertIs(perimeter_template(7, 4), perimeter_template(7, 4))
+        self.assertFalse(perimeter_template(7, 4)[0].flags.writeable)
+
+        # Clipped at the image border, in perimeter order
+        rows, cols = perimeter_indices(-2, 1, 5, 3, (10, 10))
+        expected = [(c, r) for c, r in get_outline_coordinates(-2, 1, 5, 3) if c >= 0]
+        self.assertEqual(list(zip(cols.tolist(), rows.tolist())), expected)
+
+        boxes = [(0, 0, 4, 4), (20, 20, 3, 3), (8, 8, 5, 5), (-1, -1, 2, 2)]
+        rows, cols, offsets, kept = pack_perimeter_indices(boxes, (10, 10))
+        self.assertEqual(kept, [0, 2, 3])
+        self.assertEqual(list(offsets), [0, 12, 15, 16])
+        self.assertEqual((rows[15], cols[15]), (0, 0))
+
+    def test_batch_validation_matches_per_candidate(self):
+        rng = np.random.RandomState(0)
+        lab = rng.uniform(0, 6, (60, 80, 3)).astype(np.float32)
+        # Includes tiny perimeters (wrap-around) and a box hanging off the image
+        boxes = [(0, 0, 3, 3), (5, 5, 1, 4), (10, 2, 30, 20), (70, 50, 20, 20), (2, 30, 2, 2)]
+
+        batch, kept = pack_perimeters(lab, boxes)
+        self.assertEqual(kept, [0, 1, 2, 3, 4])
+
+        for threshold in (0.5, 2.3, 5.0):
+            ratios = batch_validation_ratios(batch, threshold)
+            for i, ratio in zip(kept, ratios):
+                colors = batch.colors[batch.offsets[i]:batch.offsets[i + 1]]
+                self.assertEqual(ratio, validation_ratio(colors, threshold))
+
+    def test_pack_perimeters_drops_boxes_outside_image(self):
+        lab = np.zeros((10, 10, 3), dtype=np.float32)
+        batch, kept = pack_perimeters(lab, [(20, 20, 5, 5), (0, 0, 4, 4)])
+        self.assertEqual(kept, [1])
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(len(batch.colors), 12)
+
+    def test_candidate_scores_match_batch_ratios(self):
+        rng = np.random.RandomState(1)
+        lab = rng.uniform(0, 8, (50, 50, 3)).astype(np.float32)
+        boxes = [(0, 0, 10, 10), (5, 5, 20, 30), (30, 2, 3, 3), (12, 40, 25, 6)]
+        batch, kept = pack_perimeters(lab, boxes)
+        scores = CandidateScores.from_batch(boxes, batch)
+
+        for threshold in (0.1, 1.0, 2.3, 4.0, 8.0):
+            ratios = batch_validation_ratios(batch, threshold)
+            passing, selected = scores.select(threshold)
+            self.assertEqual(list(passing), [i for i, r in enumerate(ratios) if r >= 0.80])
+            self.assertEqual(list(selected), [ratios[i] for i in passing])
+
+    def test_streaming_select_matches_scores(self):
+        rng = np.random.RandomState(4)
+        lab = rng.uniform(0, 6, (80, 80, 3)).astype(np.float32)
+        lab[20:50, 10:60] = 30.0
+        boxes = [(x, y, 3 + x % 11, 2 + y % 13) for x in range(0, 70, 5) for y in range(0, 70, 7)] + [(10, 20, 50, 30)]
+        batch, kept = pack_perimeters(lab, boxes)
+        scores = CandidateScores.from_batch(boxes, batch)
+
+        for threshold in (0.5, 2.3, 5.0, 9.0):
+            passing, ratios = streaming_select(batch, threshold)
+            expected_passing, expected_ratios = scores.select(threshold)
+            np.testing.assert_array_equal(passing, expected_passing)
+            np.testing.assert_array_equal(ratios, expected_ratios)
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                selected, passing, ratios = select_boxes(lab, boxes, threshold, executor, 3)
+            self.assertEqual([selected[i] for i in passing], [scores.boxes[i] for i in expected_passing])
+            np.testing.assert_array_equal(ratios, expected_ratios)
+
+        random.seed(5)
+        img, _ = create_sample_image(300, 200, 25, min_size=8, max_size=40)
+        expected = _detect_in_image(img, 5, 60, 5, 60, 2.3).bounding_boxes
+        self.assertEqual(_detect_in_image(img, 5, 60, 5, 60, 2.3, validation_mode='early_exit').bounding_boxes, expected)
+        with self.assertRaises(ValueError):
+            _detect_in_image(img, 5, 60, 5, 60, 2.3, validation_mode='bogus')
+
+    def test_threaded_scoring_is_deterministic(self):
+        rng = np.random.RandomState(2)
+        lab = rng.uniform(0, 8, (60, 60, 3)).astype(np.float32)
+        boxes = [(x, y, 5 + x % 7, 4 + y % 9) for x in range(0, 50, 6) for y in range(0, 50, 8)] + [(70, 70, 5, 5)]
+        serial = score_boxes(lab, boxes)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            for num_chunks in (2, 5, len(boxes)):
+                threaded = score_boxes(lab, boxes, executor, num_chunks)
+                self.assertEqual(threaded.boxes, serial.boxes)
+                np.testing.assert_array_equal(threaded.offsets, serial.offsets)
+                np.testing.assert_array_equal(threaded.min_distances, serial.min_distances)
+                np.testing.assert_array_equal(threaded.critical_distances, serial.critical_distances)
+
+    def test_threaded_detection_matches_serial(self):
+        random.seed(3)
+        img, _ = create_sample_image(300, 200, 25, min_size=8, max_size=40)
+        serial = _detect_in_image(img, 5, 60, 5, 60, 2.3)
+        for num_threads in (2, 4):
+            threaded = _detect_in_image(img, 5, 60, 5, 60, 2.3, num_threads=num_threads)
+            self.assertEqual(threaded.bounding_boxes, serial.bounding_boxes)
+
+        with self.assertRaises(ValueError):
+            _detect_in_image(img, 5, 60, 5, 60, 2.3, num_threads=0)
+
+    def test_detect_from_bytes_and_arrays(self):
+        random.seed(6)
+        img, _ = create_sample_image(200, 150, 10, min_size=8, max_size=40)
+        ok, encoded = cv2.imencode('.png', img)
+        self.assertTrue(ok)
+        data = encoded.tobytes()
+
+        expected = _detect_in_image(img, 5, 60, 5, 60, 2.3).bounding_boxes
+        self.assertEqual(detect_features(img, 5, 60, 5, 60, 2.3).bounding_boxes, expected)
+        self.assertEqual(detect_features(data, 5, 60, 5, 60, 2.3).bounding_boxes, expected)
+        self.assertEqual(detect_features(data, 5, 60, 5, 60, 2.3, cache=PreprocessCache()).bounding_boxes, expected)
+
+        result, overlay = detect_features_with_overlay(data, 5, 60, 5, 60, 2.3)
+        self.assertEqual(result.bounding_boxes, expected)
+        self.assertEqual(overlay.shape, img.shape)
+        self.assertTrue(np.any(overlay != img))
+
+        with self.assertRaises(ValueError):
+            detect_features(b'not an image', 5, 60, 5, 60, 2.3)
+
+    def test_stage_timings(self):
+        random.seed(6)
+        img, _ = create_sample_image(200, 150, 10, min_size=8, max_size=40)
+        runs = []
+        result = detect_features(img, 5, 60, 5, 60, 2.3, on_stage=runs.append, trace_memory=True)
+
+        self.assertEqual(list(result.stages), [s for s in DETECTION_STAGES if s != 'overlay'])
+        self.assertEqual([run.name for run in runs].count('validation'), 2)
+        self.assertEqual(result.stages['validation'].calls, 2)
+        self.assertEqual(result.stages['color'].count, len(result.bounding_boxes))
+        self.assertGreaterEqual(result.stages['filter'].count, result.stages['validation'].count)
+        self.assertTrue(all(stats.time_ns > 0 and stats.peak_bytes is not None for stats in result.stages.values()))
+        self.assertFalse(tracemalloc.is_tracing())
+
+        # Cached preprocessing stages are skipped on a second run
+        cache = PreprocessCache()
+        detect_features(img, 5, 60, 5, 60, 2.3, cache=cache)
+        result, _ = detect_features_with_overlay(img, 5, 60, 5, 60, 3.0, cache=cache)
+        self.assertEqual(list(result.stages), ['decode', 'validation', 'exclusivity', 'color', 'overlay'])
+        self.assertIsNone(result.stages['color'].peak_bytes)
+
+    def test_edge_backends(self):
+        random.seed(8)
+        img, _ = create_sample_image(300, 200, 20, min_size=8, max_size=40)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+        canny = detect_edges(gray, 'canny')
+        np.testing.assert_array_equal(detect_edges(gray, 'canny_gradients'), canny)
+        np.testing.assert_array_equal(detect_edges(gray, 'no_such_backend'), canny)
+
+        # Same threshold as the float64 Sobel, up to float32 rounding
+        sobel = detect_edges(gray, 'SOBEL')
+        self.assertLessEqual(np.count_nonzero(detect_edges(gray, 'sobel_f32') != sobel), sobel.size // 1000)
+
+        for name in EDGE_BACKENDS:
+            edges = detect_edges(gray, name)
+            self.assertEqual((edges.dtype, edges.shape), (np.uint8, gray.shape))
+            self.assertTrue(set(np.unique(edges)) <= {0, 255})
+
+        report = profile_edge_backends(gray, ['canny', 'sobel_l1'], repeat=1)
+        self.assertEqual(sorted(report), ['canny', 'sobel_l1'])
+        self.assertGreater(report['canny']['edge_fraction'], 0)
+
+    def test_component_boxes_match_contours(self):
+        random.seed(9)
+        img, _ = create_sample_image(300, 200, 25, min_size=5, max_size=50)
+        rng = np.random.RandomState(9)
+        edge_maps = [detect_edges(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), m) for m in ('canny', 'sobel')]
+        edge_maps += [(rng.rand(120, 160) < p).astype(np.uint8) * 255 for p in (0.05, 0.4, 0.7)]
+        edge_maps.append(np.zeros((10, 10), dtype=np.uint8))
+
+        for edges in edge_maps:
+            boxes = component_boxes(edges)
+            self.assertEqual(boxes.dtype, np.int32)
+            self.assertEqual([tuple(b) for b in boxes.tolist()], contour_boxes(edges))
+            self.assertEqual(
+                [tuple(b) for b in filter_box_array(boxes, 3, 40, 2, 30).tolist()],
+                filter_boxes(contour_boxes(edges), 3, 40, 2, 30)
+            )
+
+        expected = _detect_in_image(img, 5, 60, 5, 60, 2.3).bounding_boxes
+        self.assertEqual(_detect_in_image(img, 5, 60, 5, 60, 2.3, candidate_generator='components').bounding_boxes, expected)
+        with self.assertRaises(ValueError):
+            _detect_in_image(img, 5, 60, 5, 60, 2.3, candidate_generator='bogus')
+
+    def test_dominant_color_estimators(self):
+        img = np.full((40, 40, 3), 255, dtype=np.uint8)
+        img[10:30, 10:30] = (0, 0, 200)       # Red fill (BGR)
+        img[10:30, 10] = (0, 0, 0)            # Black outline on one side
+        img[12:14, 12:14] = (200, 0, 0)       # Small blue blob inside
+
+        for estimator in ('median', 'mode'):
+            self.assertEqual(get_dominant_color(img, 10, 10, 20, 20, estimator=estimator), '#C80000')
+        self.assertRegex(get_dominant_color(img, 10, 10, 20, 20, estimator='kmeans'), r'^#[0-9A-F]{6}$')
+        self.assertEqual(get_dominant_color(img, 15, 15, 10, 10, estimator='mean'), '#C80000')
+        # Outline pixels: 19 black out of 76, the rest red
+        self.assertEqual(get_dominant_color(img, 10, 10, 20, 20, estimator='mode', region='perimeter'), '#C80000')
+
+        with self.assertRaises(ValueError):
+            get_dominant_color(img, 10, 10, 20, 20, estimator='bogus')
+        with self.assertRaises(ValueError):
+            get_dominant_color(img, 10, 10, 20, 20, region='bogus')
+
+    def test_box_region_matches_baseline_colors(self):
+        def baseline_color(bgr_image, x, y, w, h):
+            # get_dominant_color before estimators and regions were added
+            pixels = np.float32(bgr_image[y:y+h, x:x+w].reshape((-1, 3)))
+            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+            _, _, centers = cv2.kmeans(pixels, 1, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+            b, g, r = centers[0].astype(int)
+            return f"#{r:02X}{g:02X}{b:02X}"
+
+        random.seed(9)
+        img, _ = create_sample_image(300, 200, 20, min_size=8, max_size=40)
+        result = detect_features(img, 5, 60, 5, 60, 2.3, color_estimator='kmeans', color_region='box')
+        self.assertGreater(len(result.bounding_boxes), 0)
+        for box in result.bounding_boxes:
+            self.assertEqual(box.color_hex, baseline_color(img, box.x, box.y, box.w, box.h))
+            self.assertEqual(get_dominant_color(img, box.x, box.y, box.w, box.h, 'kmeans', 'box'),
+                             baseline_color(img, box.x, box.y, box.w, box.h))
+
 if __name__ == '__main__':
     unittest.main()
 
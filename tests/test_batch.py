@@ -0,0 +1,66 @@
+import unittest
+import os
+import sys
+import random
+import tempfile
+import cv2
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.feature_identifier.detector import detect_features
+from apps.feature_site.modules.feature_identifier.batch import detect_features_batch
+from apps.feature_site.modules.feature_identifier.stages import DETECTION_STAGES
+
+def box_keys(result):
+    return [(b.x, b.y, b.w, b.h, b.score, b.color_hex) for b in result.bounding_boxes]
+
+class TestBatchDetection(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = []
+        self.images = []
+        for i in range(3):
+            random.seed(i)
+            image, _ = create_sample_image(200, 150, 8)
+            path = os.path.join(self.tmp_dir, f'batch_{i}.png')
+            cv2.imwrite(path, image)
+            self.paths.append(path)
+            self.images.append(image)
+
+    def tearDown(self):
+        for path in self.paths:
+            os.remove(path)
+        os.rmdir(self.tmp_dir)
+
+    def test_matches_single_image_detection(self):
+        expected = [box_keys(detect_features(p, 5, 100, 5, 100, 2.3)) for p in self.paths]
+
+        # Mix of paths and already decoded arrays
+        inputs = [self.paths[0], self.images[1], self.paths[2]]
+        results = list(detect_features_batch(inputs, 5, 100, 5, 100, 2.3, workers=2))
+
+        self.assertEqual([i for i, _ in results], [0, 1, 2])
+        self.assertEqual([box_keys(r) for _, r in results], expected)
+
+    def test_unordered_with_exceptions(self):
+        inputs = self.paths + [os.path.join(self.tmp_dir, 'missing.png')]
+        results = dict(detect_features_batch(inputs, 5, 100, 5, 100, 2.3, workers=2, ordered=False, return_exceptions=True))
+
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        self.assertIsInstance(results[3], ValueError)
+
+        with self.assertRaises(ValueError):
+            list(detect_features_batch(inputs, 5, 100, 5, 100, 2.3, workers=2))
+
+    def test_stage_timings(self):
+        (_, result), = detect_features_batch(self.images[:1], 5, 100, 5, 100, 2.3, workers=1, trace_memory=True)
+
+        # Images are decoded in the parent, so workers report no decode stage
+        self.assertEqual(list(result.stages), [s for s in DETECTION_STAGES if s not in ('decode', 'overlay')])
+        self.assertTrue(all(stats.peak_bytes is not None for stats in result.stages.values()))
+        self.assertEqual(box_keys(result), box_keys(detect_features(self.images[0], 5, 100, 5, 100, 2.3)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import random
+import tempfile
+import numpy as np
+import cv2
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.feature_identifier.cache import PreprocessCache, content_digest
+from apps.feature_site.modules.feature_identifier.detector import detect_features
+
+def box_keys(result):
+    return [(b.x, b.y, b.w, b.h, b.score, b.color_hex) for b in result.bounding_boxes]
+
+class TestPreprocessCache(unittest.TestCase):
+    def test_byte_bounded_lru(self):
+        cache = PreprocessCache(max_bytes=3000)
+        cache.put('a', np.zeros(1000, dtype=np.uint8))
+        cache.put('b', np.zeros(1000, dtype=np.uint8))
+        self.assertIsNotNone(cache.get('a'))  # 'b' is now least recently used
+        cache.put('c', np.zeros(1500, dtype=np.uint8))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+
+        # Too large to cache at all
+        cache.put('d', np.zeros(4000, dtype=np.uint8))
+        self.assertIsNone(cache.get('d'))
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (3, 2, 1))
+        self.assertEqual((stats['entries'], stats['bytes']), (2, 2500))
+
+    def test_content_digest(self):
+        a = np.arange(12, dtype=np.uint8).reshape(2, 2, 3)
+        self.assertEqual(content_digest(a), content_digest(a.copy()))
+        self.assertNotEqual(content_digest(a), content_digest(a.reshape(4, 1, 3)))
+        self.assertNotEqual(content_digest(b'abc'), content_digest(b'abd'))
+
+class TestCachedDetection(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'upload.png')
+
+    def tearDown(self):
+        os.remove(self.path)
+        os.rmdir(self.tmp_dir)
+
+    def write_sample(self, seed):
+        random.seed(seed)
+        image, _ = create_sample_image(300, 200, 20, min_size=8, max_size=40)
+        cv2.imwrite(self.path, image)
+
+    def test_reuses_preprocessing(self):
+        self.write_sample(1)
+        cache = PreprocessCache()
+        expected = [box_keys(detect_features(self.path, 5, 60, 5, 60, t)) for t in (2.3, 5.0)]
+
+        self.assertEqual(box_keys(detect_features(self.path, 5, 60, 5, 60, 2.3, cache=cache)), expected[0])
+        misses = cache.stats()['misses']
+
+        # Only the threshold changed: decoded image and scores come from the cache
+        self.assertEqual(box_keys(detect_features(self.path, 5, 60, 5, 60, 5.0, cache=cache)), expected[1])
+        self.assertEqual(cache.stats()['misses'], misses)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+        # A new size range rescores from the cached Lab image and contours
+        detect_features(self.path, 5, 30, 5, 30, 2.3, cache=cache)
+        self.assertEqual(cache.stats()['misses'], misses + 1)
+
+    def test_overwritten_file_is_not_stale(self):
+        cache = PreprocessCache()
+        for seed in (1, 2):
+            self.write_sample(seed)
+            expected = box_keys(detect_features(self.path, 5, 60, 5, 60, 2.3))
+            self.assertEqual(box_keys(detect_features(self.path, 5, 60, 5, 60, 2.3, cache=cache)), expected)
+
+if __name__ == '__main__':
+    unittest.main()
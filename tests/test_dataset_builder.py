@@ -0,0 +1,60 @@
+import unittest
+import os
+import sys
+import random
+import tempfile
+import cv2
+import numpy as np
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.dataset_builder import build_dataset, iter_manifest, MANIFEST_NAME
+
+SMALL = {'width': (60, 120), 'height': (60, 120), 'num_features': (1, 4)}
+
+class TestDatasetBuilder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_build_and_resume(self):
+        self.assertEqual(build_dataset(self.output, 12, SMALL, seed=5, workers=2), {'generated': 12, 'already_present': 0})
+        records = sorted(iter_manifest(self.output), key=lambda record: record['index'])
+        self.assertEqual([record['index'] for record in records], list(range(12)))
+
+        # Each image is create_sample_image with its recorded seed and parameters
+        record = records[7]
+        random.seed(record['seed'])
+        expected, features = create_sample_image(**record['parameters'])
+        np.testing.assert_array_equal(cv2.imread(os.path.join(self.output, record['file'])), expected)
+        self.assertEqual(record['features'], features)
+        self.assertEqual((record['width'], record['height']), expected.shape[1::-1])
+
+        # Interrupted: the manifest lost its tail mid-line
+        manifest_path = os.path.join(self.output, MANIFEST_NAME)
+        with open(manifest_path) as f:
+            lines = f.readlines()
+        with open(manifest_path, 'w') as f:
+            f.write(''.join(lines[:5]) + lines[5][:20])
+
+        self.assertEqual(build_dataset(self.output, 15, SMALL, seed=5, workers=2), {'generated': 10, 'already_present': 5})
+        resumed = sorted(iter_manifest(self.output), key=lambda record: record['index'])
+        self.assertEqual([record['index'] for record in resumed], list(range(15)))
+        self.assertEqual(resumed[:12], records)
+
+    def test_rejects_mismatched_or_unknown_options(self):
+        build_dataset(self.output, 1, SMALL, seed=5, workers=1)
+        with self.assertRaises(ValueError):
+            build_dataset(self.output, 1, SMALL, seed=6, workers=1)
+        with self.assertRaises(ValueError):
+            build_dataset(self.output, 1, {'colour': '#000000'}, workers=1)
+        with self.assertRaises(ValueError):
+            build_dataset(self.output, 1, SMALL, seed=5, image_format='jpg', workers=1)
+
+if __name__ == '__main__':
+    unittest.main()
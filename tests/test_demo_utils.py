@@ -0,0 +1,108 @@
+import unittest
+import os
+import sys
+import tempfile
+import cv2
+import numpy as np
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import generate_scene, generate_canvas, read_features, random_colors_far_from, MIN_COLOR_DISTANCE
+
+def boxes_of(features):
+    return np.array([(f['x'], f['y'], f['w'], f['h']) for f in features]).reshape(-1, 4)
+
+def draw_one_by_one(features, width, height, bg_bgr):
+    image = np.full((height, width, 3), bg_bgr, dtype=np.uint8)
+    for f in features:
+        color = tuple(int(f['color'][i:i+2], 16) for i in (5, 3, 1))
+        x, y, w, h = f['x'], f['y'], f['w'], f['h']
+        if f['shape'] == 'rectangle':
+            cv2.rectangle(image, (x, y), (x + w, y + h), color, -1)
+        else:
+            cv2.ellipse(image, (x + w // 2, y + h // 2), (w // 2, h // 2), 0, 0, 360, color, -1)
+    return image
+
+def overlapping_pairs(features):
+    x, y, w, h = boxes_of(features).T
+    overlap = (
+        (x[:, None] < x + w + 2) & (x[:, None] + w[:, None] + 2 > x) &
+        (y[:, None] < y + h + 2) & (y[:, None] + h[:, None] + 2 > y)
+    )
+    np.fill_diagonal(overlap, False)
+    return int(overlap.sum()) // 2
+
+class TestGenerateScene(unittest.TestCase):
+    def test_seeded_and_reproducible(self):
+        image, features = generate_scene(400, 300, 60, seed=3)
+        again, same = generate_scene(400, 300, 60, seed=3)
+        other, _ = generate_scene(400, 300, 60, seed=4)
+        self.assertEqual(len(features), 60)
+        self.assertEqual(features, same)
+        np.testing.assert_array_equal(image, again)
+        self.assertFalse(np.array_equal(image, other))
+
+    def test_matches_shapes_drawn_one_by_one(self):
+        image, features = generate_scene(500, 400, 150, min_size=3, max_size=30, bg_color_hex='#102030', seed=1)
+        np.testing.assert_array_equal(image, draw_one_by_one(features, 500, 400, (0x30, 0x20, 0x10)))
+        self.assertEqual({f['shape'] for f in features}, {'rectangle', 'ellipse'})
+
+    def test_no_overlaps_in_dense_scenes(self):
+        _, features = generate_scene(600, 400, 3000, min_size=2, max_size=12, seed=2, allow_partial=True)
+        self.assertGreater(len(features), 1000)
+        self.assertEqual(overlapping_pairs(features), 0)
+        x, y, w, h = boxes_of(features).T
+        self.assertTrue(np.all((x >= 2) & (y >= 2) & (x + w <= 598) & (y + h <= 398)))
+
+    def test_colors_far_from_background(self):
+        rng = np.random.default_rng(0)
+        for bg in ((232, 232, 232), (0, 0, 0), (128, 128, 128), (255, 0, 128)):
+            colors = random_colors_far_from(rng, bg, 20000).astype(int)
+            self.assertTrue(np.all(np.abs(colors - bg).sum(axis=1) > MIN_COLOR_DISTANCE))
+
+        _, features = generate_scene(200, 200, 10, random_colors=False, feature_color_hex='#00ff00', shape='rectangle', seed=0)
+        self.assertTrue(all(f['color'] == '#00ff00' and f['shape'] == 'rectangle' for f in features))
+
+    def test_underfilled_scene(self):
+        with self.assertRaises(ValueError):
+            generate_scene(100, 100, 500, seed=0)
+        _, features = generate_scene(100, 100, 500, seed=0, allow_partial=True)
+        self.assertLess(len(features), 500)
+        with self.assertRaises(ValueError):
+            generate_scene(100, 100, 5, shape='hexagon')
+
+class TestGenerateCanvas(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'canvas.npy')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_banded_canvas_matches_features(self):
+        tiff_path = os.path.join(self.tmp.name, 'canvas.tif')
+        # Bands of 60 rows, so many features straddle two bands
+        count = generate_canvas(self.path, 400, 500, 150, max_size=30, seed=7, tiff_path=tiff_path, band_rows=60)
+        self.assertEqual(count, 150)
+
+        canvas = np.load(self.path, mmap_mode='r')
+        self.assertIsInstance(canvas, np.memmap)
+        features = read_features(os.path.join(self.tmp.name, 'canvas.features.ndjson'))
+        self.assertEqual(len(features), 150)
+        self.assertEqual(overlapping_pairs(features), 0)
+        np.testing.assert_array_equal(canvas, draw_one_by_one(features, 400, 500, (0xe8, 0xe8, 0xe8)))
+        np.testing.assert_array_equal(cv2.imread(tiff_path), canvas)
+
+        # Reproducible from the seed
+        features_path = os.path.join(self.tmp.name, 'again.ndjson')
+        generate_canvas(os.path.join(self.tmp.name, 'again.npy'), 400, 500, 150, max_size=30, seed=7, band_rows=60, features_path=features_path)
+        self.assertEqual(read_features(features_path), features)
+
+    def test_underfilled_band(self):
+        with self.assertRaises(ValueError):
+            generate_canvas(self.path, 100, 100, 500, seed=0)
+        self.assertLess(generate_canvas(self.path, 100, 100, 500, seed=0, allow_partial=True), 500)
+
+if __name__ == '__main__':
+    unittest.main()
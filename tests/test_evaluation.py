@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.dataset_builder import build_dataset, iter_dataset
+from apps.feature_site.modules.demo_utils import generate_scene
+from apps.feature_site.modules.feature_identifier.evaluation import (
+    EvaluationStats, evaluate_detector, format_evaluation_table, ground_truth_boxes
+)
+
+SIZES = dict(min_w=5, max_w=46, min_h=5, max_h=46, delta_e_threshold=2.3)
+
+class TestEvaluation(unittest.TestCase):
+    def test_ground_truth_boxes(self):
+        features = [
+            {'x': 3, 'y': 4, 'w': 10, 'h': 20, 'color': '#ff0000', 'shape': 'rectangle'},
+            {'x': 5, 'y': 6, 'w': 21, 'h': 15, 'color': '#00ff00', 'shape': 'ellipse'},
+            {'x': 7, 'y': 8, 'w': 20, 'h': 14, 'color': '#0000ff', 'shape': 'ellipse'},
+        ]
+        self.assertEqual(ground_truth_boxes(features), [(3, 4, 11, 21), (5, 6, 21, 15), (7, 8, 21, 15)])
+
+    def test_metrics(self):
+        stats = EvaluationStats(config={}, edge_detection_method='canny', images=2, megapixels=3.0,
+                                truth=10, detected=8, matched=6, iou_sum=5.4, detect_seconds=0.5,
+                                per_image_recall=[0.4, 0.8])
+        self.assertAlmostEqual(stats.precision, 0.75)
+        self.assertAlmostEqual(stats.recall, 0.6)
+        self.assertAlmostEqual(stats.f1, 2 / 3)
+        self.assertAlmostEqual(stats.mean_iou, 0.9)
+        self.assertAlmostEqual(stats.worst_image_recall, 0.4)
+        self.assertAlmostEqual(stats.images_per_second, 4.0)
+        self.assertAlmostEqual(stats.megapixels_per_second, 6.0)
+        self.assertNotIn('per_image_recall', stats.to_dict())
+        self.assertAlmostEqual(stats.to_dict()['recall'], 0.6)
+
+        empty = EvaluationStats(config={}, edge_detection_method='canny')
+        self.assertEqual((empty.precision, empty.recall, empty.f1, empty.images_per_second), (0.0, 0.0, 0.0, 0.0))
+
+    def test_evaluate_generated_scenes(self):
+        corpus = [generate_scene(400, 300, 20, min_size=10, max_size=40, seed=seed) for seed in range(3)]
+        stats = evaluate_detector(corpus, [{'min_w': 5}, {'min_w': 100, 'max_w': 200}], ('canny', 'sobel'), **SIZES)
+        self.assertEqual([(s.config['min_w'], s.edge_detection_method) for s in stats],
+                         [(5, 'canny'), (5, 'sobel'), (100, 'canny'), (100, 'sobel')])
+        canny = stats[0]
+        self.assertEqual((canny.images, canny.truth), (3, 60))
+        self.assertAlmostEqual(canny.megapixels, 0.36)
+        self.assertGreater(canny.detect_seconds, 0)
+        self.assertGreaterEqual(canny.recall, 0.9)
+        self.assertGreaterEqual(canny.precision, 0.9)
+        self.assertGreater(canny.mean_iou, 0.5)
+        # Every feature is narrower than the second configuration's range
+        self.assertEqual((stats[2].detected, stats[2].recall), (0, 0.0))
+
+        # An edge method in a configuration replaces the edge_methods axis
+        by_config = evaluate_detector(corpus[:1], [{'edge_detection_method': 'sobel'}, {}], ('canny', 'scharr'), **SIZES)
+        self.assertEqual([(s.config, s.edge_detection_method) for s in by_config],
+                         [({}, 'sobel'), ({}, 'canny'), ({}, 'scharr')])
+        sobel, = evaluate_detector(corpus[:1], edge_methods=('sobel',), **SIZES)
+        self.assertEqual((by_config[0].detected, by_config[0].matched), (sobel.detected, sobel.matched))
+        with self.assertRaises(ValueError):
+            evaluate_detector(corpus, edge_detection_method='sobel', **SIZES)
+
+        table = format_evaluation_table(stats).splitlines()
+        self.assertEqual(len(table), 5)
+        self.assertIn('min_w=100 max_w=200', table[3])
+
+    def test_evaluate_dataset(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            build_dataset(output_dir, 4, {'width': 300, 'height': 200, 'num_features': 6, 'shape': 'rectangle'}, workers=1)
+            pairs = list(iter_dataset(output_dir, limit=3))
+            self.assertEqual(len(pairs), 3)
+            self.assertEqual(pairs[0][0].shape, (200, 300, 3))
+            self.assertEqual(len(pairs[0][1]), 6)
+
+            stats, = evaluate_detector(iter_dataset(output_dir), **SIZES)
+            self.assertEqual((stats.images, stats.truth), (4, 24))
+            self.assertGreaterEqual(stats.recall, 0.9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import os
+import sys
+import io
+import json
+import numpy as np
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.feature_identifier.schemas import BoundingBox, DetectionResult
+from apps.feature_site.modules.feature_identifier.export import (
+    export_result, negotiate_export_format, read_binary, to_npz, EXPORT_CHUNK_BOXES
+)
+
+def sample_result(count):
+    boxes = [
+        BoundingBox(x=i, y=2 * i, w=5 + i % 7, h=4 + i % 3, score=0.8 + (i % 5) / 25,
+                    validation_ratio=0.8 + (i % 5) / 25, color_hex=None if i % 4 == 0 else f"#{i:06X}")
+        for i in range(count)
+    ]
+    return DetectionResult(boxes, "CIE76 (Euclidean on Standard Lab)", 2.3, 12.5)
+
+class TestExport(unittest.TestCase):
+    def test_text_formats(self):
+        # Empty, one chunk and several chunks
+        for count in (0, 3, EXPORT_CHUNK_BOXES + 5):
+            result = sample_result(count)
+            expected = result.bounding_boxes.to_dicts()
+
+            lines = b"".join(export_result(result, "ndjson")).decode().splitlines()
+            header = json.loads(lines[0])
+            self.assertEqual(header, {"delta_e_method": result.delta_e_method, "delta_e_threshold": 2.3,
+                                      "processing_time_ms": 12.5, "count": count})
+            self.assertEqual([json.loads(line) for line in lines[1:]], expected)
+
+            document = json.loads(b"".join(export_result(result, "json")))
+            self.assertEqual(document["bounding_boxes"], expected)
+            self.assertEqual(document["delta_e_threshold"], 2.3)
+
+    def test_binary_formats(self):
+        result = sample_result(50)
+
+        decoded = read_binary(b"".join(export_result(result, "binary")))
+        self.assertEqual(decoded, result)
+
+        archive = np.load(io.BytesIO(to_npz(result)))
+        np.testing.assert_array_equal(archive["score"], result.bounding_boxes["score"])
+        self.assertEqual(str(archive["delta_e_method"]), result.delta_e_method)
+
+        with self.assertRaises(ValueError):
+            read_binary(b"XXXX" + bytes(64))
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate_export_format(), "ndjson")
+        self.assertEqual(negotiate_export_format("NPZ", "application/json"), "npz")
+        self.assertEqual(negotiate_export_format(None, "text/html, application/octet-stream;q=0.9"), "binary")
+        self.assertEqual(negotiate_export_format(None, "*/*"), "ndjson")
+        with self.assertRaises(ValueError):
+            negotiate_export_format("xml")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
 import requests
 import os
+import io
+import re
+import json
 import threading
 import time
 from tests.utils import BASE_URL, create_test_image, remove_test_image, create_dummy_text_file, clean_upload_buffer
@@ -67,6 +70,37 @@ class TestFeatureIdentifier(unittest.TestCase):
         self.assertIn('bounding_boxes', response.text)
         self.assertIn('processing_time_ms', response.text)
 
+    def test_export_formats(self):
+        """Test downloading a result in every export format."""
+        url = f"{BASE_URL}/feature_identifier"
+        files = {'image': open(self.test_image, 'rb')}
+        data = {'min_w': 10, 'max_w': 500, 'min_h': 10, 'max_h': 500, 'threshold': 2.3}
+        response = self.session.post(url, files=files, data=data)
+        self.assertEqual(response.status_code, 200)
+
+        match = re.search(r'href="([^"]*/feature_identifier/results/[0-9a-f]+)\?format=ndjson"', response.text)
+        self.assertIsNotNone(match)
+        export_url = BASE_URL.split('/feature_site')[0] + match.group(1)
+
+        ndjson = self.session.get(export_url, params={'format': 'ndjson'})
+        self.assertEqual(ndjson.status_code, 200)
+        self.assertEqual(ndjson.headers['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in ndjson.text.splitlines()]
+        self.assertEqual(lines[0]['count'], len(lines) - 1)
+
+        compact = self.session.get(export_url, headers={'Accept': 'application/json'})
+        self.assertEqual(compact.headers['Content-Type'], 'application/json')
+        self.assertEqual(compact.json()['bounding_boxes'], lines[1:])
+
+        npz = self.session.get(export_url, params={'format': 'npz'})
+        self.assertEqual(len(np.load(io.BytesIO(npz.content))['x']), len(lines) - 1)
+
+        binary = self.session.get(export_url, headers={'Accept': 'application/octet-stream'})
+        self.assertTrue(binary.content.startswith(b'FIDB'))
+
+        self.assertEqual(self.session.get(export_url, params={'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.session.get(f"{BASE_URL}/feature_identifier/results/missing").status_code, 404)
+
     def test_invalid_file_type(self):
         """Test uploading an invalid file type."""
         url = f"{BASE_URL}/feature_identifier"
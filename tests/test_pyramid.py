@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import random
+import tracemalloc
+import cv2
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.feature_identifier.detector import _detect_in_image
+from apps.feature_site.modules.feature_identifier.pyramid import _coarse_candidates, detect_features_pyramid, pyramid_level, pyramid_recall_report
+from apps.feature_site.modules.feature_identifier.stages import DETECTION_STAGES
+
+def box_keys(result):
+    return [(b.x, b.y, b.w, b.h, b.score, b.color_hex) for b in result.bounding_boxes]
+
+class TestPyramidDetection(unittest.TestCase):
+    def setUp(self):
+        random.seed(11)
+        self.image, _ = create_sample_image(900, 700, 30, min_size=40, max_size=120)
+
+    def test_level_from_size_constraints(self):
+        self.assertEqual(pyramid_level(10, 500), 0)
+        self.assertEqual(pyramid_level(40, 40), 1)
+        self.assertEqual(pyramid_level(64, 100), 2)
+        self.assertEqual(pyramid_level(5000, 5000), 4)
+
+    def test_level_zero_is_full_resolution(self):
+        expected = box_keys(_detect_in_image(self.image, 10, 200, 10, 200, 2.3))
+        self.assertEqual(box_keys(detect_features_pyramid(self.image, 10, 200, 10, 200, 2.3)), expected)
+
+    def test_refined_boxes_match_full_resolution(self):
+        full = box_keys(_detect_in_image(self.image, 40, 200, 40, 200, 2.3))
+        pyramid = box_keys(detect_features_pyramid(self.image, 40, 200, 40, 200, 2.3, level=1))
+        self.assertGreater(len(pyramid), 0)
+        # Refined boxes are validated at full resolution, so they are exact
+        self.assertTrue(set(pyramid) <= set(full))
+
+    def test_sobel_and_oversized_candidates(self):
+        # The normalizing maximum comes from the refinement windows
+        full = box_keys(_detect_in_image(self.image, 40, 200, 40, 200, 2.3, 'sobel'))
+        pyramid = box_keys(detect_features_pyramid(self.image, 40, 200, 40, 200, 2.3, 'sobel', level=1))
+        self.assertGreater(len(pyramid), 0)
+        self.assertTrue(set(pyramid) <= set(full))
+
+        # A frame around the whole image is not refined unless max_w allows it
+        framed = self.image.copy()
+        cv2.rectangle(framed, (4, 4), (895, 695), (0, 0, 0), 3)
+        gray = cv2.cvtColor(framed, cv2.COLOR_BGR2GRAY)
+        self.assertTrue(all(w <= 400 + 4 and h <= 400 + 4 for _, _, w, h in _coarse_candidates(gray, 1, 40, 200, 40, 200, 'canny')))
+        self.assertTrue(any(w > 800 for _, _, w, _ in _coarse_candidates(gray, 1, 40, 1000, 40, 1000, 'canny')))
+        self.assertTrue(set(box_keys(detect_features_pyramid(framed, 40, 200, 40, 200, 2.3, level=1)))
+                        <= set(box_keys(_detect_in_image(framed, 40, 200, 40, 200, 2.3))))
+
+    def test_recall_report(self):
+        report = pyramid_recall_report([self.image], 40, 200, 40, 200, 2.3, level=1)
+        self.assertEqual(report['images'], 1)
+        self.assertEqual(report['exact_matches'], report['pyramid_boxes'])
+        self.assertGreaterEqual(report['exact_recall'], 0.9)
+
+    def test_stage_timings(self):
+        runs = []
+        result = detect_features_pyramid(self.image, 40, 200, 40, 200, 2.3, level=1, on_stage=runs.append, trace_memory=True)
+        self.assertEqual(list(result.stages), ['gray', 'edges', 'contours', 'filter', 'validation', 'exclusivity', 'color'])
+        self.assertEqual(result.stages['color'].count, len(result.bounding_boxes))
+        self.assertEqual(result.stages['contours'].calls, [run.name for run in runs].count('contours'))
+        self.assertTrue(all(stats.peak_bytes is not None for stats in result.stages.values()))
+        self.assertFalse(tracemalloc.is_tracing())
+
+        # Level 0 reports the full-resolution stages
+        result = detect_features_pyramid(self.image, 10, 200, 10, 200, 2.3)
+        self.assertEqual(list(result.stages), [s for s in DETECTION_STAGES if s not in ('decode', 'overlay')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import os
+import sys
+import pickle
+import numpy as np
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.feature_identifier.schemas import BoundingBox, BoxArray, BoxView, DetectionResult, NO_COLOR
+
+class TestBoxArray(unittest.TestCase):
+    def setUp(self):
+        self.boxes = [
+            BoundingBox(x=1, y=2, w=10, h=12, score=0.9, validation_ratio=0.9, color_hex="#FF0000"),
+            BoundingBox(x=20, y=5, w=8, h=8, score=0.95, validation_ratio=0.95, color_hex=None),
+            BoundingBox(x=40, y=30, w=6, h=9, score=0.9, validation_ratio=0.9, color_hex="#00A0FF"),
+        ]
+        self.array = BoxArray.from_boxes(self.boxes)
+
+    def test_views_match_boxes(self):
+        self.assertEqual(len(self.array), 3)
+        self.assertEqual(self.array, self.boxes)
+        self.assertEqual(self.array.to_boxes(), self.boxes)
+        self.assertEqual(self.array[-1], self.boxes[2])
+        self.assertIsInstance(self.array[0], BoxView)
+        self.assertEqual(self.array[1].color_hex, None)
+        self.assertEqual(self.array['color'][1], NO_COLOR)
+        self.assertFalse(hasattr(self.array[0], '__dict__'))
+        with self.assertRaises(IndexError):
+            self.array[3]
+
+        # Views write through to the array
+        self.array[1].color_hex = "#123456"
+        self.assertEqual(self.array['color'][1], 0x123456)
+
+    def test_slicing_sorting_filtering(self):
+        head = self.array[:2]
+        self.assertTrue(np.shares_memory(head.rows, self.array.rows))
+        self.assertEqual(head, self.boxes[:2])
+
+        # Stable: equal scores keep their order in both directions
+        self.assertEqual(self.array.sorted('score'), [self.boxes[1], self.boxes[0], self.boxes[2]])
+        self.assertEqual(self.array.sorted('score', descending=False), [self.boxes[0], self.boxes[2], self.boxes[1]])
+
+        # Unsigned color column, with black and a tie
+        colors = ["#000000", "#FF0000", "#00FF00", "#FF0000"]
+        by_color = BoxArray.from_boxes(
+            BoundingBox(x=i, y=0, w=5, h=5, score=0.5, validation_ratio=0.5, color_hex=color) for i, color in enumerate(colors)
+        )
+        descending = by_color.sorted('color')
+        self.assertEqual([box.color_hex for box in descending], ["#FF0000", "#FF0000", "#00FF00", "#000000"])
+        self.assertEqual(list(descending['x']), [1, 3, 2, 0])
+        self.assertEqual(list(by_color.sorted('color', descending=False)['x']), [0, 2, 1, 3])
+
+        self.assertEqual(self.array.filter(self.array['w'] < 10), self.boxes[1:])
+        np.testing.assert_array_equal(self.array.boxes(), [[1, 2, 10, 12], [20, 5, 8, 8], [40, 30, 6, 9]])
+
+    def test_serialization(self):
+        dicts = self.array.to_dicts()
+        self.assertEqual(dicts[0], {"x": 1, "y": 2, "w": 10, "h": 12, "score": 0.9, "validation_ratio": 0.9, "color_hex": "#FF0000"})
+        self.assertIsNone(dicts[1]["color_hex"])
+
+        result = DetectionResult(self.boxes, "CIE76", 2.3, 1.0)
+        self.assertIsInstance(result.bounding_boxes, BoxArray)
+        self.assertEqual(pickle.loads(pickle.dumps(result)).bounding_boxes, self.boxes)
+
+        empty = BoxArray()
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(empty.to_dicts(), [])
+        self.assertEqual(BoxArray.from_columns(np.empty((0, 4)), [], []), [])
+
+if __name__ == '__main__':
+    unittest.main()
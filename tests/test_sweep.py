@@ -0,0 +1,65 @@
+import unittest
+import os
+import sys
+import random
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.feature_identifier.detector import _detect_in_image
+from apps.feature_site.modules.feature_identifier.stages import DETECTION_STAGES
+from apps.feature_site.modules.feature_identifier.sweep import detect_features_sweep, parameter_grid
+
+def box_keys(result):
+    return [(b.x, b.y, b.w, b.h, b.score, b.color_hex) for b in result.bounding_boxes]
+
+class TestParameterSweep(unittest.TestCase):
+    def setUp(self):
+        random.seed(5)
+        self.image, _ = create_sample_image(400, 300, 40, min_size=8, max_size=50)
+
+    def test_parameter_grid(self):
+        grid = list(parameter_grid(min_w=5, max_w=[50, 60], delta_e_threshold=[1.0, 2.3]))
+        self.assertEqual(len(grid), 4)
+        self.assertEqual(grid[0], {'min_w': 5, 'max_w': 50, 'delta_e_threshold': 1.0})
+        self.assertEqual(grid[-1], {'min_w': 5, 'max_w': 60, 'delta_e_threshold': 2.3})
+
+    def test_matches_individual_runs(self):
+        configs = list(parameter_grid(
+            min_w=[5, 12], max_w=[30, 60], min_h=5, max_h=60,
+            delta_e_threshold=[1.0, 2.3, 6.0], edge_detection_method=['canny', 'sobel']
+        ))
+        results = detect_features_sweep(self.image, configs)
+        self.assertEqual(len(results), len(configs))
+
+        for config, result in zip(configs, results):
+            expected = _detect_in_image(
+                self.image, config['min_w'], config['max_w'], config['min_h'], config['max_h'],
+                config['delta_e_threshold'], config['edge_detection_method']
+            )
+            self.assertEqual(box_keys(result), box_keys(expected))
+            self.assertEqual(result.delta_e_threshold, config['delta_e_threshold'])
+
+    def test_stage_timings(self):
+        configs = list(parameter_grid(min_w=5, max_w=60, min_h=5, max_h=60, delta_e_threshold=[1.0, 2.3, 6.0]))
+        runs = []
+        results = detect_features_sweep(self.image, configs, on_stage=runs.append)
+
+        names = [run.name for run in runs]
+        self.assertEqual((names.count('gray'), names.count('edges'), names.count('color')), (1, 1, 3))
+        for result in results:
+            self.assertEqual(set(result.stages), {s for s in DETECTION_STAGES if s not in ('decode', 'overlay')})
+            self.assertEqual(result.stages['validation'].calls, 2)
+            self.assertEqual(result.stages['color'].count, len(result.bounding_boxes))
+            # Shared stages carry the config's share of their time
+            self.assertEqual(result.stages['gray'].time_ns, runs[names.index('gray')].time_ns // 3)
+
+    def test_rejects_bad_configs(self):
+        with self.assertRaises(ValueError):
+            detect_features_sweep(self.image, [{'min_w': 5, 'max_w': 60, 'min_h': 5, 'max_h': 60}])
+        with self.assertRaises(ValueError):
+            detect_features_sweep(self.image, [{'min_w': 5, 'max_w': 60, 'min_h': 5, 'max_h': 60, 'delta_e_threshold': 2.3, 'blur': 3}])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import os
+import sys
+import tempfile
+import cv2
+import numpy as np
+from PIL import Image
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.tiff_writer import TiffStripWriter, write_tiff
+
+class TestTiffWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'image.tif')
+        self.image = np.random.default_rng(0).integers(0, 256, (150, 97, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        for options in ({}, {'compression': None}, {'bigtiff': True}, {'rows_per_strip': 1}, {'rows_per_strip': 500}):
+            write_tiff(self.image, self.path, band_rows=40, **options)
+            np.testing.assert_array_equal(cv2.imread(self.path), self.image)
+            if not options.get('bigtiff'):
+                np.testing.assert_array_equal(np.array(Image.open(self.path))[..., ::-1], self.image)
+
+    def test_rows_are_checked(self):
+        with self.assertRaises(ValueError):
+            with TiffStripWriter(self.path, 97, 150) as writer:
+                writer.write(self.image[:100])
+        with TiffStripWriter(self.path, 97, 150) as writer:
+            with self.assertRaises(ValueError):
+                writer.write(self.image[:, :50])
+            writer.write(self.image)
+            with self.assertRaises(ValueError):
+                writer.write(self.image[:1])
+        with self.assertRaises(ValueError):
+            TiffStripWriter(self.path, 97, 150, compression='lzw')
+
+if __name__ == '__main__':
+    unittest.main()
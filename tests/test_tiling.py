@@ -0,0 +1,71 @@
+import unittest
+import os
+import sys
+import random
+import tempfile
+import tracemalloc
+import numpy as np
+import cv2
+
+# Add apps to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from apps.feature_site.modules.demo_utils import create_sample_image
+from apps.feature_site.modules.feature_identifier.detector import detect_features
+from apps.feature_site.modules.feature_identifier.stages import DETECTION_STAGES
+from apps.feature_site.modules.feature_identifier.tiling import detect_features_tiled, iter_tiles
+
+def box_keys(result):
+    return [(b.x, b.y, b.w, b.h, b.score, b.color_hex) for b in result.bounding_boxes]
+
+class TestTiledDetection(unittest.TestCase):
+    def setUp(self):
+        random.seed(7)
+        self.image, self.features = create_sample_image(420, 300, 40, min_size=8, max_size=50)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.png_path = os.path.join(self.tmp_dir, 'scene.png')
+        self.npy_path = os.path.join(self.tmp_dir, 'scene.npy')
+        cv2.imwrite(self.png_path, self.image)
+        np.save(self.npy_path, self.image)
+
+    def tearDown(self):
+        for path in (self.png_path, self.npy_path):
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(self.tmp_dir)
+
+    def test_tiles_cover_image(self):
+        covered = np.zeros((300, 420), dtype=np.int32)
+        for x1, y1, x2, y2 in iter_tiles(300, 420, 128):
+            covered[y1:y2, x1:x2] += 1
+        self.assertTrue(np.all(covered == 1))
+
+    def test_matches_single_shot(self):
+        for method in ('canny', 'sobel'):
+            expected = box_keys(detect_features(self.png_path, 5, 60, 5, 60, 2.3, method))
+            self.assertGreater(len(expected), 0)
+            for tile_size in (64, 150):
+                tiled = detect_features_tiled(self.npy_path, 5, 60, 5, 60, 2.3, method, tile_size=tile_size)
+                self.assertEqual(box_keys(tiled), expected)
+
+    def test_accepts_arrays(self):
+        expected = box_keys(detect_features(self.png_path, 5, 60, 5, 60, 2.3))
+        self.assertEqual(box_keys(detect_features_tiled(self.image, 5, 60, 5, 60, 2.3, tile_size=100)), expected)
+
+    def test_stage_timings(self):
+        runs = []
+        result = detect_features_tiled(self.npy_path, 5, 60, 5, 60, 2.3, 'sobel', tile_size=150,
+                                       on_stage=runs.append, trace_memory=True)
+
+        self.assertEqual(list(result.stages), [s for s in DETECTION_STAGES if s != 'overlay'])
+        # Six tiles, each read once for the gradient maximum and once for detection
+        self.assertEqual(result.stages['contours'].calls, 6)
+        self.assertEqual(result.stages['decode'].calls, 1 + 2 * 6)
+        self.assertEqual([run.name for run in runs].count('edges'), 2 * 6)
+        self.assertEqual(result.stages['color'].count, len(result.bounding_boxes))
+        self.assertGreaterEqual(result.stages['filter'].count, result.stages['validation'].count)
+        self.assertTrue(all(stats.peak_bytes is not None for stats in result.stages.values()))
+        self.assertFalse(tracemalloc.is_tracing())
+
+if __name__ == '__main__':
+    unittest.main()